@@ -0,0 +1,307 @@
+"""Load benchmark for the Database helpers
+
+Runs each helper on its own at increasing concurrency and reports
+throughput, latency percentiles, time spent waiting for a pool connection
+and the cache hit ratio. The sweep shows where the pool (max_size=10 in
+production) saturates: throughput stops growing while pool wait climbs.
+
+    python -m bench.database --dsn postgresql://localhost/chime_bench
+    python -m bench.database --dsn ... --json after.json --compare before.json
+    python -m bench.database --fake --db-latency 1
+
+Rows are seeded under random ids and deleted afterwards, but point it at a
+scratch database all the same.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from core.database import db
+from core.metrics import cache_requests, db_acquire
+
+from .fakes import FakePool
+from .pipeline import percentile
+
+Helper = Callable[[random.Random], Awaitable[Any]]
+
+
+class Dataset:
+    """Seeded guilds, users and tags the helpers are pointed at"""
+
+    def __init__(self, args: argparse.Namespace):
+        rng = random.Random(args.seed)
+        base = rng.randrange(10**15, 10**16)
+        self.guilds = [base + i for i in range(args.guilds)]
+        self.users = [base + args.guilds + i for i in range(args.users)]
+        self.tags: List[Tuple[Any, str, int]] = []
+        self.args = args
+        self.rng = rng
+
+    async def seed(self) -> None:
+        for guild_id in self.guilds:
+            await db.update_guild(guild_id, f"bench {guild_id}")
+            await db.set_prefix("guild", guild_id, "?")
+        for user_id in self.users:
+            await db.update_user(user_id, f"bench {user_id}")
+
+        for i in range(self.args.tags):
+            guild_id, user_id = self.rng.choice(self.guilds), self.rng.choice(
+                self.users
+            )
+            name = f"tag{i}"
+            tag_id = await db.create_tag(name, "content " * 20, user_id, guild_id)
+            self.tags.append((tag_id, name, guild_id))
+
+        for user_id in self.rng.sample(self.users, len(self.users) // 10):
+            await db.set_afk(user_id, self.rng.choice(self.guilds), "bench")
+
+    async def cleanup(self) -> None:
+        """Delete the seeded rows; AFK statuses, tags and aliases cascade"""
+        if isinstance(db.pool, FakePool):
+            return
+        await db.pool.execute(
+            "DELETE FROM prefixes WHERE entity_id = ANY($1::BIGINT[])",
+            self.guilds + self.users,
+        )
+        await db.pool.execute(
+            "DELETE FROM aliases WHERE guild_id = ANY($1::BIGINT[])", self.guilds
+        )
+        await db.pool.execute(
+            "DELETE FROM users WHERE id = ANY($1::BIGINT[])", self.users
+        )
+        await db.pool.execute(
+            "DELETE FROM guilds WHERE id = ANY($1::BIGINT[])", self.guilds
+        )
+
+    def helpers(self) -> Dict[str, Helper]:
+        """One call of each helper with randomly chosen arguments"""
+        guild = lambda rng: rng.choice(self.guilds)
+        user = lambda rng: rng.choice(self.users)
+        tag = lambda rng: rng.choice(self.tags)
+
+        def get_tag(rng):
+            _, name, guild_id = tag(rng)
+            return db.get_tag(name=name, guild_id=guild_id)
+
+        return {
+            "get_prefix": lambda rng: db.get_prefix("guild", guild(rng)),
+            "get_afk": lambda rng: db.get_afk(user(rng), guild(rng)),
+            "get_guild_afk": lambda rng: db.get_guild_afk(guild(rng)),
+            "get_tags": lambda rng: db.get_tags(guild(rng)),
+            "get_tag": get_tag,
+            "use_tag": lambda rng: db.use_tag(tag(rng)[0]),
+            "get_aliases": lambda rng: db.get_aliases(guild(rng)),
+            # alias names are unique across every guild
+            "add_alias": lambda rng: db.add_alias(
+                guild(rng), f"b{uuid.uuid4().hex[:12]}", "prefix view"
+            ),
+            "update_user": lambda rng: db.update_user(user(rng), "bench"),
+            "set_afk": lambda rng: db.set_afk(user(rng), guild(rng), "bench"),
+        }
+
+
+def _counter(metric, *labels) -> float:
+    return metric.values.get(labels, 0)
+
+
+def _acquire_totals() -> Tuple[int, float, int]:
+    """Acquires so far, seconds spent waiting and acquires slower than the
+    histogram's first bucket (5ms)"""
+    counts, total = db_acquire.values.get(
+        (), ([0] * (len(db_acquire.buckets) + 1), [0])
+    )
+    return sum(counts), total[0], sum(counts) - counts[0]
+
+
+async def measure(
+    helper: Helper, concurrency: int, operations: int, seed: int
+) -> Dict[str, float]:
+    """Run one helper with a number of workers until the operations are done"""
+    acquires, waited, slow_acquires = _acquire_totals()
+    hits = _counter(cache_requests, "db", "hit")
+    misses = _counter(cache_requests, "db", "miss")
+    latencies: List[float] = []
+    errors = 0
+    remaining = operations
+
+    async def worker(rng: random.Random) -> None:
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            started = time.perf_counter()
+            try:
+                await helper(rng)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(random.Random(seed + i)) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    after_acquires, after_waited, after_slow = _acquire_totals()
+    acquired = after_acquires - acquires
+    lookups = (
+        _counter(cache_requests, "db", "hit")
+        - hits
+        + _counter(cache_requests, "db", "miss")
+        - misses
+    )
+    return {
+        "concurrency": concurrency,
+        "ops_per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "pool_wait_ms": (after_waited - waited) / acquired * 1000 if acquired else 0,
+        "pool_waited": (after_slow - slow_acquires) / acquired if acquired else 0,
+        "cache_hit_ratio": (
+            (_counter(cache_requests, "db", "hit") - hits) / lookups
+            if lookups
+            else None
+        ),
+        "errors": errors,
+    }
+
+
+def saturation(rows: List[Dict[str, float]]) -> int:
+    """The first concurrency whose throughput gain over the previous step
+    fell under 10% while pool wait grew, or 0 if it kept scaling"""
+    for previous, row in zip(rows, rows[1:]):
+        if (
+            row["ops_per_second"] < previous["ops_per_second"] * 1.1
+            and row["pool_wait_ms"] > previous["pool_wait_ms"]
+        ):
+            return int(row["concurrency"])
+    return 0
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    if args.fake:
+        db._pool = FakePool(latency=args.db_latency / 1000, max_size=args.pool_size)
+    else:
+        import asyncpg
+
+        db._pool = await asyncpg.create_pool(
+            args.dsn, min_size=args.pool_size, max_size=args.pool_size
+        )
+        await db._migrate()
+    db.ready = True
+    if args.no_cache:
+        db.cache.ttl = 0
+
+    dataset = Dataset(args)
+    results: Dict[str, List[Dict[str, float]]] = {}
+    try:
+        await dataset.seed()
+        helpers = dataset.helpers()
+        for name in args.helpers or helpers:
+            results[name] = []
+            for concurrency in args.concurrency:
+                db.cache.invalidate()
+                row = await measure(
+                    helpers[name], concurrency, args.operations, args.seed
+                )
+                results[name].append(row)
+    finally:
+        await dataset.cleanup()
+        await db.close()
+
+    return {
+        "args": {k: v for k, v in vars(args).items() if k not in ("dsn", "compare")},
+        "results": results,
+        "saturation": {name: saturation(rows) for name, rows in results.items()},
+    }
+
+
+def print_row(name: str, row: Dict[str, float]) -> None:
+    ratio = row["cache_hit_ratio"]
+    print(
+        f"{name:<14} c={row['concurrency']:<4} "
+        f"{row['ops_per_second']:9.0f} op/s  "
+        f"p50 {row['p50_ms']:7.2f}ms  p95 {row['p95_ms']:7.2f}ms  "
+        f"p99 {row['p99_ms']:7.2f}ms  "
+        f"pool wait {row['pool_wait_ms']:6.2f}ms ({row['pool_waited']:4.0%} >5ms)  "
+        f"cache {'-' if ratio is None else f'{ratio:4.0%}'}"
+        + (f"  errors {row['errors']}" if row["errors"] else "")
+    )
+
+
+def compare(before: Dict[str, Any], after: Dict[str, Any]) -> None:
+    """Print throughput and p99 changes between two runs"""
+    print("\nchange vs baseline (op/s, p99):")
+    for name, rows in after["results"].items():
+        old_rows = {row["concurrency"]: row for row in before["results"].get(name, [])}
+        for row in rows:
+            old = old_rows.get(row["concurrency"])
+            if old is None:
+                continue
+            throughput = row["ops_per_second"] / old["ops_per_second"] - 1
+            p99 = row["p99_ms"] / old["p99_ms"] - 1 if old["p99_ms"] else 0
+            print(
+                f"{name:<14} c={row['concurrency']:<4} "
+                f"{throughput:+7.1%} op/s  {p99:+7.1%} p99"
+            )
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--dsn", help="Postgres to run against")
+    target.add_argument("--fake", action="store_true", help="use the in-process db")
+    parser.add_argument(
+        "--concurrency",
+        type=lambda value: [int(c) for c in value.split(",")],
+        default=[1, 2, 4, 8, 16, 32, 64],
+    )
+    parser.add_argument("--operations", type=int, default=2000, help="per step")
+    parser.add_argument(
+        "--helpers",
+        type=lambda value: value.split(","),
+        help="comma separated helpers, all by default",
+    )
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--guilds", type=int, default=200)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--tags", type=int, default=1000)
+    parser.add_argument(
+        "--no-cache", action="store_true", help="expire cached results at once"
+    )
+    parser.add_argument(
+        "--db-latency", type=float, default=0.5, help="fake db round trip in ms"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--compare", help="results file of an earlier run")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.CRITICAL)
+
+    results = asyncio.run(run(args))
+
+    for name, rows in results["results"].items():
+        for row in rows:
+            print_row(name, row)
+    print("\npool saturates at:")
+    for name, concurrency in results["saturation"].items():
+        print(f"  {name:<14} {concurrency or 'not reached'}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,418 @@
+"""In-process stand-ins for Postgres and Discord used by the benchmarks
+
+``FakePool`` answers the queries the message hot path runs from in-memory
+tables, so ``core.database.Database`` runs unchanged on top of it, cache and
+all. The Discord fakes only carry the attributes the bot reads; replies are
+recorded instead of sent.
+"""
+
+import asyncio
+import datetime
+import itertools
+import re
+import uuid
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import discord
+from discord.ext import commands
+
+from core.querystats import normalize_sql
+
+
+class FakeTables:
+    """The rows the fake database serves"""
+
+    def __init__(self):
+        self.guilds: Dict[int, str] = {}
+        self.users: Dict[int, str] = {}
+        self.prefixes: Dict[Tuple[str, int], str] = {}
+        self.afk: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        self.aliases: Dict[Tuple[int, str], Dict[str, Any]] = {}
+        self.tags: Dict[uuid.UUID, Dict[str, Any]] = {}
+
+
+def _status(verb: str, count: int) -> str:
+    return f"INSERT 0 {count}" if verb == "INSERT" else f"{verb} {count}"
+
+
+class FakeConnection:
+    """Answers the hot-path queries by their normalized SQL"""
+
+    def __init__(self, pool: "FakePool"):
+        self.pool = pool
+        self.tables = pool.tables
+        self.handlers: List[Tuple[re.Pattern, Callable]] = [
+            (re.compile(pattern, re.I), handler)
+            for pattern, handler in (
+                (r"^SELECT prefix FROM prefixes WHERE", self._get_prefix),
+                (r"^INSERT INTO prefixes", self._set_prefix),
+                (r"^INSERT INTO users", self._update_user),
+                (r"^INSERT INTO guilds", self._update_guild),
+                (r"^SELECT \* FROM afk_users WHERE user_id", self._get_afk),
+                (r"^SELECT \* FROM afk_users WHERE guild_id", self._get_guild_afk),
+                (r"^INSERT INTO afk_users", self._set_afk),
+                (r"^DELETE FROM afk_users", self._remove_afk),
+                (r"^SELECT \* FROM aliases WHERE guild_id", self._get_aliases),
+                (r"^SELECT command FROM aliases WHERE", self._get_alias),
+                (r"^WITH inserted AS \( INSERT INTO aliases", self._add_alias),
+                (r"^SELECT \* FROM tags WHERE guild_id", self._get_tags),
+                (r"^SELECT \* FROM tags WHERE name", self._get_tag_by_name),
+                (r"^SELECT \* FROM tags WHERE id", self._get_tag),
+                (r"^INSERT INTO tags", self._create_tag),
+                (r"^UPDATE tags SET uses", self._use_tag),
+            )
+        ]
+
+    async def _run(self, query: str, args: Tuple) -> Any:
+        sql = normalize_sql(query)
+        self.pool.queries[sql] += 1
+        if self.pool.latency:
+            await asyncio.sleep(self.pool.latency)
+
+        for pattern, handler in self.handlers:
+            if pattern.search(sql):
+                return handler(*args)
+        self.pool.unhandled[sql] += 1
+        return None
+
+    async def fetch(self, query: str, *args, **kwargs) -> List[Dict[str, Any]]:
+        result = await self._run(query, args)
+        return result if isinstance(result, list) else []
+
+    async def fetchrow(self, query: str, *args, **kwargs) -> Optional[Dict[str, Any]]:
+        result = await self._run(query, args)
+        if isinstance(result, list):
+            return result[0] if result else None
+        return result if isinstance(result, dict) else None
+
+    async def fetchval(self, query: str, *args, **kwargs) -> Any:
+        result = await self._run(query, args)
+        if isinstance(result, dict):
+            return next(iter(result.values()), None)
+        return result
+
+    async def execute(self, query: str, *args, **kwargs) -> str:
+        result = await self._run(query, args)
+        return result if isinstance(result, str) else "SELECT 0"
+
+    def transaction(self) -> "FakeTransaction":
+        return FakeTransaction()
+
+    def _get_prefix(self, entity_type, entity_id):
+        return self.tables.prefixes.get((entity_type, entity_id))
+
+    def _set_prefix(self, entity_type, entity_id, prefix):
+        self.tables.prefixes[(entity_type, entity_id)] = prefix
+        return _status("INSERT", 1)
+
+    def _update_user(self, user_id, username):
+        self.tables.users[user_id] = username
+        return _status("INSERT", 1)
+
+    def _update_guild(self, guild_id, name):
+        self.tables.guilds[guild_id] = name
+        return _status("INSERT", 1)
+
+    def _get_afk(self, user_id, guild_id):
+        return self.tables.afk.get((user_id, guild_id))
+
+    def _get_guild_afk(self, guild_id):
+        return [row for key, row in self.tables.afk.items() if key[1] == guild_id]
+
+    def _set_afk(self, user_id, guild_id, message):
+        self.tables.afk[(user_id, guild_id)] = {
+            "id": uuid.uuid4(),
+            "created_at": datetime.datetime.now(datetime.timezone.utc),
+            "user_id": user_id,
+            "guild_id": guild_id,
+            "message": message,
+        }
+        return _status("INSERT", 1)
+
+    def _remove_afk(self, user_id, guild_id):
+        row = self.tables.afk.pop((user_id, guild_id), None)
+        return row["id"] if row else None
+
+    def _get_aliases(self, guild_id):
+        return [row for key, row in self.tables.aliases.items() if key[0] == guild_id]
+
+    def _get_alias(self, guild_id, alias):
+        return self.tables.aliases.get((guild_id, alias))
+
+    def _add_alias(self, guild_id, alias, command):
+        existing = self.tables.aliases.get((guild_id, alias))
+        if existing:
+            return {"command": existing["command"], "is_new": False}
+        self.tables.aliases[(guild_id, alias)] = {
+            "id": uuid.uuid4(),
+            "guild_id": guild_id,
+            "alias": alias,
+            "command": command,
+        }
+        return {"command": command, "is_new": True}
+
+    def _get_tags(self, guild_id):
+        return [row for row in self.tables.tags.values() if row["guild_id"] == guild_id]
+
+    def _get_tag_by_name(self, name, guild_id):
+        return next(
+            (
+                row
+                for row in self.tables.tags.values()
+                if row["name"] == name and row["guild_id"] == guild_id
+            ),
+            None,
+        )
+
+    def _get_tag(self, tag_id):
+        return self.tables.tags.get(tag_id)
+
+    def _create_tag(self, name, content, user_id, guild_id):
+        tag_id = uuid.uuid4()
+        self.tables.tags[tag_id] = {
+            "id": tag_id,
+            "created_at": datetime.datetime.now(datetime.timezone.utc),
+            "name": name,
+            "content": content,
+            "user_id": user_id,
+            "guild_id": guild_id,
+            "uses": 0,
+        }
+        return tag_id
+
+    def _use_tag(self, tag_id):
+        row = self.tables.tags.get(tag_id)
+        if row is None:
+            return None
+        row["uses"] += 1
+        return row["guild_id"]
+
+
+class FakeTransaction:
+    async def start(self) -> None:
+        pass
+
+    async def commit(self) -> None:
+        pass
+
+    async def rollback(self) -> None:
+        pass
+
+
+class FakePool:
+    """Enough of asyncpg.Pool for Database, with an optional per-query delay"""
+
+    def __init__(
+        self,
+        tables: Optional[FakeTables] = None,
+        latency: float = 0.0,
+        max_size: int = 10,
+    ):
+        """Initialize the pool
+
+        Args:
+            tables (FakeTables, optional): Rows to serve, empty by default
+            latency (float): Seconds each query sleeps, standing in for a
+                round trip to the server
+            max_size (int): Connections handed out at once, like the real pool
+        """
+        self.tables = tables or FakeTables()
+        self.latency = latency
+        self.max_size = max_size
+        self.queries: Counter = Counter()
+        self.unhandled: Counter = Counter()
+        self._connection = FakeConnection(self)
+        self._slots = asyncio.Semaphore(max_size)
+
+    async def acquire(self) -> FakeConnection:
+        await self._slots.acquire()
+        return self._connection
+
+    async def release(self, conn: FakeConnection) -> None:
+        self._slots.release()
+
+    def get_size(self) -> int:
+        return self.max_size
+
+    def get_idle_size(self) -> int:
+        return self._slots._value
+
+    async def close(self) -> None:
+        pass
+
+
+_ids = itertools.count(1_000_000_000_000_000)
+
+
+def snowflake() -> int:
+    return next(_ids)
+
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str, bot: bool = False):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.global_name = name
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+        self.display_avatar = None
+        self.avatar = None
+        self.roles = []
+
+    def __eq__(self, other) -> bool:
+        return getattr(other, "id", None) == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, name: str):
+        self.id = guild_id
+        self.name = name
+        self.icon = None
+        self.members: Dict[int, FakeUser] = {}
+        self.me: Optional[FakeUser] = None
+        self.owner_id = 0
+
+    def get_member(self, user_id: int) -> Optional[FakeUser]:
+        return self.members.get(user_id)
+
+
+class FakeChannel:
+    """Records what the bot sends instead of calling Discord"""
+
+    def __init__(self, channel_id: int, guild: FakeGuild):
+        self.id = channel_id
+        self.guild = guild
+        self.sent = 0
+
+    def permissions_for(self, member) -> discord.Permissions:
+        return discord.Permissions.all()
+
+    async def send(self, content=None, **kwargs) -> "FakeMessage":
+        self.sent += 1
+        return FakeMessage(content or "", self.guild.me, self)
+
+    def typing(self):
+        return _NoTyping()
+
+
+class _NoTyping:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeMessage:
+    def __init__(
+        self,
+        content: str,
+        author: FakeUser,
+        channel: FakeChannel,
+        mentions: Optional[List[FakeUser]] = None,
+    ):
+        self.id = snowflake()
+        self.content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.mentions = mentions or []
+        self.raw_mentions = [user.id for user in self.mentions]
+        self.role_mentions = []
+        self.channel_mentions = []
+        self.attachments = []
+        self.embeds = []
+        self.stickers = []
+        self.reference = None
+        self.webhook_id = None
+        self.created_at = discord.utils.utcnow()
+
+    async def reply(self, content=None, **kwargs) -> "FakeMessage":
+        return await self.channel.send(content, **kwargs)
+
+    async def add_reaction(self, emoji) -> None:
+        pass
+
+    async def remove_reaction(self, emoji, member) -> None:
+        pass
+
+    async def delete(self, **kwargs) -> None:
+        pass
+
+    def to_reference(self, **kwargs):
+        return None
+
+
+class BenchContext(commands.Context):
+    """A context whose replies go to the fake channel"""
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+    async def reply(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+    def typing(self, **kwargs):
+        return _NoTyping()
+
+
+class StubHTTP:
+    """Answers the bot's REST calls locally instead of calling Discord
+
+    Installed over ``bot.http.request``, so every endpoint goes through it.
+    Sending or editing a message returns a plausible message from the bot;
+    anything else returns nothing, which is enough for calls whose result is
+    ignored and makes the rest fail in the handler like a bad response would.
+    """
+
+    def __init__(self, bot: commands.Bot, latency: float = 0.0):
+        self.bot = bot
+        self.latency = latency
+        self.calls: Counter = Counter()
+
+    def install(self) -> None:
+        self.bot.http.request = self.request
+
+    async def request(self, route, *, files=None, form=None, **kwargs) -> Any:
+        self.calls[f"{route.method} {route.path}"] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        if route.path.startswith("/channels/{channel_id}/messages"):
+            if route.method in ("POST", "PATCH"):
+                return self._message(route.channel_id, kwargs.get("json") or {})
+            if route.method == "GET" and route.path.endswith("/messages"):
+                return []
+        return None
+
+    def _message(self, channel_id, payload: Dict[str, Any]) -> Dict[str, Any]:
+        user = self.bot.user
+        return {
+            "id": str(snowflake()),
+            "channel_id": str(channel_id),
+            "author": {
+                "id": str(user.id),
+                "username": user.name,
+                "discriminator": "0",
+                "avatar": None,
+                "bot": True,
+            },
+            "content": payload.get("content") or "",
+            "embeds": payload.get("embeds") or [],
+            "attachments": [],
+            "mentions": [],
+            "mention_roles": [],
+            "components": [],
+            "pinned": False,
+            "mention_everyone": False,
+            "tts": False,
+            "timestamp": discord.utils.utcnow().isoformat(),
+            "edited_timestamp": None,
+            "type": 0,
+            "flags": 0,
+        }
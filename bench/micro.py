@@ -0,0 +1,269 @@
+"""Microbenchmarks for the hot data structures, checked against baselines
+
+Each case is timed as the best of several rounds, in nanoseconds per call,
+and compared with bench/baselines.json. A case more than --threshold slower
+than its baseline fails the run, so a change that slows the hot path down
+shows up before it ships.
+
+    python -m bench.micro                  # compare against the baselines
+    python -m bench.micro --save           # record new baselines
+    python -m bench.micro --filter cache --sizes 10000,100000,1000000
+
+Baselines are only comparable on the machine that recorded them; re-record
+them with --save when switching machines.
+The snipe cases need Python 3.12+, like the bot; an older interpreter can't
+set them up, so they are listed as not run and fail the run.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from core.database import Cache, Database, db
+from core.prefixes import prefix_manager
+from core.utils import would_invoke
+
+from .fakes import FakeChannel, FakeGuild, FakeMessage, FakePool, FakeUser, snowflake
+
+BASELINES = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+# a case is set up once and returns the operation to time; async operations
+# are awaited in a loop inside one coroutine
+Case = Tuple[str, Callable[[], Callable], bool]
+
+# cases that couldn't be set up on this interpreter; they fail the run
+SKIPPED: List[str] = []
+
+
+def _filled_cache(size: int) -> Cache:
+    cache = Cache(ttl=3600)
+    for i in range(size):
+        # roughly the bot's shape: a few keys per entity, a handful of tables
+        cache.set(f"key{i}", i, f"table{i % 6}", [str(i // 4)])
+    return cache
+
+
+def cache_cases(size: int) -> Iterator[Case]:
+    label = f"{size // 1000}k" if size < 1_000_000 else f"{size // 1_000_000}M"
+    cache = _filled_cache(size)
+    keys = [f"key{i}" for i in range(0, size, max(size // 1000, 1))]
+
+    def get_hit():
+        index = 0
+
+        def op():
+            nonlocal index
+            cache.get(keys[index % len(keys)])
+            index += 1
+
+        return op
+
+    def get_miss():
+        return lambda: cache.get("missing")
+
+    def set_and_remove():
+        counter = iter(range(10**9))
+
+        def op():
+            key = f"new{next(counter)}"
+            cache.set(key, 1, "table0", [key])
+            cache._remove(key)
+
+        return op
+
+    def invalidate_entity():
+        counter = iter(range(10**9))
+
+        def op():
+            entity = f"e{next(counter)}"
+            cache.set(entity, 1, "table0", [entity])
+            cache.invalidate(entity_id=entity)
+
+        return op
+
+    yield f"cache.get hit [{label}]", get_hit, False
+    yield f"cache.get miss [{label}]", get_miss, False
+    yield f"cache.set+remove [{label}]", set_and_remove, False
+    yield f"cache.invalidate entity [{label}]", invalidate_entity, False
+
+
+def database_cases() -> Iterator[Case]:
+    database = Database.__new__(Database)
+    query = """
+        SELECT * FROM afk_users WHERE user_id = $1 AND guild_id = $2
+    """
+
+    yield "db._make_cache_key", lambda: (
+        lambda: database._make_cache_key(query, (123456789012345678, 987654321))
+    ), False
+    yield "db._get_table_name", lambda: (lambda: database._get_table_name(query)), False
+
+
+class _Bot:
+    """Just what prefix resolution and would_invoke look at"""
+
+    def __init__(self):
+        self.user = FakeUser(snowflake(), "chime", bot=True)
+        self.commands = {"afk": object(), "prefix": object(), "tag": object()}
+
+    def get_command(self, name):
+        return self.commands.get(name)
+
+
+def _message(content: str) -> FakeMessage:
+    guild = FakeGuild(snowflake(), "guild")
+    return FakeMessage(content, FakeUser(snowflake(), "user"), FakeChannel(1, guild))
+
+
+def prefix_cases() -> Iterator[Case]:
+    bot = _Bot()
+    chatter = _message("did anyone see the patch notes")
+    command = _message("?afk sleeping")
+    # guilds with a cached prefix; the authors have no personal prefix
+    for message in (chatter, command):
+        prefix_manager._guild_cache[message.guild.id] = "?"
+
+    yield "prefix_manager.get_prefix", lambda: (
+        lambda: prefix_manager.get_prefix(bot, chatter)
+    ), True
+    yield "would_invoke [chatter]", lambda: (lambda: would_invoke(bot, chatter)), True
+    yield "would_invoke [command]", lambda: (lambda: would_invoke(bot, command)), True
+
+
+def snipe_cases() -> Iterator[Case]:
+    sizes = (100, 10_000)
+    try:
+        from exts.snipe import Snipe
+    except SyntaxError:
+        # the cog uses f-string syntax from Python 3.12, which the bot needs
+        SKIPPED.extend(f"snipe.recent [{size}]" for size in sizes)
+        return
+
+    snipe = Snipe(_Bot())
+    now = datetime.datetime.utcnow()
+    for size in sizes:
+        history = [(object(), now) for _ in range(size)]
+        yield f"snipe.recent [{size}]", (
+            lambda history=history: lambda: snipe.recent(history)
+        ), False
+
+
+def cases(sizes: List[int]) -> Iterator[Case]:
+    for size in sizes:
+        yield from cache_cases(size)
+    yield from database_cases()
+    yield from prefix_cases()
+    yield from snipe_cases()
+
+
+def _time(op: Callable, number: int) -> float:
+    started = time.perf_counter()
+    for _ in range(number):
+        op()
+    return time.perf_counter() - started
+
+
+async def _time_async(op: Callable, number: int) -> float:
+    started = time.perf_counter()
+    for _ in range(number):
+        await op()
+    return time.perf_counter() - started
+
+
+def measure(setup: Callable, is_async: bool, rounds: int, budget: float) -> float:
+    """Best time per call in nanoseconds, with the call count sized so each
+    round takes about the budget in seconds"""
+    op = setup()
+    run = (
+        (lambda n: asyncio.run(_time_async(op, n)))
+        if is_async
+        else (lambda n: _time(op, n))
+    )
+
+    number = 1
+    while True:
+        elapsed = run(number)
+        if elapsed >= budget / 10:
+            break
+        number *= 10
+    number = max(int(number * budget / max(elapsed, 1e-9) / 10), 1)
+    return min(run(number) / number for _ in range(rounds)) * 1e9
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(size) for size in value.split(",")],
+        default=[10_000, 100_000, 1_000_000],
+        help="cache sizes",
+    )
+    parser.add_argument("--filter", default="", help="only cases containing this")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=0.2, help="seconds a round")
+    parser.add_argument(
+        "--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%"
+    )
+    parser.add_argument("--save", action="store_true", help="record as baselines")
+    args = parser.parse_args(argv)
+
+    # the cases don't touch a real database, but fall through to it on misses
+    db._pool = FakePool()
+    db.ready = True
+
+    baselines: Dict[str, float] = {}
+    if os.path.exists(BASELINES):
+        with open(BASELINES) as f:
+            baselines = json.load(f)
+
+    results: Dict[str, float] = {}
+    regressions = []
+    for name, setup, is_async in cases(args.sizes):
+        if args.filter not in name:
+            continue
+        results[name] = ns = measure(setup, is_async, args.rounds, args.budget)
+
+        baseline = baselines.get(name)
+        change = ""
+        if baseline:
+            ratio = ns / baseline - 1
+            change = f"{ratio:+7.1%} vs {baseline:9.0f}ns"
+            if ratio > args.threshold:
+                regressions.append(name)
+                change += "  SLOWER"
+        print(f"{name:<40} {ns:9.0f}ns  {change}")
+
+    skipped = [name for name in SKIPPED if args.filter in name]
+    if skipped:
+        print(
+            f"\n{len(skipped)} case(s) not run, Python 3.12+ is needed "
+            f"(running {sys.version.split()[0]}):"
+        )
+        for name in skipped:
+            print(f"  {name}")
+
+    if args.save:
+        baselines.update({name: round(ns) for name, ns in results.items()})
+        with open(BASELINES, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"saved {len(results)} baselines to {BASELINES}")
+    elif regressions:
+        print(
+            f"\n{len(regressions)} case(s) more than {args.threshold:.0%} slower "
+            "than baseline:"
+        )
+        for name in regressions:
+            print(f"  {name}")
+        sys.exit(1)
+    elif skipped:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,358 @@
+"""End-to-end benchmark of the message pipeline
+
+Builds the real bot with the hot-path extensions loaded (prefixes, aliases,
+the AFK listener, the error handler) and feeds it fake messages through
+``bot.dispatch``, so on_message, every listener and command dispatch run
+exactly as they do live. Each message is timed until every event it caused,
+such as the alias rewrite in on_command_error, has finished.
+
+    python -m bench.pipeline --messages 20000 --commands 0.05 --afk 0.02
+    python -m bench.pipeline --rate 500 --dsn postgresql://localhost/chime_bench
+
+Without ``--dsn`` the database is an in-process fake with a configurable
+round trip; with it, a local Postgres is seeded and used instead.
+"""
+
+import argparse
+import asyncio
+import contextvars
+import json
+import logging
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import config
+from core.bot import Core
+from core.database import db
+from core.prefixes import prefix_manager
+
+from .fakes import (
+    BenchContext,
+    FakeChannel,
+    FakeGuild,
+    FakeMessage,
+    FakePool,
+    FakeUser,
+    snowflake,
+)
+
+EXTENSIONS = ("core.exts.handler", "core.exts.alias", "exts.prefix", "exts.misc")
+
+CHATTER = [
+    "lol",
+    "did anyone see the patch notes",
+    "brb getting food",
+    "that's actually so good",
+    "no way",
+    "what time is the event tonight",
+]
+
+# tasks scheduled by bot.dispatch while a message is being handled
+_pending: contextvars.ContextVar = contextvars.ContextVar("pending")
+
+
+def percentile(values: List[float], p: float) -> float:
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+class Workload:
+    """Guilds, members and the message mix to replay"""
+
+    def __init__(self, args: argparse.Namespace):
+        self.args = args
+        self.random = random.Random(args.seed)
+        self.guilds: List[FakeGuild] = []
+        self.channels: Dict[int, FakeChannel] = {}
+        self.aliases: Dict[int, List[str]] = defaultdict(list)
+        self.prefixes: Dict[int, str] = {}
+        self.bot_user = FakeUser(snowflake(), "chime", bot=True)
+
+        for g in range(args.guilds):
+            guild = FakeGuild(snowflake(), f"guild {g}")
+            guild.me = self.bot_user
+            for u in range(args.members):
+                user = FakeUser(snowflake(), f"user {g}-{u}")
+                guild.members[user.id] = user
+            self.guilds.append(guild)
+            self.channels[guild.id] = FakeChannel(snowflake(), guild)
+
+    async def seed(self) -> None:
+        """Write prefixes, AFK statuses and aliases through the real helpers"""
+        args = self.args
+        for guild in self.guilds:
+            await db.update_guild(guild.id, guild.name)
+            if self.random.random() < args.guild_prefixes:
+                await db.set_prefix("guild", guild.id, "?")
+                self.prefixes[guild.id] = "?"
+
+            for alias, command in (("pv", "prefix view"), ("away", "afk")):
+                if self.random.random() < args.alias_guilds:
+                    await db.add_alias(guild.id, alias, command)
+                    self.aliases[guild.id].append(alias)
+
+            for user in guild.members.values():
+                await db.update_user(user.id, user.name)
+                if self.random.random() < args.user_prefixes:
+                    await db.set_prefix("user", user.id, ">")
+                    self.prefixes[user.id] = ">"
+                if self.random.random() < args.afk:
+                    await db.set_afk(user.id, guild.id, "sleeping")
+
+    def prefix_for(self, user: FakeUser, guild: FakeGuild) -> str:
+        return (
+            self.prefixes.get(user.id) or self.prefixes.get(guild.id) or config.PREFIX
+        )
+
+    def message(self) -> "tuple[str, FakeMessage]":
+        """Draw one message from the mix
+
+        Returns:
+            tuple[str, FakeMessage]: The message's kind and the message
+        """
+        args = self.args
+        guild = self.random.choice(self.guilds)
+        author = self.random.choice(list(guild.members.values()))
+        channel = self.channels[guild.id]
+        prefix = self.prefix_for(author, guild)
+
+        roll = self.random.random()
+        if roll < args.commands:
+            if self.aliases[guild.id] and self.random.random() < args.alias_share:
+                alias = self.random.choice(self.aliases[guild.id])
+                return "alias", FakeMessage(f"{prefix}{alias}", author, channel)
+            command = self.random.choice(args.command_mix)
+            return "command", FakeMessage(f"{prefix}{command}", author, channel)
+
+        if self.random.random() < args.mentions:
+            target = self.random.choice(list(guild.members.values()))
+            return "mention", FakeMessage(
+                f"{target.mention} {self.random.choice(CHATTER)}",
+                author,
+                channel,
+                mentions=[target],
+            )
+        return "chatter", FakeMessage(self.random.choice(CHATTER), author, channel)
+
+
+async def build_bot(workload: Workload) -> Core:
+    """The real bot, offline, with only the hot-path extensions"""
+    bot = Core()
+    # what login would do: bind the loop and learn who we are
+    await bot._async_setup_hook()
+    bot._connection.user = workload.bot_user
+    # commands.Context reads the connection state off the message
+    FakeMessage._state = bot._connection
+    for extension in EXTENSIONS:
+        await bot.load_extension(extension)
+
+    async def get_context(message, *, cls=BenchContext):
+        return await Core.get_context(bot, message, cls=cls)
+
+    bot.get_context = get_context
+    track_events(bot)
+    return bot
+
+
+def track_events(bot: Core) -> None:
+    """Make the tasks bot.dispatch schedules visible to ``settle``"""
+    schedule = bot._schedule_event
+
+    def tracked_schedule(coro, event_name, *args, **kwargs):
+        task = schedule(coro, event_name, *args, **kwargs)
+        pending = _pending.get(None)
+        if pending is not None:
+            pending.append(task)
+        return task
+
+    bot._schedule_event = tracked_schedule
+
+
+def collect() -> List[asyncio.Task]:
+    """Start collecting the tasks dispatched from the current context"""
+    pending: List[asyncio.Task] = []
+    _pending.set(pending)
+    return pending
+
+
+async def settle(pending: List[asyncio.Task]) -> None:
+    """Wait for collected tasks, and for any tasks those dispatch in turn"""
+    while pending:
+        batch = list(pending)
+        pending.clear()
+        await asyncio.gather(*batch, return_exceptions=True)
+
+
+async def deliver(bot: Core, message: FakeMessage) -> float:
+    """Dispatch a message and wait for everything it set off
+
+    Returns:
+        float: Seconds until the last resulting event finished
+    """
+    pending = collect()
+    started = time.perf_counter()
+    bot.dispatch("message", message)
+    await settle(pending)
+    return time.perf_counter() - started
+
+
+async def run(args: argparse.Namespace) -> dict:
+    workload = Workload(args)
+
+    if args.dsn:
+        import asyncpg
+
+        db._pool = await asyncpg.create_pool(
+            args.dsn, min_size=1, max_size=args.pool_size
+        )
+        await db._migrate()
+    else:
+        db._pool = FakePool(latency=args.db_latency / 1000, max_size=args.pool_size)
+    db.ready = True
+
+    await workload.seed()
+    bot = await build_bot(workload)
+
+    # measure from a cold cache, as after a restart
+    db.cache.invalidate()
+    db.stats.reset()
+    prefix_manager._guild_cache.clear()
+    prefix_manager._user_cache.clear()
+
+    messages = [workload.message() for _ in range(args.messages)]
+    latencies: Dict[str, List[float]] = defaultdict(list)
+
+    async def one(kind: str, message: FakeMessage) -> None:
+        latencies[kind].append(await deliver(bot, message))
+
+    started = time.perf_counter()
+    if args.rate:
+        # open loop: messages arrive on schedule whether or not the bot keeps up
+        tasks = []
+        for i, (kind, message) in enumerate(messages):
+            delay = started + i / args.rate - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(one(kind, message)))
+        await asyncio.gather(*tasks)
+    else:
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(kind, message):
+            async with semaphore:
+                await one(kind, message)
+
+        await asyncio.gather(*(bounded(kind, message) for kind, message in messages))
+    elapsed = time.perf_counter() - started
+
+    queries = sum(shape.count for shape in db.stats.shapes.values())
+    cache_hits = sum(shape.cache_hits for shape in db.stats.shapes.values())
+    everything = [latency for values in latencies.values() for latency in values]
+    report = {
+        "messages": len(messages),
+        "seconds": elapsed,
+        "messages_per_second": len(messages) / elapsed,
+        "p50_ms": percentile(everything, 0.5) * 1000,
+        "p99_ms": percentile(everything, 0.99) * 1000,
+        "db_queries_per_message": queries / len(messages),
+        "db_cache_hits_per_message": cache_hits / len(messages),
+        "replies": sum(channel.sent for channel in workload.channels.values()),
+        "kinds": {
+            kind: {
+                "count": len(values),
+                "p50_ms": percentile(values, 0.5) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+            }
+            for kind, values in sorted(latencies.items())
+        },
+    }
+    if isinstance(db._pool, FakePool) and db._pool.unhandled:
+        report["unhandled_queries"] = dict(db._pool.unhandled)
+
+    await db.close()
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"{report['messages']} messages in {report['seconds']:.2f}s: "
+        f"{report['messages_per_second']:.0f} msg/s, "
+        f"p50 {report['p50_ms']:.2f}ms, p99 {report['p99_ms']:.2f}ms"
+    )
+    print(
+        f"db queries/message: {report['db_queries_per_message']:.2f}, "
+        f"cache hits/message: {report['db_cache_hits_per_message']:.2f}, "
+        f"replies: {report['replies']}"
+    )
+    for kind, stats in report["kinds"].items():
+        print(
+            f"  {kind:<8} {stats['count']:>7}  "
+            f"p50 {stats['p50_ms']:7.2f}ms  p99 {stats['p99_ms']:7.2f}ms"
+        )
+    for sql, count in report.get("unhandled_queries", {}).items():
+        print(f"  fake db has no answer for ({count}x): {sql[:100]}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument(
+        "--rate", type=float, default=0, help="messages/s, 0 for as fast as possible"
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=50, help="in flight when --rate is 0"
+    )
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--members", type=int, default=40, help="per guild")
+    parser.add_argument(
+        "--commands", type=float, default=0.05, help="share of messages"
+    )
+    parser.add_argument(
+        "--command-mix",
+        type=lambda value: value.split(","),
+        default=["prefix", "prefix view", "afk"],
+        help="comma separated commands drawn from for command messages",
+    )
+    parser.add_argument(
+        "--alias-share", type=float, default=0.2, help="of commands, via an alias"
+    )
+    parser.add_argument(
+        "--alias-guilds", type=float, default=0.3, help="guilds with aliases"
+    )
+    parser.add_argument(
+        "--guild-prefixes", type=float, default=0.3, help="guilds with a prefix"
+    )
+    parser.add_argument(
+        "--user-prefixes", type=float, default=0.05, help="users with a prefix"
+    )
+    parser.add_argument("--afk", type=float, default=0.02, help="members AFK")
+    parser.add_argument(
+        "--mentions", type=float, default=0.1, help="chatter mentioning a member"
+    )
+    parser.add_argument(
+        "--db-latency", type=float, default=0.3, help="fake db round trip in ms"
+    )
+    parser.add_argument("--dsn", help="use this Postgres instead of the fake db")
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--log-level", default="CRITICAL")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"args": vars(args), "report": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
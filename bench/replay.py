@@ -0,0 +1,295 @@
+"""Replay a recorded gateway session through the bot
+
+Feeds the dispatches captured by core/recorder.py (run the bot with
+GATEWAY_RECORD=gateway.jsonl.gz) to an offline bot, in their recorded order
+and spacing, through the same parser table the websocket uses. The REST
+layer is stubbed and the database is the in-process fake, so the replay
+measures the bot's own cost: CPU, memory, and per event type how long the
+parser took and how long until every handler it set off had finished.
+
+    python -m bench.replay gateway.jsonl.gz                # real time
+    python -m bench.replay gateway.jsonl.gz --speed 10     # ten times faster
+    python -m bench.replay gateway.jsonl.gz --speed 0 --tracemalloc
+
+At real time the interesting numbers are CPU and lag: how late events were
+fed because the loop was busy. With ``--speed 0`` events are fed as fast as
+the loop takes them, which gives the bot's maximum throughput for the mix;
+handler latencies then include the time spent queued behind other events.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Any, Dict, List
+
+import discord
+import psutil
+
+from core.bot import Core
+from core.database import db
+from core.intents import discover_extensions
+from core.recorder import read_recording
+
+from .fakes import FakePool, StubHTTP
+from .pipeline import collect, percentile, settle, track_events
+
+
+class Replayer:
+    """Feeds recorded dispatches to an offline bot and times them"""
+
+    def __init__(self, bot: Core):
+        self.bot = bot
+        self.state = bot._connection
+        self.parse: Dict[str, List[float]] = defaultdict(list)
+        self.handle: Dict[str, List[float]] = defaultdict(list)
+        self.lag: List[float] = []
+        self.errors: Counter = Counter()
+        self.skipped: Counter = Counter()
+        self.tasks: List[asyncio.Task] = []
+
+        async def on_error(event_method, *args, **kwargs):
+            self.errors[event_method] += 1
+
+        bot.on_error = on_error
+
+    def feed(self, event: str, data: Any) -> None:
+        """Hand one dispatch to the connection state
+
+        The login events are applied to the cache directly: the real parsers
+        would wait on guild chunking and a READY that never comes offline.
+        """
+        if event == "READY":
+            self.state.user = discord.ClientUser(state=self.state, data=data["user"])
+            return
+        if event == "GUILD_CREATE":
+            self.state._get_create_guild(data)
+            return
+
+        parser = self.state.parsers.get(event)
+        if parser is None:
+            self.skipped[event] += 1
+            return
+        parser(data)
+
+    async def _finish(
+        self, event: str, pending: List[asyncio.Task], started: float
+    ) -> None:
+        await settle(pending)
+        self.handle[event].append(time.perf_counter() - started)
+
+    def dispatch(self, event: str, data: Any) -> None:
+        pending = collect()
+        started = time.perf_counter()
+        try:
+            self.feed(event, data)
+        except Exception:
+            self.errors[f"parse {event}"] += 1
+        self.parse[event].append(time.perf_counter() - started)
+        if pending:
+            self.tasks.append(
+                asyncio.create_task(self._finish(event, pending, started))
+            )
+
+    async def replay(self, entries, speed: float, limit: int) -> int:
+        """Feed the entries, spaced by their recorded times over the speed"""
+        started = time.perf_counter()
+        count = 0
+        for seconds, event, data in entries:
+            if count >= limit:
+                break
+            if speed:
+                due = started + seconds / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.lag.append(max(time.perf_counter() - due, 0))
+            else:
+                # the websocket yields between frames, so handlers get a turn
+                await asyncio.sleep(0)
+            self.dispatch(event, data)
+            count += 1
+
+        await asyncio.gather(*self.tasks)
+        return count
+
+
+async def sample_memory(process: psutil.Process, peak: List[int]) -> None:
+    while True:
+        peak[0] = max(peak[0], process.memory_info().rss)
+        await asyncio.sleep(0.05)
+
+
+async def build_bot(args: argparse.Namespace) -> "tuple[Core, StubHTTP, List[str]]":
+    bot = Core()
+    await bot._async_setup_hook()
+    http = StubHTTP(bot, latency=args.rest_latency / 1000)
+    http.install()
+    track_events(bot)
+
+    failed = []
+    for extension in args.extensions or discover_extensions():
+        try:
+            await bot.load_extension(extension)
+        except Exception as e:
+            failed.append(f"{extension}: {e.__class__.__name__}")
+    return bot, http, failed
+
+
+async def run(args: argparse.Namespace) -> dict:
+    db._pool = FakePool(latency=args.db_latency / 1000)
+    db.ready = True
+    bot, http, failed = await build_bot(args)
+
+    header, entries = read_recording(args.recording)
+    if args.events:
+        entries = (entry for entry in entries if entry[1] in args.events)
+
+    replayer = Replayer(bot)
+    process = psutil.Process()
+    rss_before = process.memory_info().rss
+    peak = [rss_before]
+    sampler = asyncio.create_task(sample_memory(process, peak))
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    cpu_before = process.cpu_times()
+    started = time.perf_counter()
+    count = await replayer.replay(entries, args.speed, args.limit)
+    elapsed = time.perf_counter() - started
+    cpu_after = process.cpu_times()
+
+    sampler.cancel()
+    cpu = (cpu_after.user - cpu_before.user) + (cpu_after.system - cpu_before.system)
+    queries = sum(shape.count for shape in db.stats.shapes.values())
+    report: Dict[str, Any] = {
+        "recorded_at": header.get("recorded_at"),
+        "events": count,
+        "seconds": elapsed,
+        "events_per_second": count / elapsed if elapsed else 0,
+        "cpu_seconds": cpu,
+        "cpu_percent": cpu / elapsed * 100 if elapsed else 0,
+        "rss_mb": {
+            "before": rss_before / 2**20,
+            "peak": peak[0] / 2**20,
+            "after": process.memory_info().rss / 2**20,
+        },
+        "lag_p99_ms": percentile(replayer.lag, 0.99) * 1000,
+        "lag_max_ms": max(replayer.lag, default=0) * 1000,
+        "db_queries": queries,
+        "rest_calls": dict(http.calls.most_common()),
+        "errors": dict(replayer.errors),
+        "skipped": dict(replayer.skipped),
+        "failed_extensions": failed,
+        "types": {
+            event: {
+                "count": len(parse),
+                "parse_p50_ms": percentile(parse, 0.5) * 1000,
+                "parse_p99_ms": percentile(parse, 0.99) * 1000,
+                "handled": len(replayer.handle[event]),
+                "handle_p50_ms": percentile(replayer.handle[event], 0.5) * 1000,
+                "handle_p99_ms": percentile(replayer.handle[event], 0.99) * 1000,
+            }
+            for event, parse in sorted(
+                replayer.parse.items(), key=lambda item: -len(item[1])
+            )
+        },
+    }
+    if args.tracemalloc:
+        current, traced_peak = tracemalloc.get_traced_memory()
+        report["traced_mb"] = {"current": current / 2**20, "peak": traced_peak / 2**20}
+        report["top_allocations"] = [
+            f"{stat.size / 2**10:.0f} KiB {stat.traceback}"
+            for stat in tracemalloc.take_snapshot().statistics("lineno")[:10]
+        ]
+        tracemalloc.stop()
+
+    await db.close()
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"{report['events']} events in {report['seconds']:.2f}s "
+        f"({report['events_per_second']:.0f}/s), "
+        f"CPU {report['cpu_seconds']:.2f}s ({report['cpu_percent']:.0f}%), "
+        f"lag p99 {report['lag_p99_ms']:.1f}ms max {report['lag_max_ms']:.1f}ms"
+    )
+    rss = report["rss_mb"]
+    print(
+        f"RSS {rss['before']:.0f}MB before, {rss['peak']:.0f}MB peak, "
+        f"{rss['after']:.0f}MB after"
+        + (
+            f"; traced peak {report['traced_mb']['peak']:.1f}MB"
+            if "traced_mb" in report
+            else ""
+        )
+    )
+    print(f"db queries: {report['db_queries']}")
+    for event, stats in report["types"].items():
+        print(
+            f"  {event:<28} {stats['count']:>7}  "
+            f"parse p50 {stats['parse_p50_ms']:6.3f}ms p99 {stats['parse_p99_ms']:6.3f}ms"
+            + (
+                f"  handlers p50 {stats['handle_p50_ms']:7.2f}ms "
+                f"p99 {stats['handle_p99_ms']:7.2f}ms"
+                if stats["handled"]
+                else ""
+            )
+        )
+    for route, count in list(report["rest_calls"].items())[:10]:
+        print(f"  rest {count:>7}  {route}")
+    for event, count in report["errors"].items():
+        print(f"  errors in {event}: {count}")
+    for event, count in report["skipped"].items():
+        print(f"  no parser for {event} ({count}x)")
+    for line in report.get("top_allocations", []):
+        print(f"  {line}")
+    for extension in report["failed_extensions"]:
+        print(f"  not loaded: {extension}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("recording", help="file written with GATEWAY_RECORD")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="1 for real time, 0 for flat out"
+    )
+    parser.add_argument("--limit", type=int, default=10**9, help="events to feed")
+    parser.add_argument(
+        "--events",
+        type=lambda value: set(value.split(",")),
+        help="comma separated event types to feed, all by default",
+    )
+    parser.add_argument(
+        "--extensions",
+        type=lambda value: value.split(","),
+        help="comma separated extensions, everything the bot loads by default",
+    )
+    parser.add_argument(
+        "--db-latency", type=float, default=0.3, help="fake db round trip in ms"
+    )
+    parser.add_argument(
+        "--rest-latency", type=float, default=0, help="stubbed REST call in ms"
+    )
+    parser.add_argument("--tracemalloc", action="store_true", help="trace allocations")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--log-level", default="CRITICAL")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level)
+    report = asyncio.run(run(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
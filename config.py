@@ -1,8 +1,11 @@
 import configparser
+import logging
 import os
 import sys
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 
 class Config:
     """Configuration class that loads settings from a CFG file with hot-reload support"""
@@ -85,7 +88,7 @@ class Config:
             return True
 
         except Exception as e:
-            print(f"Error reloading config: {e}")
+            logger.error(f"Error reloading config: {e}")
             return False
 
     def _parse_config(self):
@@ -0,0 +1,541 @@
+import abc
+import asyncio
+import contextlib
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+logger = logging.getLogger(__name__)
+
+# message edits share a per-channel bucket of 5 per 5 seconds
+STREAM_EDIT_INTERVAL = 1.2
+
+
+class PromptFile:
+    """A text file read once and reloaded only when its mtime changes"""
+
+    def __init__(self, path: str):
+        """Initialize the prompt file
+
+        Args:
+            path (str): Path to the file
+        """
+        self.path = path
+        self._mtime: Optional[float] = None
+        self._text = ""
+
+    def get(self) -> str:
+        """Get the file's contents, rereading it if it changed on disk"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError as e:
+            logger.warning(f"Could not stat {self.path}: {e}")
+            return self._text
+
+        if mtime != self._mtime:
+            with open(self.path, "r") as f:
+                self._text = f.read()
+            self._mtime = mtime
+            logger.info(f"Loaded {self.path}")
+
+        return self._text
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: about four characters per token plus message framing"""
+    return len(text) // 4 + 4
+
+
+class Conversation:
+    """An immutable chat transcript kept within a token budget
+
+    Adding a turn returns a new conversation, so replying twice to the same
+    message branches instead of mixing both replies into one history. Turns
+    share their strings with the conversation they came from.
+    """
+
+    __slots__ = ("system", "budget", "turns", "tokens")
+
+    def __init__(
+        self,
+        system: str,
+        budget: int,
+        turns: Tuple[Tuple[str, str, int], ...] = (),
+        tokens: int = 0,
+    ):
+        """Initialize the conversation
+
+        Args:
+            system (str): The system prompt, always sent first
+            budget (int): Token budget for the whole prompt
+            turns (Tuple): (role, content, tokens) for each turn
+            tokens (int): Sum of the turns' token estimates
+        """
+        self.system = system
+        self.budget = budget
+        self.turns = turns
+        self.tokens = tokens
+
+    def add(self, role: str, content: str) -> "Conversation":
+        """Get a conversation with one more turn, dropping the oldest turns
+        that no longer fit the budget
+
+        Args:
+            role (str): "user" or "assistant"
+            content (str): The turn's text
+
+        Returns:
+            Conversation: The extended conversation
+        """
+        turns = self.turns + ((role, content, estimate_tokens(content)),)
+        tokens = self.tokens + turns[-1][2]
+        available = self.budget - estimate_tokens(self.system)
+
+        start = 0
+        # the newest turn is always kept, and a history never opens with a reply
+        while start < len(turns) - 1 and (
+            tokens > available or turns[start][0] == "assistant"
+        ):
+            tokens -= turns[start][2]
+            start += 1
+
+        return Conversation(self.system, self.budget, turns[start:], tokens)
+
+    def messages(self) -> List[Dict[str, str]]:
+        """The chat messages to send to the model"""
+        messages = [{"role": "system", "content": self.system}]
+        messages.extend({"role": role, "content": text} for role, text, _ in self.turns)
+        return messages
+
+    @property
+    def last_reply(self) -> str:
+        """The newest assistant turn, or an empty string"""
+        for role, text, _ in reversed(self.turns):
+            if role == "assistant":
+                return text
+        return ""
+
+    @property
+    def size(self) -> int:
+        """Characters held by the turns, for memory accounting"""
+        return sum(len(text) for _, text, _ in self.turns)
+
+
+class ConversationStore:
+    """Conversations keyed by the message that shows them
+
+    Entries expire after an idle TTL and the least recently used ones are
+    evicted once either the entry count or the total character count goes
+    over its cap.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 6000,
+        ttl: int = 1800,
+        max_conversations: int = 512,
+        max_chars: int = 4_000_000,
+    ):
+        """Initialize the store
+
+        Args:
+            token_budget (int): Prompt token budget for each conversation
+            ttl (int): Idle seconds before a conversation expires
+            max_conversations (int): Maximum number of stored conversations
+            max_chars (int): Maximum characters across stored conversations
+        """
+        self.token_budget = token_budget
+        self.ttl = ttl
+        self.max_conversations = max_conversations
+        self.max_chars = max_chars
+        self._data: "OrderedDict[int, Tuple[Conversation, float]]" = OrderedDict()
+        self._chars = 0
+
+    def start(self, system: str) -> Conversation:
+        """Begin an empty conversation with this store's budget"""
+        return Conversation(system, self.token_budget)
+
+    def put(self, key: int, conversation: Conversation) -> None:
+        """Store the conversation shown by a message
+
+        Args:
+            key (int): The message id
+            conversation (Conversation): The conversation up to that message
+        """
+        self.pop(key)
+        self._data[key] = (conversation, time.monotonic() + self.ttl)
+        self._chars += conversation.size
+        self._evict()
+
+    def get(self, key: int) -> Optional[Conversation]:
+        """Get the conversation shown by a message and refresh its expiry
+
+        Args:
+            key (int): The message id
+
+        Returns:
+            Optional[Conversation]: The conversation, or None if it expired
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        conversation, expires_at = entry
+        now = time.monotonic()
+        if now >= expires_at:
+            self.pop(key)
+            return None
+
+        self._data[key] = (conversation, now + self.ttl)
+        self._data.move_to_end(key)
+        return conversation
+
+    def pop(self, key: int) -> Optional[Conversation]:
+        """Remove the conversation shown by a message"""
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return None
+
+        self._chars -= entry[0].size
+        return entry[0]
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._data:
+            key, (_, expires_at) = next(iter(self._data.items()))
+            if (
+                len(self._data) <= self.max_conversations
+                and self._chars <= self.max_chars
+                and expires_at > now
+            ):
+                break
+            self.pop(key)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class AIBackend(abc.ABC):
+    """Something that streams chat completions"""
+
+    @abc.abstractmethod
+    async def stream(
+        self, model: str, messages: List[Dict], max_tokens: int
+    ) -> AsyncIterator[str]:
+        """Stream a completion as text deltas
+
+        Args:
+            model (str): The model name
+            messages (List[Dict]): The chat messages
+            max_tokens (int): Completion token limit
+
+        Yields:
+            str: The next piece of generated text
+        """
+
+    async def close(self) -> None:
+        """Release the backend's connections"""
+
+
+class GroqBackend(AIBackend):
+    """Completions from the Groq API over one long-lived client"""
+
+    def __init__(self, api_key: str):
+        from groq import AsyncGroq
+
+        self.client = AsyncGroq(api_key=api_key)
+
+    async def stream(self, model, messages, max_tokens):
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            max_completion_tokens=max_tokens,
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def close(self):
+        await self.client.close()
+
+
+class FakeBackend(AIBackend):
+    """Offline stand-in that echoes the prompt with configurable timing"""
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        tokens_per_second: float = 50.0,
+        reply: Optional[str] = None,
+    ):
+        """Initialize the fake backend
+
+        Args:
+            latency (float): Seconds before the first token
+            tokens_per_second (float): Generation speed after that
+            reply (str, optional): Fixed reply text instead of an echo
+        """
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.reply = reply
+
+    async def stream(self, model, messages, max_tokens):
+        await asyncio.sleep(self.latency)
+        text = self.reply or f"you said: {messages[-1]['content']}"
+        for i, word in enumerate(text.split(" ")[:max_tokens]):
+            yield word if i == 0 else f" {word}"
+            await asyncio.sleep(1 / self.tokens_per_second)
+
+
+def backend_from_env() -> AIBackend:
+    """Pick the backend from AI_BACKEND (groq or fake) and related variables"""
+    if os.getenv("AI_BACKEND", "groq").lower() == "fake":
+        return FakeBackend(
+            latency=float(os.getenv("AI_FAKE_LATENCY", "0.5")),
+            tokens_per_second=float(os.getenv("AI_FAKE_TPS", "50")),
+        )
+    return GroqBackend(api_key=os.getenv("AI_KEY"))
+
+
+async def stream_completion(
+    backend: AIBackend,
+    model: str,
+    messages: List[Dict],
+    on_text: Callable[[str], Awaitable[None]],
+    max_tokens: int = 1024,
+    interval: float = STREAM_EDIT_INTERVAL,
+) -> str:
+    """Stream a chat completion, reporting the text so far at a bounded rate
+
+    The first token is reported right away; later updates wait until at least
+    ``interval`` seconds have passed since the previous one.
+
+    Args:
+        backend (AIBackend): Where the completion comes from
+        model (str): The model name
+        messages (List[Dict]): The chat messages
+        on_text (Callable): Coroutine called with the text generated so far
+        max_tokens (int): Completion token limit
+        interval (float): Minimum seconds between on_text calls
+
+    Returns:
+        str: The full completion
+    """
+    loop = asyncio.get_running_loop()
+
+    parts: List[str] = []
+    last_report: Optional[float] = None
+    async for delta in backend.stream(model, messages, max_tokens):
+        parts.append(delta)
+        now = loop.time()
+        if last_report is None or now - last_report >= interval:
+            last_report = now
+            await on_text("".join(parts))
+
+    return "".join(parts)
+
+
+class AIQueueFull(Exception):
+    """Raised when the scheduler's wait queue is already at capacity"""
+
+
+class _Ticket:
+    __slots__ = ("guild_id", "granted")
+
+    def __init__(self, guild_id: int, granted: asyncio.Future):
+        self.guild_id = guild_id
+        self.granted = granted
+
+
+class AIScheduler:
+    """Bounds concurrent completions globally and per guild
+
+    Requests over either limit wait in a FIFO queue. A request whose guild is
+    at its limit is skipped rather than blocking the queue, so one busy guild
+    can't starve the others. Waiters are told their position as it changes.
+    """
+
+    def __init__(
+        self,
+        backend: AIBackend,
+        max_concurrency: int = 4,
+        per_guild: int = 2,
+        max_queue: int = 64,
+        queue_timeout: float = 120.0,
+        timeout: float = 90.0,
+    ):
+        """Initialize the scheduler
+
+        Args:
+            backend (AIBackend): Where completions come from
+            max_concurrency (int): Completions in flight across all guilds
+            per_guild (int): Completions in flight for any one guild
+            max_queue (int): Waiting requests before new ones are refused
+            queue_timeout (float): Seconds a request may wait for a slot
+            timeout (float): Seconds a completion may take once started
+        """
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.per_guild = per_guild
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+
+        self.running = 0
+        self._guild_running: Dict[int, int] = {}
+        self._waiting: Deque[_Ticket] = deque()
+        self._moved: Optional[asyncio.Future] = None
+
+    @property
+    def waiting(self) -> int:
+        """Number of queued requests"""
+        return len(self._waiting)
+
+    def _can_start(self, guild_id: int) -> bool:
+        return (
+            self.running < self.max_concurrency
+            and self._guild_running.get(guild_id, 0) < self.per_guild
+        )
+
+    def _start(self, guild_id: int) -> None:
+        self.running += 1
+        self._guild_running[guild_id] = self._guild_running.get(guild_id, 0) + 1
+
+    def _finish(self, guild_id: int) -> None:
+        self.running -= 1
+        count = self._guild_running.get(guild_id, 1) - 1
+        if count:
+            self._guild_running[guild_id] = count
+        else:
+            self._guild_running.pop(guild_id, None)
+        self._grant()
+
+    def _grant(self) -> None:
+        """Hand free slots to the oldest eligible waiters"""
+        granted = False
+        for ticket in list(self._waiting):
+            if self.running >= self.max_concurrency:
+                break
+            if self._can_start(ticket.guild_id):
+                self._waiting.remove(ticket)
+                self._start(ticket.guild_id)
+                ticket.granted.set_result(None)
+                granted = True
+
+        if granted:
+            self._notify_moved()
+
+    def _notify_moved(self) -> None:
+        """Wake waiters so they re-read their queue position"""
+        if self._moved is not None:
+            self._moved.set_result(None)
+            self._moved = None
+
+    async def _wait(self, ticket: _Ticket, on_position) -> None:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.queue_timeout
+        last_position = None
+
+        while not ticket.granted.done():
+            position = self._waiting.index(ticket) + 1
+            if on_position is not None and position != last_position:
+                last_position = position
+                await on_position(position)
+                continue
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+
+            if self._moved is None:
+                self._moved = loop.create_future()
+            await asyncio.wait(
+                (ticket.granted, self._moved),
+                timeout=remaining,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self,
+        guild_id: int,
+        on_position: Optional[Callable[[int], Awaitable[None]]] = None,
+    ):
+        """Hold one completion slot for the duration of the block
+
+        Args:
+            guild_id (int): The guild the request comes from, 0 for DMs
+            on_position (Callable, optional): Coroutine called with the
+                request's queue position whenever it changes
+
+        Raises:
+            AIQueueFull: If too many requests are already waiting
+            asyncio.TimeoutError: If no slot frees up in time
+        """
+        if self._can_start(guild_id) and not self._waiting:
+            self._start(guild_id)
+        else:
+            if len(self._waiting) >= self.max_queue:
+                raise AIQueueFull
+
+            ticket = _Ticket(guild_id, asyncio.get_running_loop().create_future())
+            self._waiting.append(ticket)
+            # a waiter held back by its own guild's limit mustn't block others
+            self._grant()
+            try:
+                if not ticket.granted.done():
+                    await self._wait(ticket, on_position)
+            except BaseException:
+                if ticket.granted.done():
+                    self._finish(guild_id)
+                else:
+                    self._waiting.remove(ticket)
+                    ticket.granted.cancel()
+                    self._notify_moved()
+                raise
+
+        try:
+            yield
+        finally:
+            self._finish(guild_id)
+
+    async def run(
+        self,
+        guild_id: int,
+        model: str,
+        messages: List[Dict],
+        on_text: Callable[[str], Awaitable[None]],
+        on_position: Optional[Callable[[int], Awaitable[None]]] = None,
+    ) -> str:
+        """Queue for a slot, then stream a completion within the timeout
+
+        Args:
+            guild_id (int): The guild the request comes from, 0 for DMs
+            model (str): The model name
+            messages (List[Dict]): The chat messages
+            on_text (Callable): Coroutine called with the text so far
+            on_position (Callable, optional): Coroutine called with the
+                queue position while waiting
+
+        Returns:
+            str: The full completion
+        """
+        async with self.slot(guild_id, on_position):
+            async with asyncio.timeout(self.timeout):
+                return await stream_completion(self.backend, model, messages, on_text)
+
+    async def close(self) -> None:
+        """Close the backend"""
+        await self.backend.close()
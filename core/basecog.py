@@ -1,11 +1,14 @@
 import logging
-from typing import Dict, List
+from typing import Dict, List, Union
 
 import discord
 from discord.ext import commands
 
 import config
 
+from .pages import ListPageSource, PageSource
+from .router import ComponentId, RoutedModal, router
+
 
 class BaseCog(commands.Cog):
     """base cog class that all other cogs should inherit from"""
@@ -74,166 +77,43 @@ class BaseCog(commands.Cog):
     async def paginate(
         self,
         ctx,
-        pages: List[discord.Embed],
+        pages: Union[List[discord.Embed], PageSource],
         timeout: int = 60,
         compact=False,
         extra_buttons=[],
+        owner_id: int = None,
+        message: discord.Message = None,
     ):
-        """send paginated embeds with navigation buttons"""
-        if not pages:
+        """send paginated embeds with navigation buttons
+
+        pages can be a list of embeds or a PageSource that renders them lazily.
+        extra_buttons must be routed buttons (see core.router) since the view
+        isn't kept alive between clicks. pass message to turn an existing
+        message into the paginator instead of replying
+        """
+        if not isinstance(pages, PageSource):
+            if not pages:
+                return await ctx.reply(
+                    embed=self.error_embed(description="no pages to display")
+                )
+            pages = ListPageSource(pages)
+
+        first_page = await pages.get(0)
+        if first_page is None:
             return await ctx.reply(
                 embed=self.error_embed(description="no pages to display")
             )
 
-        class PaginationView(discord.ui.View):
-            def __init__(self, pages, outer):
-                super().__init__(timeout=timeout)
-                self.pages = pages
-                self.current_page = 0
-                self.outer = outer
-
-                if len(pages) > 1:
-                    if not compact:
-                        self.add_item(
-                            discord.ui.Button(
-                                emoji=config.FIRST_ICON,
-                                style=discord.ButtonStyle.gray,
-                                custom_id="first",
-                                row=0,
-                            )
-                        )
-
-                    self.add_item(
-                        discord.ui.Button(
-                            emoji=config.PREV_ICON,
-                            style=discord.ButtonStyle.gray,
-                            custom_id="prev",
-                            row=0,
-                        )
-                    )
-
-                    self.add_item(
-                        discord.ui.Button(
-                            label=f"1/{len(pages)}",
-                            emoji=config.PAGE_ICON,
-                            style=discord.ButtonStyle.primary,
-                            custom_id="page",
-                            row=0,
-                        )
-                    )
-
-                    self.add_item(
-                        discord.ui.Button(
-                            emoji=config.NEXT_ICON,
-                            style=discord.ButtonStyle.gray,
-                            custom_id="next",
-                            row=0,
-                        )
-                    )
-
-                    if not compact:
-                        self.add_item(
-                            discord.ui.Button(
-                                emoji=config.LAST_ICON,
-                                style=discord.ButtonStyle.gray,
-                                custom_id="last",
-                                row=0,
-                            )
-                        )
-
-                if extra_buttons:
-                    for button in extra_buttons:
-                        self.add_item(button)
-
-                for child in self.children:
-                    if child in extra_buttons:
-                        continue
-                    child.callback = self.button_callback
-
-            async def button_callback(self, interaction: discord.Interaction):
-                button_id = interaction.data["custom_id"]
-
-                if interaction.user.id != ctx.author.id:
-                    await interaction.response.send_message(
-                        embed=self.outer.error_embed(
-                            description="you cannot use these controls"
-                        ),
-                        ephemeral=True,
-                    )
-                    return
-
-                if button_id == "first":
-                    self.current_page = 0
-                elif button_id == "prev":
-                    self.current_page = (self.current_page - 1) % len(self.pages)
-                elif button_id == "next":
-                    self.current_page = (self.current_page + 1) % len(self.pages)
-                elif button_id == "last":
-                    self.current_page = len(self.pages) - 1
-                elif button_id == "page":
-
-                    class PageInputModal(discord.ui.Modal, title="Jump to Page"):
-                        page_number = discord.ui.TextInput(
-                            label=f"enter page number (1-{len(self.pages)})",
-                            placeholder="page number",
-                            min_length=1,
-                            max_length=len(str(len(self.pages))),
-                        )
-
-                        async def on_submit(
-                            self, modal_interaction: discord.Interaction
-                        ):
-                            try:
-                                page = int(self.page_number.value)
-                                if 1 <= page <= len(self.view.pages):
-                                    self.view.current_page = page - 1
-
-                                    for child in self.view.children:
-                                        if child.custom_id == "page":
-                                            child.label = (
-                                                f"{page}/{len(self.view.pages)}"
-                                            )
-
-                                    await modal_interaction.response.edit_message(
-                                        embed=self.view.pages[self.view.current_page],
-                                        view=self.view,
-                                    )
-                                else:
-                                    await modal_interaction.response.send_message(
-                                        f"enter a number between 1 and {len(self.view.pages)}",
-                                        ephemeral=True,
-                                    )
-                            except ValueError:
-                                await modal_interaction.response.send_message(
-                                    "enter a valid number", ephemeral=True
-                                )
-
-                    modal = PageInputModal()
-                    modal.view = self
-                    await interaction.response.send_modal(modal)
-                    return
-
-                for child in self.children:
-                    if child.custom_id == "page":
-                        child.label = f"{self.current_page + 1}/{len(self.pages)}"
-
-                await interaction.response.edit_message(
-                    embed=self.pages[self.current_page], view=self
-                )
+        owner_id = owner_id or ctx.author.id
+        state = {"source": pages, "compact": compact, "extra": list(extra_buttons)}
+        key = router.state.put(state, ttl=timeout)
 
-            async def on_timeout(self):
-                message = self.message
-                if message:
-                    try:
-                        for child in self.children:
-                            child.disabled = True
-                        await message.edit(view=self)
-                    except Exception:
-                        pass
+        view = _pagination_view(key, state, owner_id, 0)
+        if message is not None:
+            await message.edit(embed=first_page, view=view)
+            return message
 
-        view = PaginationView(pages, self)
-        view.message = await ctx.reply(embed=pages[0], view=view)
-        return view.message
+        return await ctx.reply(embed=first_page, view=view)
 
     async def create_dropdown_menu(
         self,
@@ -248,7 +128,7 @@ class BaseCog(commands.Cog):
             ctx: The command context
             embeds: A dictionary mapping option names to embeds
             placeholder: The dropdown placeholder text
-            timeout: Timeout in seconds
+            timeout: Idle time in seconds before the menu expires
 
         Returns:
             The sent message
@@ -271,7 +151,7 @@ class BaseCog(commands.Cog):
             ctx: The command context
             category_pages: A dictionary mapping category names to lists of embed pages
             placeholder: The dropdown placeholder text
-            timeout: Timeout in seconds
+            timeout: Idle time in seconds before the menu expires
 
         Returns:
             The sent message
@@ -281,197 +161,201 @@ class BaseCog(commands.Cog):
                 embed=self.error_embed(description="no categories to display")
             )
 
-        class CombinedView(discord.ui.View):
-            def __init__(self, category_pages_dict, outer):
-                super().__init__(timeout=timeout)
-                self.category_pages = category_pages_dict
-                self.current_category = next(iter(category_pages_dict.keys()))
-                self.current_page = 0
-                self.outer = outer
-
-                self.select = discord.ui.Select(
-                    placeholder=placeholder,
-                    options=[
-                        discord.SelectOption(label=key, value=key)
-                        for key in category_pages_dict.keys()
-                    ],
-                )
+        first_category = next(iter(category_pages.keys()))
+        state = {
+            "categories": category_pages,
+            "current": first_category,
+            "placeholder": placeholder,
+        }
+        key = router.state.put(state, ttl=timeout)
+
+        return await ctx.reply(
+            embed=category_pages[first_category][0],
+            view=_menu_view(key, state, ctx.author.id, 0),
+        )
 
-                self.select.callback = self.dropdown_callback
-                self.add_item(self.select)
-
-                self.update_buttons()
-
-            def update_buttons(self):
-                for item in list(self.children):
-                    if isinstance(item, discord.ui.Button):
-                        self.remove_item(item)
-
-                if len(self.category_pages[self.current_category]) > 1:
-                    self.add_item(
-                        NavigationButton(
-                            emoji=config.FIRST_ICON,
-                            style=discord.ButtonStyle.gray,
-                            custom_id="first",
-                            row=1,
-                            outer=self.outer,
-                        )
-                    )
-
-                    self.add_item(
-                        NavigationButton(
-                            emoji=config.PREV_ICON,
-                            style=discord.ButtonStyle.gray,
-                            custom_id="prev",
-                            row=1,
-                            outer=self.outer,
-                        )
-                    )
-
-                    total_pages = len(self.category_pages[self.current_category])
-                    self.add_item(
-                        PageButton(
-                            label=f"{self.current_page + 1}/{total_pages}",
-                            emoji=config.PAGE_ICON,
-                            style=discord.ButtonStyle.primary,
-                            custom_id="page",
-                            row=1,
-                            outer=self.outer,
-                        )
-                    )
-
-                    self.add_item(
-                        NavigationButton(
-                            emoji=config.NEXT_ICON,
-                            style=discord.ButtonStyle.gray,
-                            custom_id="next",
-                            row=1,
-                            outer=self.outer,
-                        )
-                    )
-
-                    self.add_item(
-                        NavigationButton(
-                            emoji=config.LAST_ICON,
-                            style=discord.ButtonStyle.gray,
-                            custom_id="last",
-                            row=1,
-                            outer=self.outer,
-                        )
-                    )
-
-            async def dropdown_callback(self, interaction: discord.Interaction):
-                if interaction.user.id != ctx.author.id:
-                    await interaction.response.send_message(
-                        embed=self.outer.error_embed(
-                            description="you cannot use these controls"
-                        ),
-                        ephemeral=True,
-                    )
-                    return
-                self.current_category = self.select.values[0]
-                self.current_page = 0
-
-                self.update_buttons()
-
-                await interaction.response.edit_message(
-                    embed=self.category_pages[self.current_category][self.current_page],
-                    view=self,
-                )
 
-            async def on_timeout(self):
-                message = self.message
-                if message:
-                    try:
-                        for child in self.children:
-                            child.disabled = True
-                        await message.edit(view=self)
-                    except Exception:
-                        pass
-
-        class NavigationButton(discord.ui.Button):
-            def __init__(self, outer, **kwargs):
-                super().__init__(**kwargs)
-                self.outer = outer
-
-            async def callback(self, interaction: discord.Interaction):
-                if interaction.user.id != ctx.author.id:
-                    await interaction.response.send_message(
-                        embed=self.outer.error_embed(
-                            description="you cannot use these controls"
-                        ),
-                        ephemeral=True,
-                    )
-                    return
-
-                view = self.view
-                pages = view.category_pages[view.current_category]
-
-                if self.custom_id == "first":
-                    view.current_page = 0
-                elif self.custom_id == "prev":
-                    view.current_page = (view.current_page - 1) % len(pages)
-                elif self.custom_id == "next":
-                    view.current_page = (view.current_page + 1) % len(pages)
-                elif self.custom_id == "last":
-                    view.current_page = len(pages) - 1
-
-                for child in view.children:
-                    if isinstance(child, PageButton):
-                        child.label = f"{view.current_page + 1}/{len(pages)}"
-
-                await interaction.response.edit_message(
-                    embed=pages[view.current_page], view=view
-                )
+def _nav_buttons(handler, key, owner_id, index, label, compact=False, last=True, row=0):
+    """build the first/prev/page/next/last buttons for a routed paginator"""
 
-        class PageButton(discord.ui.Button):
-            def __init__(self, outer, **kwargs):
-                super().__init__(**kwargs)
-                self.outer = outer
-
-            async def callback(self, interaction: discord.Interaction):
-                if interaction.user.id != ctx.author.id:
-                    await interaction.response.send_message(
-                        embed=self.outer.error_embed(
-                            description="you cannot use these controls"
-                        ),
-                        ephemeral=True,
-                    )
-                    return
-                view = self.view
-                pages = view.category_pages[view.current_category]
-
-                class PageInputModal(discord.ui.Modal, title="jump to page"):
-                    page_number = discord.ui.TextInput(
-                        label=f"enter page number (1-{len(pages)})",
-                        placeholder="Page number",
-                        min_length=1,
-                        max_length=len(str(len(pages))),
-                    )
-
-                    async def on_submit(self, modal_interaction: discord.Interaction):
-                        try:
-                            page = int(self.page_number.value)
-                            if 1 <= page <= len(pages):
-                                view.current_page = page - 1
-                                await modal_interaction.response.edit_message(
-                                    embed=pages[view.current_page], view=view
-                                )
-                            else:
-                                await modal_interaction.response.send_message(
-                                    f"enter a number between 1 and {len(pages)}.",
-                                    ephemeral=True,
-                                )
-                        except ValueError:
-                            await modal_interaction.response.send_message(
-                                "enter a valid number.", ephemeral=True
-                            )
-
-                await interaction.response.send_modal(PageInputModal())
+    def nav(action, **kwargs):
+        return router.button(handler, action, owner_id, index, key, row=row, **kwargs)
 
-        first_category = next(iter(category_pages.keys()))
-        first_page = category_pages[first_category][0]
+    buttons = []
+    if not compact:
+        buttons.append(
+            nav("first", emoji=config.FIRST_ICON, style=discord.ButtonStyle.gray)
+        )
+    buttons.append(nav("prev", emoji=config.PREV_ICON, style=discord.ButtonStyle.gray))
+    buttons.append(
+        nav(
+            "page",
+            label=label,
+            emoji=config.PAGE_ICON,
+            style=discord.ButtonStyle.primary,
+        )
+    )
+    buttons.append(nav("next", emoji=config.NEXT_ICON, style=discord.ButtonStyle.gray))
+    if not compact and last:
+        buttons.append(
+            nav("last", emoji=config.LAST_ICON, style=discord.ButtonStyle.gray)
+        )
+    return buttons
+
+
+def _jump_modal(handler, component, total):
+    """build the jump to page modal for a routed paginator"""
+    return RoutedModal(
+        router.encode(
+            handler, "jump", component.owner_id, component.page, component.key
+        ),
+        title="jump to page",
+        label=f"enter page number (1-{total})" if total else "enter page number",
+        placeholder="page number",
+        max_length=len(str(total)) if total else 4,
+    )
+
+
+def _pagination_view(key, state, owner_id, index) -> discord.ui.View:
+    """build the controls for a paginate message showing page index"""
+    source = state["source"]
+    items = []
+    if not source.is_bounded or source.length > 1:
+        items.extend(
+            _nav_buttons(
+                "pages",
+                key,
+                owner_id,
+                index,
+                source.label(index),
+                compact=state["compact"],
+                last=source.is_bounded,
+            )
+        )
+    items.extend(state["extra"])
+    return router.view(*items)
+
+
+def _menu_view(key, state, owner_id, index) -> discord.ui.View:
+    """build the controls for a combined menu showing page index"""
+    select = discord.ui.Select(
+        custom_id=router.encode("menu", "select", owner_id, 0, key),
+        placeholder=state["placeholder"],
+        options=[
+            discord.SelectOption(label=name, value=name)
+            for name in state["categories"].keys()
+        ],
+    )
+
+    pages = state["categories"][state["current"]]
+    items = [select]
+    if len(pages) > 1:
+        items.extend(
+            _nav_buttons(
+                "menu", key, owner_id, index, f"{index + 1}/{len(pages)}", row=1
+            )
+        )
+    return router.view(*items)
 
-        view = CombinedView(category_pages, self)
-        view.message = await ctx.reply(embed=first_page, view=view)
-        return view.message
+
+@router.handler("pages")
+async def _pages_component(interaction: discord.Interaction, component: ComponentId):
+    state = router.state.get(component.key)
+    if state is None:
+        return await router.expired(interaction)
+
+    source = state["source"]
+    current = component.page
+
+    if component.action == "page":
+        return await interaction.response.send_modal(
+            _jump_modal("pages", component, source.length)
+        )
+    elif component.action == "jump":
+        try:
+            index = int(router.modal_value(interaction)) - 1
+        except ValueError:
+            return await interaction.response.send_message(
+                "enter a valid number", ephemeral=True
+            )
+
+        if index < 0 or await source.get(index) is None:
+            return await interaction.response.send_message(
+                (
+                    f"enter a number between 1 and {source.length}"
+                    if source.length
+                    else "that page doesn't exist"
+                ),
+                ephemeral=True,
+            )
+    elif component.action == "first":
+        index = 0
+    elif component.action == "prev":
+        if current > 0:
+            index = current - 1
+        elif source.is_bounded:
+            index = source.length - 1
+        else:
+            index = 0
+    elif component.action == "next":
+        index = current + 1
+    elif component.action == "last":
+        index = source.length - 1
+    else:
+        return
+
+    page = await source.get(index)
+    if page is None:
+        index = 0
+        page = await source.get(0)
+
+    await interaction.response.edit_message(
+        embed=page,
+        view=_pagination_view(component.key, state, component.owner_id, index),
+    )
+
+
+@router.handler("menu")
+async def _menu_component(interaction: discord.Interaction, component: ComponentId):
+    state = router.state.get(component.key)
+    if state is None:
+        return await router.expired(interaction)
+
+    pages = state["categories"][state["current"]]
+    current = component.page
+
+    if component.action == "select":
+        state["current"] = interaction.data["values"][0]
+        pages = state["categories"][state["current"]]
+        index = 0
+    elif component.action == "page":
+        return await interaction.response.send_modal(
+            _jump_modal("menu", component, len(pages))
+        )
+    elif component.action == "jump":
+        try:
+            index = int(router.modal_value(interaction)) - 1
+        except ValueError:
+            return await interaction.response.send_message(
+                "enter a valid number.", ephemeral=True
+            )
+
+        if not 0 <= index < len(pages):
+            return await interaction.response.send_message(
+                f"enter a number between 1 and {len(pages)}.", ephemeral=True
+            )
+    elif component.action == "first":
+        index = 0
+    elif component.action == "prev":
+        index = (current - 1) % len(pages)
+    elif component.action == "next":
+        index = (current + 1) % len(pages)
+    elif component.action == "last":
+        index = len(pages) - 1
+    else:
+        return
+
+    await interaction.response.edit_message(
+        embed=pages[index],
+        view=_menu_view(component.key, state, component.owner_id, index),
+    )
@@ -1,100 +1,225 @@
 import datetime
 import logging
 import os
+import time
 
 import aiohttp
 import discord
 from discord.ext import commands
 
+from .cluster import ClusterClient
 from .database import db
+from .executors import BoundedExecutor, ExecutorRegistry
+from .intents import StartupProfile, discover_extensions
+from .members import member_stats
+from .metrics import (
+    MetricsServer,
+    command_latency,
+    http_trace_config,
+    message_latency,
+    messages,
+    registry,
+)
+from .monitor import monitor
 from .prefixes import get_prefix_callable
+from .recorder import GatewayRecorder
+from .router import router
+from .sampler import profiler
 from .utils import would_invoke
 
 logger = logging.getLogger(__name__)
 
 
 class Core(commands.AutoShardedBot):
-    def __init__(self):
-        intents = discord.Intents.all()
+    def __init__(self, shard_ids=None, shard_count=None):
+        profile = StartupProfile.from_extensions(discover_extensions(), type(self))
 
         super().__init__(
+            shard_ids=shard_ids,
+            shard_count=shard_count,
             command_prefix=get_prefix_callable(),
-            intents=intents,
+            intents=profile.intents,
+            member_cache_flags=profile.member_cache_flags,
+            chunk_guilds_at_startup=profile.chunk_guilds_at_startup,
             help_command=None,
+            http_trace=http_trace_config(),
             allowed_mentions=discord.AllowedMentions(everyone=False, roles=False),
         )
 
+        self.profile = profile
+        logger.info(f"Startup profile: {profile.describe()}")
+
         self.start_time = datetime.datetime.utcnow()
         self.session = None
+        self.cluster = None
+        self.metrics_server = None
+        self.recorder = None
+        # blocking work gets its own bounded pools so one workload can't take
+        # every thread; the default executor is left to DNS lookups and friends
+        self.executors = ExecutorRegistry()
+        self.executors.register(BoundedExecutor("image", max_workers=2, max_queue=4))
+        self.executors.register(
+            BoundedExecutor("misc", max_workers=4, max_queue=32, policy="wait")
+        )
         self.strip_after_prefix = True
         self.application_emojis = {}
 
     async def setup_hook(self):
         """Initialize aiohttp session, database, and any other async startup tasks"""
-        self.session = aiohttp.ClientSession()
+        self.session = aiohttp.ClientSession(trace_configs=[http_trace_config()])
+        self.add_listener(router.dispatch, "on_interaction")
+
+        self.cluster = ClusterClient.from_env(self)
+        if self.cluster is not None:
+            try:
+                await self.cluster.start()
+                logger.info(
+                    f"Connected to cluster hub as cluster {self.cluster.cluster_id}"
+                )
+            except OSError as e:
+                logger.error(f"Could not connect to cluster hub: {e}")
+                self.cluster = None
 
         await db.setup(self)
         logger.info("Database initialized")
 
+        await self._setup_metrics()
+
         loaded_extensions = []
         failed_extensions = []
 
         await self.load_extension("jishaku")
 
-        for filename in os.listdir("./core/exts"):
-            if filename.endswith(".py"):
-                extension = f"core.exts.{filename[:-3]}"
-                try:
-                    await self.load_extension(extension)
-                    loaded_extensions.append(extension)
-                    logger.info(f"Loaded extension: {extension}")
-                except Exception as e:
-                    failed_extensions.append(extension)
-                    logger.error(f"Failed to load extension {extension}: {e}")
-
-        for filename in os.listdir("./exts"):
-            if filename.endswith(".py"):
-                extension = f"exts.{filename[:-3]}"
-                try:
-                    await self.load_extension(extension)
-                    loaded_extensions.append(extension)
-                    logger.info(f"Loaded extension: {extension}")
-                except Exception as e:
-                    failed_extensions.append(extension)
-                    logger.error(f"Failed to load extension {extension}: {e}")
+        for extension in discover_extensions():
+            try:
+                await self.load_extension(extension)
+                loaded_extensions.append(extension)
+                logger.info(f"Loaded extension: {extension}")
+            except Exception as e:
+                failed_extensions.append(extension)
+                logger.error(f"Failed to load extension {extension}: {e}")
 
         logger.info(f"Loaded {len(loaded_extensions)} extensions")
         if failed_extensions:
             logger.warning(f"Failed to load {len(failed_extensions)} extensions")
 
+        # opt-in capture of gateway traffic for bench/replay.py
+        self.recorder = GatewayRecorder.from_env(self)
+        if self.recorder is not None:
+            self.recorder.start(self)
+
         logger.info("Bot setup complete")
 
         if not self.application_emojis:
             emojis = await self.fetch_application_emojis()
             self.application_emojis = {emoji.id: emoji for emoji in emojis}
 
+    async def _setup_metrics(self):
+        """Register bot-level gauges and serve metrics if METRICS_PORT is set"""
+        registry.gauge(
+            "chime_gateway_latency_seconds",
+            "Heartbeat latency per shard",
+            ("shard",),
+            collect=lambda: {
+                (str(shard_id),): latency
+                for shard_id, latency in self.latencies
+                if latency == latency
+            },
+        )
+        registry.gauge(
+            "chime_guilds",
+            "Guilds on this process",
+            collect=lambda: {(): len(self.guilds)},
+        )
+        self.add_listener(self._command_completed, "on_command_completion")
+        self.add_listener(self._command_failed, "on_command_error")
+        monitor.start()
+        if os.getenv("CONTINUOUS_PROFILER", "1") != "0":
+            profiler.start(
+                os.path.join("profiles", f"cluster-{self.cluster.cluster_id}")
+                if self.cluster
+                else "profiles"
+            )
+
+        port = os.getenv("METRICS_PORT")
+        if not port:
+            return
+
+        # every cluster gets its own port next to the configured one
+        port = int(port) + (self.cluster.cluster_id if self.cluster else 0)
+        self.metrics_server = MetricsServer(port=port)
+        try:
+            await self.metrics_server.start()
+        except OSError as e:
+            logger.error(f"Could not serve metrics on port {port}: {e}")
+            self.metrics_server = None
+
+    async def invoke(self, ctx):
+        # set here rather than in an on_command listener, which runs as its own
+        # task and can lose the race with on_command_completion
+        ctx.metrics_started = time.perf_counter()
+        await super().invoke(ctx)
+
+    async def _command_completed(self, ctx):
+        started = getattr(ctx, "metrics_started", None)
+        if started is not None:
+            command_latency.observe(
+                time.perf_counter() - started, ctx.command.qualified_name, "ok"
+            )
+
+    async def _command_failed(self, ctx, error):
+        started = getattr(ctx, "metrics_started", None)
+        if started is not None and ctx.command is not None:
+            command_latency.observe(
+                time.perf_counter() - started, ctx.command.qualified_name, "error"
+            )
+
     async def on_ready(self):
         """Called when the bot is ready and connected to Discord"""
         logger.info(f"Logged in as {self.user} (ID: {self.user.id})")
         logger.info(f"Connected to {len(self.guilds)} guilds")
 
+        if self.cluster is not None:
+            await self.cluster.ready()
+
     async def on_guild_join(self, guild):
         """Called when the bot joins a new guild"""
         logger.info(f"Joined new guild: {guild.name} (ID: {guild.id})")
 
         await db.update_guild(guild.id, guild.name)
 
+    async def on_guild_remove(self, guild):
+        """Called when the bot leaves a guild"""
+        member_stats.invalidate(guild.id)
+
+    async def on_member_join(self, member):
+        member_stats.member_join(member)
+
+    async def on_raw_member_remove(self, payload):
+        member_stats.member_remove(payload.guild_id, payload.user.id)
+
+    async def on_member_update(self, before, after):
+        member_stats.member_update(before, after)
+
+    async def on_guild_role_delete(self, role):
+        member_stats.role_delete(role)
+
     async def on_message(self, message):
         """insert user before processing commands"""
-        if (message.author.bot or not message.guild) or (
-            message.author.id in db.cache.entity_keys
-        ):
-            return
+        messages.inc()
+        started = time.perf_counter()
+        try:
+            if (message.author.bot or not message.guild) or (
+                message.author.id in db.cache.entity_keys
+            ):
+                return
 
-        if await would_invoke(self, message):
-            await db.update_user(message.author.id, message.author.name)
+            if await would_invoke(self, message):
+                await db.update_user(message.author.id, message.author.name)
 
-        await self.process_commands(message)
+            await self.process_commands(message)
+        finally:
+            message_latency.observe(time.perf_counter() - started)
 
     async def fetch_image(self, url):
         """Fetch an image from a URL"""
@@ -108,6 +233,21 @@ class Core(commands.AutoShardedBot):
         if self.session:
             await self.session.close()
 
+        if self.cluster is not None:
+            await self.cluster.close()
+
+        if self.metrics_server is not None:
+            await self.metrics_server.close()
+
+        if self.recorder is not None and self.recorder.running:
+            self.recorder.stop()
+
+        monitor.stop()
+        if profiler.running:
+            profiler.stop()
+
         await db.close()
 
+        self.executors.shutdown()
+
         await super().close()
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Tuple, Union
+
+import discord
+
+import config
+
+from .router import ComponentId, router
+
+logger = logging.getLogger(__name__)
+
+# channel edits and permission overwrites are bucketed per channel, so a few
+# requests in flight keep every bucket busy without tripping the global limit
+DEFAULT_CONCURRENCY = 4
+
+
+class BulkResult:
+    """Outcome of a bulk operation"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.succeeded = 0
+        self.failed: List[Tuple[Any, Exception]] = []
+        self.cancelled = False
+
+    @property
+    def done(self) -> int:
+        return self.succeeded + len(self.failed)
+
+
+class BulkOperation:
+    """Runs one coroutine per item with bounded concurrency
+
+    Batches with more than one item get a status message that is edited with
+    live progress, has a cancel button for the invoker and ends with a summary
+    that lists partial failures.
+    """
+
+    def __init__(
+        self,
+        ctx,
+        items: Iterable[Any],
+        action: Callable[[Any], Awaitable[Any]],
+        label: str,
+        summary: Union[str, Callable[[BulkResult], str]],
+        describe: Callable[[Any], str] = str,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        progress_interval: float = 2.0,
+        detail: Optional[Callable[[], str]] = None,
+        status_threshold: int = 2,
+        delete_after: Optional[float] = None,
+    ):
+        """Initialize the operation
+
+        Args:
+            ctx: The command context, whose cog builds the status embeds
+            items (Iterable[Any]): What to run the action on
+            action (Callable): Coroutine function applied to each item
+            label (str): What's happening, shown while running
+            summary (Union[str, Callable]): Final message, either formatted
+                with ``count`` or built from the BulkResult
+            describe (Callable): Renders an item in the failure list
+            concurrency (int): Maximum number of actions in flight
+            progress_interval (float): Minimum seconds between status edits
+            detail (Callable, optional): Extra progress text, such as a
+                running total kept by the action
+            status_threshold (int): Fewest items that get a status message
+            delete_after (float, optional): Seconds to keep the summary for
+        """
+        self.ctx = ctx
+        self.items = list(items)
+        self.action = action
+        self.label = label
+        self.summary = summary
+        self.describe = describe
+        self.concurrency = max(1, concurrency)
+        self.progress_interval = progress_interval
+        self.detail = detail
+        self.status_threshold = status_threshold
+        self.delete_after = delete_after
+
+        self.result = BulkResult(len(self.items))
+        self.message: Optional[discord.Message] = None
+        self._cancelled = asyncio.Event()
+        self._key: Optional[str] = None
+
+    def cancel(self) -> None:
+        """Stop starting new actions; ones already in flight still finish"""
+        self._cancelled.set()
+
+    async def run(self) -> BulkResult:
+        """Run the operation to completion or cancellation
+
+        Returns:
+            BulkResult: What succeeded, failed and whether it was cancelled
+        """
+        if self.result.total < self.status_threshold:
+            for item in self.items:
+                await self._run_one(item)
+            return self.result
+
+        key = self._key = router.state.put(self)
+        # the invoking message may be gone by now (purge deletes it first)
+        self.message = await self.ctx.send(
+            reference=self.ctx.message.to_reference(fail_if_not_exists=False),
+            mention_author=False,
+            embed=self._progress_embed(),
+            view=router.view(
+                router.button(
+                    "bulk",
+                    "cancel",
+                    self.ctx.author.id,
+                    key=key,
+                    label="cancel",
+                    style=discord.ButtonStyle.gray,
+                )
+            ),
+        )
+
+        items = iter(self.items)
+        workers = [
+            asyncio.create_task(self._worker(items))
+            for _ in range(min(self.concurrency, self.result.total))
+        ]
+        progress = asyncio.create_task(self._report_progress())
+
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            progress.cancel()
+            router.state.pop(key)
+
+        self.result.cancelled = self._cancelled.is_set()
+        try:
+            await self.message.edit(
+                embed=self._summary_embed(), view=None, delete_after=self.delete_after
+            )
+        except discord.HTTPException:
+            pass
+
+        return self.result
+
+    async def _worker(self, items) -> None:
+        for item in items:
+            if self._cancelled.is_set():
+                return
+            await self._run_one(item)
+
+    async def _run_one(self, item) -> None:
+        try:
+            await self.action(item)
+            self.result.succeeded += 1
+        except (discord.HTTPException, discord.ClientException, ValueError) as e:
+            self.result.failed.append((item, e))
+
+    async def _report_progress(self) -> None:
+        last_status = self._progress_text()
+        last_edit = time.monotonic()
+        while True:
+            await asyncio.sleep(0.5)
+            # keeps the cancel button's state alive however long this runs
+            router.state.get(self._key)
+            now = time.monotonic()
+            status = self._progress_text()
+            if status == last_status or now - last_edit < self.progress_interval:
+                continue
+
+            last_status, last_edit = status, now
+            try:
+                await self.message.edit(embed=self._progress_embed(status))
+            except discord.HTTPException:
+                pass
+
+    def _progress_text(self) -> str:
+        text = (
+            f"{config.WAIT_ICON} {self.label}: "
+            f"**{self.result.done}/{self.result.total}**"
+        )
+        if self.result.failed:
+            text += f" ({len(self.result.failed)} failed)"
+        if self.detail:
+            text += f", {self.detail()}"
+        return text
+
+    def _progress_embed(self, text: Optional[str] = None) -> discord.Embed:
+        return self.ctx.cog.embed(
+            description=text or self._progress_text(), color=config.WARN_COLOR
+        )
+
+    def _summary_embed(self) -> discord.Embed:
+        if callable(self.summary):
+            description = self.summary(self.result)
+        else:
+            description = self.summary.format(count=self.result.succeeded)
+        if self.result.cancelled:
+            description += f", cancelled after {self.result.done}/{self.result.total}"
+
+        if not self.result.failed:
+            return self.ctx.cog.success_embed(description=description)
+
+        failures = "\n".join(
+            f"- {self.describe(item)}: {getattr(error, 'text', None) or error}"
+            for item, error in self.result.failed[:10]
+        )
+        if len(self.result.failed) > 10:
+            failures += f"\n- ... and {len(self.result.failed) - 10} more"
+        return self.ctx.cog.warning_embed(
+            description=f"{description}\n**{len(self.result.failed)}** failed:\n{failures}"
+        )
+
+
+@router.handler("bulk")
+async def _bulk_component(interaction: discord.Interaction, component: ComponentId):
+    operation = router.state.get(component.key)
+    if operation is None:
+        return await router.expired(interaction)
+
+    if component.action == "cancel":
+        operation.cancel()
+        await interaction.response.defer()
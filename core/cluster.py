@@ -0,0 +1,234 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+IPC_HOST = "127.0.0.1"
+DEFAULT_IPC_PORT = 8765
+STATS_INTERVAL = 15
+
+
+def shard_ranges(shard_count: int, clusters: int) -> List[List[int]]:
+    """Split shard ids into contiguous, evenly sized ranges
+
+    Args:
+        shard_count (int): Total number of shards
+        clusters (int): Number of clusters to split them across
+
+    Returns:
+        List[List[int]]: The shard ids owned by each cluster
+    """
+    clusters = max(1, min(clusters, shard_count))
+    size, extra = divmod(shard_count, clusters)
+    ranges, start = [], 0
+    for cluster_id in range(clusters):
+        end = start + size + (1 if cluster_id < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def _send(writer: asyncio.StreamWriter, message: Dict[str, Any]) -> None:
+    writer.write(json.dumps(message, separators=(",", ":")).encode() + b"\n")
+    await writer.drain()
+
+
+class ClusterHub:
+    """The launcher's end of the IPC channel
+
+    Clusters connect over a local TCP socket and exchange JSON lines: they
+    push their stats periodically, announce when they're ready, ask for the
+    combined stats of every cluster and request rolling restarts.
+    """
+
+    def __init__(self, port: int = DEFAULT_IPC_PORT):
+        self.port = port
+        self.stats: Dict[int, Dict[str, Any]] = {}
+        self.on_restart: Optional[Callable[[], Any]] = None
+        self._writers: Dict[int, asyncio.StreamWriter] = {}
+        self._ready: Dict[int, asyncio.Event] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self) -> None:
+        """Start listening for clusters"""
+        self._server = await asyncio.start_server(self._handle, IPC_HOST, self.port)
+        logger.info(f"Cluster IPC listening on {IPC_HOST}:{self.port}")
+
+    async def close(self) -> None:
+        """Stop listening and drop every connection"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for writer in self._writers.values():
+            writer.close()
+
+    def ready_event(self, cluster_id: int) -> asyncio.Event:
+        """The event set when a cluster reports it's ready"""
+        return self._ready.setdefault(cluster_id, asyncio.Event())
+
+    async def shutdown(self, cluster_id: int) -> bool:
+        """Ask a cluster to log out cleanly
+
+        Returns:
+            bool: Whether the cluster was connected to receive the request
+        """
+        writer = self._writers.get(cluster_id)
+        if writer is None:
+            return False
+        try:
+            await _send(writer, {"op": "shutdown"})
+            return True
+        except ConnectionError:
+            return False
+
+    def forget(self, cluster_id: int) -> None:
+        """Drop a cluster's readiness and stats before it restarts"""
+        self.ready_event(cluster_id).clear()
+        self.stats.pop(cluster_id, None)
+
+    async def _handle(self, reader, writer) -> None:
+        cluster_id = None
+        try:
+            async for line in reader:
+                message = json.loads(line)
+                op = message.get("op")
+
+                if op == "hello":
+                    cluster_id = message["cluster"]
+                    self._writers[cluster_id] = writer
+                elif op == "ready":
+                    self.ready_event(cluster_id).set()
+                elif op == "stats":
+                    self.stats[cluster_id] = message["stats"]
+                elif op == "query":
+                    await _send(
+                        writer,
+                        {
+                            "op": "reply",
+                            "nonce": message["nonce"],
+                            "clusters": {str(k): v for k, v in self.stats.items()},
+                        },
+                    )
+                elif op == "restart" and self.on_restart is not None:
+                    asyncio.ensure_future(self.on_restart())
+        except (ConnectionError, json.JSONDecodeError, KeyError) as e:
+            logger.warning(f"Cluster {cluster_id} IPC connection failed: {e}")
+        finally:
+            if cluster_id is not None and self._writers.get(cluster_id) is writer:
+                del self._writers[cluster_id]
+            writer.close()
+
+
+class ClusterClient:
+    """A cluster's end of the IPC channel"""
+
+    def __init__(self, bot, cluster_id: int, port: int = DEFAULT_IPC_PORT):
+        """Initialize the client
+
+        Args:
+            bot: The cluster's bot, whose stats are pushed to the hub
+            cluster_id (int): This cluster's id
+            port (int): The hub's port
+        """
+        self.bot = bot
+        self.cluster_id = cluster_id
+        self.port = port
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._nonces = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+
+    @classmethod
+    def from_env(cls, bot) -> Optional["ClusterClient"]:
+        """Build a client when the process was started by the launcher"""
+        if "CLUSTER_ID" not in os.environ:
+            return None
+        return cls(
+            bot,
+            int(os.environ["CLUSTER_ID"]),
+            int(os.getenv("IPC_PORT", DEFAULT_IPC_PORT)),
+        )
+
+    async def start(self) -> None:
+        """Connect to the hub and start pushing stats"""
+        reader, self._writer = await asyncio.open_connection(IPC_HOST, self.port)
+        await self._send({"op": "hello", "cluster": self.cluster_id})
+        self._tasks = [
+            asyncio.create_task(self._read(reader)),
+            asyncio.create_task(self._push_stats()),
+        ]
+
+    async def close(self) -> None:
+        """Stop the background tasks and disconnect"""
+        for task in self._tasks:
+            task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    def local_stats(self) -> Dict[str, Any]:
+        """This cluster's stats as sent to the hub"""
+        return {
+            "guilds": len(self.bot.guilds),
+            "users": len(self.bot.users),
+            "shards": list(self.bot.shard_ids or []),
+            "latency": self.bot.latency,
+        }
+
+    async def ready(self) -> None:
+        """Tell the hub this cluster is up, so a rolling restart can move on"""
+        await self._send({"op": "stats", "stats": self.local_stats()})
+        await self._send({"op": "ready"})
+
+    async def cluster_stats(self, timeout: float = 5.0) -> Dict[int, Dict[str, Any]]:
+        """Get the latest stats of every cluster
+
+        Returns:
+            Dict[int, Dict[str, Any]]: Stats keyed by cluster id
+        """
+        nonce = next(self._nonces)
+        future = self._pending[nonce] = asyncio.get_running_loop().create_future()
+        try:
+            await self._send({"op": "query", "nonce": nonce})
+            clusters = await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(nonce, None)
+
+        stats = {int(k): v for k, v in clusters.items()}
+        stats[self.cluster_id] = self.local_stats()
+        return stats
+
+    async def request_restart(self) -> None:
+        """Ask the launcher to restart every cluster, one at a time"""
+        await self._send({"op": "restart"})
+
+    async def _send(self, message: Dict[str, Any]) -> None:
+        if self._writer is None:
+            raise ConnectionError("not connected to the cluster hub")
+        await _send(self._writer, message)
+
+    async def _read(self, reader) -> None:
+        async for line in reader:
+            message = json.loads(line)
+            op = message.get("op")
+
+            if op == "reply":
+                future = self._pending.get(message["nonce"])
+                if future is not None and not future.done():
+                    future.set_result(message["clusters"])
+            elif op == "shutdown":
+                logger.info("Shutdown requested by the cluster launcher")
+                asyncio.ensure_future(self.bot.close())
+
+        logger.warning("Lost connection to the cluster hub")
+
+    async def _push_stats(self) -> None:
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            try:
+                await self._send({"op": "stats", "stats": self.local_stats()})
+            except ConnectionError as e:
+                logger.warning(f"Could not push cluster stats: {e}")
@@ -1,12 +1,19 @@
+import asyncio
+import contextlib
 import hashlib
 import logging
 import os
+import sys
 import time
 from typing import Any, Dict, List, Optional, Tuple
 
 import asyncpg
 from dotenv import load_dotenv
 
+from .metrics import cache_requests, db_acquire, db_errors, db_latency, registry
+from .migrations import migrate
+from .querystats import QueryStats, SlowQuery, rows_affected
+
 load_dotenv()
 
 logger = logging.getLogger(__name__)
@@ -15,22 +22,28 @@ logger = logging.getLogger(__name__)
 class Cache:
     """A simple, efficient cache for database queries with smart invalidation capabilities."""
 
-    def __init__(self, ttl=300):
+    def __init__(self, ttl=300, namespace="db"):
         self.ttl = ttl
+        self.namespace = namespace
         self.data = {}
         self.table_keys = {}
         self.entity_keys = {}
+        # key -> (table, entity ids), so removing a key touches only its own sets
+        self.key_tags = {}
 
     def get(self, key: str) -> Tuple[bool, Any]:
         """Get an item from cache if it exists and hasn't expired."""
         if key in self.data:
             result, expiry_time = self.data[key]
             if time.time() < expiry_time:
-                logger.debug(f"Cache hit: {key[:50]}...")
+                # lazy arguments: nothing is formatted unless DEBUG is on
+                logger.debug("Cache hit: %.50s...", key)
+                cache_requests.inc(self.namespace, "hit")
                 return True, result
             else:
                 self._remove(key)
-                logger.debug(f"Cache expired: {key[:50]}...")
+                logger.debug("Cache expired: %.50s...", key)
+        cache_requests.inc(self.namespace, "miss")
         return False, None
 
     def set(
@@ -44,6 +57,9 @@ class Cache:
         if result is None:
             return
 
+        if key in self.key_tags:
+            self._remove(key)
+
         expiry_time = time.time() + self.ttl
         self.data[key] = (result, expiry_time)
 
@@ -51,65 +67,55 @@ class Cache:
             self.table_keys[table_name] = set()
         self.table_keys[table_name].add(key)
 
-        if entity_ids:
-            for entity_id in entity_ids:
-                if entity_id:
-                    if entity_id not in self.entity_keys:
-                        self.entity_keys[entity_id] = set()
-                    self.entity_keys[entity_id].add(key)
+        entity_ids = [entity_id for entity_id in entity_ids or () if entity_id]
+        for entity_id in entity_ids:
+            if entity_id not in self.entity_keys:
+                self.entity_keys[entity_id] = set()
+            self.entity_keys[entity_id].add(key)
 
-        logger.debug(f"Cached result: {key[:50]}...")
+        self.key_tags[key] = (table_name, entity_ids)
+        logger.debug("Cached result: %.50s...", key)
 
     def _remove(self, key: str) -> None:
         """Remove a specific key from the cache and all tracking structures."""
-        if key in self.data:
-            del self.data[key]
+        self.data.pop(key, None)
+        tags = self.key_tags.pop(key, None)
+        if tags is None:
+            return
 
-            for table_keys in self.table_keys.values():
-                if key in table_keys:
-                    table_keys.remove(key)
+        table_name, entity_ids = tags
+        table_keys = self.table_keys.get(table_name)
+        if table_keys is not None:
+            table_keys.discard(key)
+            if not table_keys:
+                del self.table_keys[table_name]
 
-            for entity_keys in self.entity_keys.values():
-                if key in entity_keys:
-                    entity_keys.remove(key)
+        for entity_id in entity_ids:
+            entity_keys = self.entity_keys.get(entity_id)
+            if entity_keys is not None:
+                entity_keys.discard(key)
+                if not entity_keys:
+                    del self.entity_keys[entity_id]
 
     def invalidate(
         self, table_name: Optional[str] = None, entity_id: Optional[str] = None
     ) -> int:
         """Intelligently invalidate cache entries by table name or entity ID."""
-        keys_to_remove = set()
-
         if table_name is None and entity_id is None:
             count = len(self.data)
             self.data.clear()
             self.table_keys.clear()
             self.entity_keys.clear()
+            self.key_tags.clear()
             return count
 
-        if table_name and entity_id is None:
-            if table_name in self.table_keys:
-                keys_to_remove.update(self.table_keys[table_name])
-                self.table_keys[table_name].clear()
-
         if entity_id:
-            if entity_id in self.entity_keys:
-                keys_to_remove.update(self.entity_keys[entity_id])
-                self.entity_keys[entity_id].clear()
-
-        if table_name and entity_id:
-            if table_name in self.table_keys and entity_id in self.entity_keys:
-                table_set = self.table_keys[table_name]
-                entity_set = self.entity_keys[entity_id]
-                keys_to_remove.update(table_set.intersection(entity_set))
+            keys_to_remove = set(self.entity_keys.get(entity_id, ()))
+        else:
+            keys_to_remove = set(self.table_keys.get(table_name, ()))
 
         for key in keys_to_remove:
-            if key in self.data:
-                del self.data[key]
-
-        if table_name in self.table_keys and not self.table_keys[table_name]:
-            del self.table_keys[table_name]
-        if entity_id in self.entity_keys and not self.entity_keys[entity_id]:
-            del self.entity_keys[entity_id]
+            self._remove(key)
 
         return len(keys_to_remove)
 
@@ -119,6 +125,89 @@ class Database:
         self._pool = None
         self.ready = False
         self.cache = Cache(ttl=cache_ttl)
+        self.waiting = 0
+        self.stats = QueryStats(
+            slow_threshold=float(os.getenv("DB_SLOW_QUERY_MS", "100")) / 1000,
+            explain=os.getenv("DB_EXPLAIN_SLOW", "0") == "1",
+        )
+        self._explains = set()
+
+        registry.gauge(
+            "chime_db_pool_connections",
+            "Connection pool usage",
+            ("state",),
+            collect=self.pool_stats,
+        )
+
+    def pool_stats(self) -> Dict[Tuple[str, ...], int]:
+        """Pool size, idle and in-use connections, and callers waiting for one"""
+        if self._pool is None:
+            return {}
+        size, idle = self._pool.get_size(), self._pool.get_idle_size()
+        return {
+            ("size",): size,
+            ("idle",): idle,
+            ("in_use",): size - idle,
+            ("waiting",): self.waiting,
+        }
+
+    @contextlib.asynccontextmanager
+    async def _acquire(self):
+        """Acquire a pooled connection, tracking waiters and wait time"""
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            conn = await self._pool.acquire()
+        finally:
+            self.waiting -= 1
+        db_acquire.observe(time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    def _observe(
+        self,
+        query: str,
+        args: Tuple,
+        helper: str,
+        method: str,
+        started: float,
+        rows: int,
+        failed: bool,
+    ) -> None:
+        """Record a query's timing, logging it and maybe explaining it if slow"""
+        duration = time.perf_counter() - started
+        db_latency.observe(duration, helper, method)
+        slow = self.stats.record(
+            query,
+            helper,
+            duration,
+            rows,
+            args,
+            failed=failed,
+            cacheable=method != "execute",
+        )
+        if slow is not None:
+            task = asyncio.create_task(self._explain(slow, query, args))
+            self._explains.add(task)
+            task.add_done_callback(self._explains.discard)
+
+    async def _explain(self, slow: SlowQuery, query: str, args: Tuple) -> None:
+        """Capture the plan of a slow query, rolling back whatever it did"""
+        try:
+            async with self._acquire() as conn:
+                tx = conn.transaction()
+                await tx.start()
+                try:
+                    rows = await conn.fetch(
+                        f"EXPLAIN (ANALYZE, BUFFERS) {query}", *args
+                    )
+                finally:
+                    await tx.rollback()
+            slow.plan = "\n".join(row[0] for row in rows)
+        except Exception as e:
+            logger.warning(f"Could not explain slow query in {slow.helper}: {e}")
 
     async def setup(self, bot=None):
         if self._pool is not None:
@@ -148,25 +237,22 @@ class Database:
                 bot.db_pool = self._pool
                 logger.info("Database pool attached to bot.db_pool")
 
-            await self._initialize_tables()
+            await self._migrate()
             self.ready = True
-            logger.info("Database connection established and tables initialized")
+            logger.info("Database connection established and schema up to date")
         except Exception as e:
             logger.error(f"Failed to connect to database: {e}")
             raise
 
-    async def _initialize_tables(self):
+    async def _migrate(self):
+        """Apply any pending migrations from the migrations directory"""
         try:
-            async with self._pool.acquire() as conn:
-                with open("schema.sql", "r") as f:
-                    schema = f.read()
-                await conn.execute(schema)
-        except FileNotFoundError:
-            logger.error("schema.sql file not found")
-            raise
+            applied = await migrate(self._pool)
         except Exception as e:
-            logger.error(f"Failed to initialize tables: {e}")
+            logger.error(f"Failed to migrate database: {e}")
             raise
+        if applied:
+            logger.info(f"Applied {len(applied)} migrations")
 
     async def close(self):
         if self._pool is not None:
@@ -255,13 +341,22 @@ class Database:
         if query_type in ("insert", "update", "delete") and table_name != "unknown":
             self.cache.invalidate(table_name=table_name)
 
+        # label with the helper that ran the query, e.g. get_prefix
+        helper = sys._getframe(1).f_code.co_name
+        started = time.perf_counter()
+        rows, failed = 0, False
         try:
-            async with self._pool.acquire() as conn:
+            async with self._acquire() as conn:
                 result = await conn.execute(query, *args, **kwargs)
+                rows = rows_affected(result)
                 return result
         except Exception as e:
+            failed = True
+            db_errors.inc(helper, "execute")
             logger.error(f"Database execute error: {e}, Query: {query}")
             raise
+        finally:
+            self._observe(query, args, helper, "execute", started, rows, failed)
 
     async def fetch(self, query: str, *args, **kwargs) -> List[asyncpg.Record]:
         if not self.ready:
@@ -270,11 +365,17 @@ class Database:
         cache_key = self._make_cache_key(query, args)
         hit, result = self.cache.get(cache_key)
         if hit:
+            self.stats.cache_hit(query)
             return result
 
+        # label with the helper that ran the query, e.g. get_prefix
+        helper = sys._getframe(1).f_code.co_name
+        started = time.perf_counter()
+        rows, failed = 0, False
         try:
-            async with self._pool.acquire() as conn:
+            async with self._acquire() as conn:
                 result = await conn.fetch(query, *args, **kwargs)
+                rows = len(result)
 
                 table = self._get_table_name(query)
                 entity_ids = self._extract_entity_ids(query, args, result)
@@ -282,8 +383,12 @@ class Database:
 
                 return result
         except Exception as e:
+            failed = True
+            db_errors.inc(helper, "fetch")
             logger.error(f"Database fetch error: {e}, Query: {query}")
             raise
+        finally:
+            self._observe(query, args, helper, "fetch", started, rows, failed)
 
     async def fetchrow(self, query: str, *args, **kwargs) -> Optional[asyncpg.Record]:
         if not self.ready:
@@ -292,11 +397,17 @@ class Database:
         cache_key = self._make_cache_key(query, args)
         hit, result = self.cache.get(cache_key)
         if hit:
+            self.stats.cache_hit(query)
             return result
 
+        # label with the helper that ran the query, e.g. get_prefix
+        helper = sys._getframe(1).f_code.co_name
+        started = time.perf_counter()
+        rows, failed = 0, False
         try:
-            async with self._pool.acquire() as conn:
+            async with self._acquire() as conn:
                 result = await conn.fetchrow(query, *args, **kwargs)
+                rows = 1 if result is not None else 0
 
                 table = self._get_table_name(query)
                 entity_ids = self._extract_entity_ids(query, args, result)
@@ -304,8 +415,12 @@ class Database:
 
                 return result
         except Exception as e:
+            failed = True
+            db_errors.inc(helper, "fetchrow")
             logger.error(f"Database fetchrow error: {e}, Query: {query}")
             raise
+        finally:
+            self._observe(query, args, helper, "fetchrow", started, rows, failed)
 
     async def fetchval(self, query: str, *args, **kwargs) -> Any:
         if not self.ready:
@@ -314,11 +429,17 @@ class Database:
         cache_key = self._make_cache_key(query, args)
         hit, result = self.cache.get(cache_key)
         if hit:
+            self.stats.cache_hit(query)
             return result
 
+        # label with the helper that ran the query, e.g. get_prefix
+        helper = sys._getframe(1).f_code.co_name
+        started = time.perf_counter()
+        rows, failed = 0, False
         try:
-            async with self._pool.acquire() as conn:
+            async with self._acquire() as conn:
                 result = await conn.fetchval(query, *args, **kwargs)
+                rows = 1 if result is not None else 0
 
                 if result is not None:
                     table = self._get_table_name(query)
@@ -327,8 +448,12 @@ class Database:
 
                 return result
         except Exception as e:
+            failed = True
+            db_errors.inc(helper, "fetchval")
             logger.error(f"Database fetchval error: {e}, Query: {query}")
             raise
+        finally:
+            self._observe(query, args, helper, "fetchval", started, rows, failed)
 
     async def transaction(self):
         if not self.ready:
@@ -630,9 +755,7 @@ class Database:
         command_str = result["command"]
         is_new = result["is_new"]
 
-        print(result)
-        print(command_str)
-        print(is_new)
+        logger.debug("Alias %s in guild %s: new=%s", alias, guild_id, is_new)
 
         if is_new:
             self.cache.invalidate(table_name="aliases", entity_id=str(guild_id))
@@ -661,12 +784,9 @@ class Database:
         was_deleted = result["was_deleted"]
         command = result["command"]
 
-        print(result)
-        print(was_deleted)
-        print(command)
+        logger.debug("Alias %s in guild %s: deleted=%s", alias, guild_id, was_deleted)
 
         if was_deleted:
-            print("invalidating")
             self.cache.invalidate(table_name="aliases", entity_id=str(guild_id))
 
         return was_deleted, command
@@ -682,7 +802,9 @@ class Database:
         """
 
         count = await self.fetchval(query, guild_id, command_parts)
-        print(count)
+        logger.debug(
+            "Removed %s aliases of %s in guild %s", count, command_parts, guild_id
+        )
 
         if count > 0:
             self.cache.invalidate(table_name="aliases", entity_id=str(guild_id))
@@ -700,7 +822,7 @@ class Database:
         """
 
         count = await self.fetchval(query, guild_id)
-        print(count)
+        logger.debug("Reset %s aliases in guild %s", count, guild_id)
 
         self.cache.invalidate(table_name="aliases", entity_id=str(guild_id))
 
@@ -0,0 +1,164 @@
+import asyncio
+import functools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutorRejected(Exception):
+    """Raised when an executor's queue is full and its policy is to reject"""
+
+    def __init__(self, name: str):
+        super().__init__(f"the {name} executor is busy")
+        self.name = name
+
+
+class BoundedExecutor:
+    """A named thread pool with a bounded queue and latency stats
+
+    At most ``max_workers`` calls run at once and ``max_queue`` more may wait
+    for a thread. Past that, the ``reject`` policy raises ExecutorRejected
+    right away while the ``wait`` policy makes the caller wait for room.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_workers: int,
+        max_queue: int,
+        policy: str = "reject",
+        window: int = 100,
+    ):
+        """Initialize the executor
+
+        Args:
+            name (str): Name shown in stats and thread names
+            max_workers (int): Threads in the pool
+            max_queue (int): Calls allowed to wait for a thread
+            policy (str): "reject" or "wait" when the queue is full
+            window (int): How many recent calls the latency stats cover
+        """
+        if policy not in ("reject", "wait"):
+            raise ValueError(f"unknown executor policy {policy!r}")
+
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.policy = policy
+
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"chime-{name}"
+        )
+        self._capacity = asyncio.Semaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._waits: Deque[float] = deque(maxlen=window)
+        self._runs: Deque[float] = deque(maxlen=window)
+
+        self.pending = 0
+        self.active = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        """Calls waiting for a thread"""
+        return max(self.pending - self.active, 0)
+
+    def _call(self, func: Callable, submitted: float) -> Any:
+        started = time.perf_counter()
+        with self._lock:
+            self.active += 1
+            self._waits.append(started - submitted)
+        try:
+            return func()
+        finally:
+            with self._lock:
+                self.active -= 1
+                self._runs.append(time.perf_counter() - started)
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking function on this executor's threads
+
+        Args:
+            func (Callable): The blocking function
+            *args: Positional arguments for it
+            **kwargs: Keyword arguments for it
+
+        Returns:
+            Any: What the function returned
+
+        Raises:
+            ExecutorRejected: If the queue is full and the policy is reject
+        """
+        if self.policy == "reject" and self._capacity.locked():
+            self.rejected += 1
+            raise ExecutorRejected(self.name)
+
+        async with self._capacity:
+            self.pending += 1
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(
+                    self._pool,
+                    self._call,
+                    functools.partial(func, *args, **kwargs),
+                    time.perf_counter(),
+                )
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.pending -= 1
+
+        self.completed += 1
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        """Current load and recent latency"""
+        with self._lock:
+            waits, runs = list(self._waits), list(self._runs)
+
+        return {
+            "workers": self.max_workers,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": sum(waits) / len(waits) * 1000 if waits else 0.0,
+            "avg_run_ms": sum(runs) / len(runs) * 1000 if runs else 0.0,
+            "max_run_ms": max(runs) * 1000 if runs else 0.0,
+        }
+
+    def shutdown(self) -> None:
+        """Stop accepting work; running calls finish in the background"""
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class ExecutorRegistry:
+    """The bot's named executors"""
+
+    def __init__(self):
+        self._executors: Dict[str, BoundedExecutor] = {}
+
+    def register(self, executor: BoundedExecutor) -> BoundedExecutor:
+        """Add an executor under its name"""
+        self._executors[executor.name] = executor
+        return executor
+
+    def __getitem__(self, name: str) -> BoundedExecutor:
+        return self._executors[name]
+
+    def __iter__(self):
+        return iter(self._executors.values())
+
+    def shutdown(self) -> None:
+        """Shut every executor down"""
+        for executor in self._executors.values():
+            executor.shutdown()
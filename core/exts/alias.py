@@ -80,7 +80,6 @@ class Alias(BaseCog):
                 embed=self.warning_embed(description="no aliases set for this server")
             )
 
-        print(aliases)
         aliases_per_page = 10
         pages = []
         for i in range(0, len(aliases), aliases_per_page):
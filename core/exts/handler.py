@@ -106,7 +106,6 @@ class ErrorHandler(BaseCog):
                 try:
                     await new_ctx.command.invoke(new_ctx)
                 except Exception as e:
-                    print(e)
                     await self.on_command_error(new_ctx, e)
 
         elif isinstance(error, commands.MissingRequiredArgument):
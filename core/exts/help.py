@@ -158,7 +158,7 @@ class MyHelpCommand(commands.HelpCommand):
                     embed=await self.create_subcommand_embed(subcommand), ephemeral=True
                 )
             except Exception as e:
-                print(e)
+                logger.error(f"Help menu failed: {e}", exc_info=e)
 
         select.callback = select_callback
         view = discord.ui.View().add_item(select)
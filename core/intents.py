@@ -0,0 +1,164 @@
+import importlib
+import logging
+import os
+from typing import Dict, Iterable, List, Set, Tuple
+
+import discord
+from discord.ext import commands
+
+from .members import ensure_chunked
+
+logger = logging.getLogger(__name__)
+
+# intents every prefix-command bot needs regardless of what's loaded
+BASE_INTENTS: Tuple[str, ...] = (
+    "guilds",
+    "guild_messages",
+    "message_content",
+    "emojis_and_stickers",
+)
+
+LISTENER_INTENTS: Dict[str, Tuple[str, ...]] = {
+    "on_message": ("guild_messages", "message_content"),
+    "on_message_edit": ("guild_messages",),
+    "on_message_delete": ("guild_messages",),
+    "on_bulk_message_delete": ("guild_messages",),
+    "on_raw_message_edit": ("guild_messages",),
+    "on_raw_message_delete": ("guild_messages",),
+    "on_reaction_add": ("guild_reactions",),
+    "on_reaction_remove": ("guild_reactions",),
+    "on_raw_reaction_add": ("guild_reactions",),
+    "on_raw_reaction_remove": ("guild_reactions",),
+    "on_member_join": ("members",),
+    "on_member_remove": ("members",),
+    "on_raw_member_remove": ("members",),
+    "on_member_update": ("members",),
+    "on_presence_update": ("presences",),
+    "on_typing": ("guild_typing", "dm_typing"),
+    "on_voice_state_update": ("voice_states",),
+    "on_invite_create": ("invites",),
+    "on_invite_delete": ("invites",),
+    "on_guild_emojis_update": ("emojis_and_stickers",),
+    "on_guild_stickers_update": ("emojis_and_stickers",),
+}
+
+
+def discover_extensions() -> List[str]:
+    """List the extension modules the bot loads at startup
+
+    Returns:
+        List[str]: Dotted module paths, core extensions first
+    """
+    extensions = []
+    for package in ("core/exts", "exts"):
+        for filename in sorted(os.listdir(f"./{package}")):
+            if filename.endswith(".py"):
+                extensions.append(f"{package.replace('/', '.')}.{filename[:-3]}")
+    return extensions
+
+
+def needs_members():
+    """Mark a command as reading the member list
+
+    The startup profile enables the members intent when any loaded command
+    carries this mark, and the guild is chunked the first time one of these
+    commands runs there instead of chunking every guild at login.
+    """
+
+    async def predicate(ctx):
+        if ctx.guild is not None:
+            await ensure_chunked(ctx.guild)
+        return True
+
+    def decorator(func):
+        callback = func.callback if isinstance(func, commands.Command) else func
+        callback.__needs_members__ = True
+        return commands.check(predicate)(func)
+
+    return decorator
+
+
+class StartupProfile:
+    """Gateway intents and member cache policy derived from the loaded code"""
+
+    def __init__(
+        self,
+        intents: discord.Intents,
+        member_cache_flags: discord.MemberCacheFlags,
+        chunk_guilds_at_startup: bool,
+        listeners: Set[str],
+        member_commands: List[str],
+    ):
+        self.intents = intents
+        self.member_cache_flags = member_cache_flags
+        self.chunk_guilds_at_startup = chunk_guilds_at_startup
+        self.listeners = listeners
+        self.member_commands = member_commands
+
+    @classmethod
+    def from_extensions(
+        cls, extensions: Iterable[str], bot_cls: type = None
+    ) -> "StartupProfile":
+        """Compute the profile from the listeners and commands in extensions
+
+        Extension modules are imported but not loaded, so this can run before
+        the bot is constructed.
+
+        Args:
+            extensions (Iterable[str]): Dotted module paths to inspect
+            bot_cls (type, optional): The bot class, whose own on_* event
+                handlers also count as listeners
+
+        Returns:
+            StartupProfile: The computed profile
+        """
+        listeners: Set[str] = set()
+        member_commands: List[str] = []
+
+        if bot_cls is not None:
+            listeners.update(name for name in dir(bot_cls) if name in LISTENER_INTENTS)
+
+        for extension in extensions:
+            try:
+                module = importlib.import_module(extension)
+            except Exception as e:
+                logger.warning(f"Could not inspect extension {extension}: {e}")
+                continue
+
+            for obj in vars(module).values():
+                if not (
+                    isinstance(obj, type)
+                    and issubclass(obj, commands.Cog)
+                    and obj.__module__ == module.__name__
+                ):
+                    continue
+
+                listeners.update(name for name, _ in obj.__cog_listeners__)
+                for command in obj.__cog_commands__:
+                    if getattr(command.callback, "__needs_members__", False):
+                        member_commands.append(command.qualified_name)
+
+        intents = discord.Intents.none()
+        for flag in BASE_INTENTS:
+            setattr(intents, flag, True)
+        for listener in listeners:
+            for flag in LISTENER_INTENTS.get(listener, ()):
+                setattr(intents, flag, True)
+        if member_commands:
+            intents.members = True
+
+        return cls(
+            intents=intents,
+            member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+            chunk_guilds_at_startup=False,
+            listeners=listeners,
+            member_commands=member_commands,
+        )
+
+    def describe(self) -> str:
+        """Summarize the enabled intents for logging"""
+        enabled = [name for name, value in self.intents if value]
+        return (
+            f"intents: {', '.join(enabled)}; "
+            f"member commands: {', '.join(self.member_commands) or 'none'}"
+        )
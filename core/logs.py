@@ -0,0 +1,165 @@
+import atexit
+import datetime
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+from typing import Dict, List, Optional, Tuple
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# attributes every LogRecord has; anything else was passed in extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields as keys of their own"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Thins out records that repeat the same message many times a second
+
+    Records are grouped by logger and message template, so this works best
+    with lazy ``logger.debug("Cache hit: %s", key)`` style calls. Each group
+    gets ``burst`` records an interval, then one in ``every``; the next record
+    let through carries how many were dropped as ``sampled``. Warnings and
+    above always pass.
+    """
+
+    def __init__(
+        self,
+        burst: int = 20,
+        every: int = 100,
+        interval: float = 1.0,
+        max_groups: int = 10_000,
+    ):
+        """Initialize the filter
+
+        Args:
+            burst (int): Records per group let through each interval
+            every (int): After the burst, one record in this many is let through
+            interval (float): Seconds per interval
+            max_groups (int): Groups tracked at most, so f-string messages
+                that never repeat can't grow this forever
+        """
+        super().__init__()
+        self.burst = burst
+        self.every = every
+        self.interval = interval
+        self.max_groups = max_groups
+        # (logger, template) -> [interval start, seen, dropped]
+        self._groups: Dict[Tuple[str, object], List] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        group = self._groups.get(key)
+        if group is None:
+            if len(self._groups) >= self.max_groups:
+                self._groups.clear()
+            group = self._groups[key] = [now, 0, 0]
+        elif now - group[0] >= self.interval:
+            group[0], group[1] = now, 0
+
+        group[1] += 1
+        if group[1] <= self.burst or group[1] % self.every == 0:
+            if group[2]:
+                record.sampled = group[2]
+                group[2] = 0
+            return True
+        group[2] += 1
+        return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Renders the message and traceback but leaves formatting to the listener
+
+    The stock handler formats the whole record on the calling thread and
+    folds the traceback into the message, which the JSON formatter can't
+    take apart again.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(name: str) -> logging.handlers.QueueListener:
+    """Send all logging through a queue to handlers on a background thread
+
+    Log calls on the event loop only put the record on a queue; a listener
+    thread writes it to stderr and to ``<name>.log``, rotated by size.
+    Configured by LOG_LEVEL (INFO), LOG_FORMAT (text or json),
+    LOG_MAX_BYTES (10MB), LOG_BACKUPS (5), and LOG_SAMPLE_BURST (20) and
+    LOG_SAMPLE_EVERY (100) for SamplingFilter; LOG_SAMPLE_BURST=0 turns
+    sampling off.
+
+    Args:
+        name (str): Log file name without the extension
+
+    Returns:
+        logging.handlers.QueueListener: The started listener, stopped at exit
+    """
+    if os.getenv("LOG_FORMAT", "text") == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
+
+    file_handler = logging.handlers.RotatingFileHandler(
+        f"{name}.log",
+        maxBytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 2**20))),
+        backupCount=int(os.getenv("LOG_BACKUPS", "5")),
+        encoding="utf-8",
+    )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    records: "queue.SimpleQueue[Optional[logging.LogRecord]]" = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    burst = int(os.getenv("LOG_SAMPLE_BURST", "20"))
+    if burst:
+        queue_handler.addFilter(
+            SamplingFilter(burst=burst, every=int(os.getenv("LOG_SAMPLE_EVERY", "100")))
+        )
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    listener = logging.handlers.QueueListener(
+        records, file_handler, stream_handler, respect_handler_level=True
+    )
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+from typing import Dict, List, Set
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+class GuildMemberStats:
+    """Member counters for one guild, built once and kept current from events"""
+
+    def __init__(self, guild: discord.Guild):
+        """Build the stats from the guild's member cache
+
+        Args:
+            guild (discord.Guild): The guild to index
+        """
+        self.guild = guild
+        self.bots: Set[int] = set()
+        self.boosters: Set[int] = set()
+        self.roles: Dict[int, Set[int]] = {}
+
+        for member in guild.members:
+            self.add(member)
+
+    @property
+    def humans(self) -> int:
+        """Number of non-bot members"""
+        return max((self.guild.member_count or 0) - len(self.bots), 0)
+
+    def add(self, member: discord.Member) -> None:
+        """Count a member that joined or was loaded into the cache"""
+        if member.bot:
+            self.bots.add(member.id)
+        if member.premium_since is not None:
+            self.boosters.add(member.id)
+
+        for role_id in member._roles:
+            self.roles.setdefault(role_id, set()).add(member.id)
+
+    def remove(self, user_id: int) -> None:
+        """Forget a member that left the guild"""
+        self.bots.discard(user_id)
+        self.boosters.discard(user_id)
+
+        for members in self.roles.values():
+            members.discard(user_id)
+
+    def update(self, before: discord.Member, after: discord.Member) -> None:
+        """Apply the role and boost changes between two member snapshots"""
+        old_roles, new_roles = set(before._roles), set(after._roles)
+
+        for role_id in old_roles - new_roles:
+            self.roles.get(role_id, set()).discard(after.id)
+        for role_id in new_roles - old_roles:
+            self.roles.setdefault(role_id, set()).add(after.id)
+
+        if after.premium_since is not None:
+            self.boosters.add(after.id)
+        else:
+            self.boosters.discard(after.id)
+
+    def role_count(self, role: discord.Role) -> int:
+        """Number of members with a role"""
+        if role.is_default():
+            return self.guild.member_count or 0
+        return len(self.roles.get(role.id, ()))
+
+    def role_members(self, role: discord.Role) -> List[discord.Member]:
+        """Members with a role, resolved from the member cache"""
+        if role.is_default():
+            return list(self.guild.members)
+        return self._resolve(self.roles.get(role.id, ()))
+
+    def bot_members(self) -> List[discord.Member]:
+        """Bot members, resolved from the member cache"""
+        return self._resolve(self.bots)
+
+    def booster_members(self) -> List[discord.Member]:
+        """Boosting members, resolved from the member cache"""
+        return self._resolve(self.boosters)
+
+    def _resolve(self, member_ids) -> List[discord.Member]:
+        members = []
+        for member_id in member_ids:
+            member = self.guild.get_member(member_id)
+            if member is not None:
+                members.append(member)
+        return members
+
+
+class MemberStatsIndex:
+    """Per-guild member stats, built lazily and updated by member events"""
+
+    def __init__(self):
+        self._guilds: Dict[int, GuildMemberStats] = {}
+
+    def get(self, guild: discord.Guild) -> GuildMemberStats:
+        """Get the stats for a guild, building them on first use
+
+        Args:
+            guild (discord.Guild): The guild
+
+        Returns:
+            GuildMemberStats: The guild's stats
+        """
+        stats = self._guilds.get(guild.id)
+        if stats is None:
+            stats = self._guilds[guild.id] = GuildMemberStats(guild)
+            logger.debug(
+                "Indexed %s members for guild %s", len(guild.members), guild.id
+            )
+        return stats
+
+    def member_join(self, member: discord.Member) -> None:
+        stats = self._guilds.get(member.guild.id)
+        if stats is not None:
+            stats.add(member)
+
+    def member_remove(self, guild_id: int, user_id: int) -> None:
+        stats = self._guilds.get(guild_id)
+        if stats is not None:
+            stats.remove(user_id)
+
+    def member_update(self, before: discord.Member, after: discord.Member) -> None:
+        stats = self._guilds.get(after.guild.id)
+        if stats is not None:
+            stats.update(before, after)
+
+    def role_delete(self, role: discord.Role) -> None:
+        stats = self._guilds.get(role.guild.id)
+        if stats is not None:
+            stats.roles.pop(role.id, None)
+
+    def invalidate(self, guild_id: int) -> None:
+        """Drop a guild's stats so they're rebuilt on next use"""
+        self._guilds.pop(guild_id, None)
+
+
+member_stats = MemberStatsIndex()
+
+_chunk_tasks: Dict[int, asyncio.Task] = {}
+
+
+async def ensure_chunked(guild: discord.Guild) -> None:
+    """Load a guild's full member list into the cache if it isn't there yet
+
+    Concurrent callers for the same guild share a single chunk request.
+
+    Args:
+        guild (discord.Guild): The guild to chunk
+    """
+    if guild.chunked:
+        return
+
+    task = _chunk_tasks.get(guild.id)
+    if task is None:
+        task = asyncio.ensure_future(guild.chunk(cache=True))
+        _chunk_tasks[guild.id] = task
+
+        def done(_):
+            _chunk_tasks.pop(guild.id, None)
+            member_stats.invalidate(guild.id)
+
+        task.add_done_callback(done)
+        logger.info(f"Chunking guild {guild.id} on demand")
+
+    await asyncio.shield(task)
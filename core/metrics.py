@@ -0,0 +1,276 @@
+import abc
+import bisect
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric(abc.ABC):
+    """Base for metrics rendered in the Prometheus text format"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """The sample lines, one per label set"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A value that only goes up"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Add to the counter for a set of label values"""
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_labels(self.label_names, labels)} {value}"
+            for labels, value in self.values.items()
+        ]
+
+
+class Gauge(Metric):
+    """A value that goes up and down, set directly or collected at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Callable[[], Dict[LabelValues, float]]] = None,
+    ):
+        """Initialize the gauge
+
+        Args:
+            name (str): Metric name
+            help (str): Description shown to Prometheus
+            labels (Sequence[str]): Label names
+            collect (Callable, optional): Returns the current values keyed by
+                label values; called only when metrics are scraped
+        """
+        super().__init__(name, help, labels)
+        self.values: Dict[LabelValues, float] = {}
+        self.collect = collect
+
+    def set(self, value: float, *labels: str) -> None:
+        """Set the gauge for a set of label values"""
+        self.values[labels] = value
+
+    def samples(self) -> List[str]:
+        values = dict(self.values)
+        if self.collect is not None:
+            try:
+                values.update(self.collect())
+            except Exception as e:
+                logger.warning(f"Collecting {self.name} failed: {e}")
+        return [
+            f"{self.name}{_labels(self.label_names, labels)} {value}"
+            for labels, value in values.items()
+        ]
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label values: [count per bucket..., +Inf count], sum
+        self.values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one observation"""
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1][0] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.label_names, labels, le)} "
+                    f"{cumulative}"
+                )
+            cumulative += counts[-1]
+            le = 'le="+Inf"'
+            lines.append(
+                f"{self.name}_bucket{_labels(self.label_names, labels, le)} "
+                f"{cumulative}"
+            )
+            lines.append(
+                f"{self.name}_sum{_labels(self.label_names, labels)} {total[0]}"
+            )
+            lines.append(
+                f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}"
+            )
+        return lines
+
+
+class Registry:
+    """Every metric the exporter serves"""
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = (), collect=None):
+        return self.register(Gauge(name, help, labels, collect))
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = Registry()
+
+command_latency = registry.histogram(
+    "chime_command_seconds", "Command run time", ("command", "status")
+)
+messages = registry.counter("chime_messages_total", "Messages seen by on_message")
+message_latency = registry.histogram(
+    "chime_on_message_seconds", "Time spent in Core.on_message"
+)
+db_latency = registry.histogram(
+    "chime_db_query_seconds", "Database query time", ("helper", "method")
+)
+db_errors = registry.counter(
+    "chime_db_errors_total", "Failed database queries", ("helper", "method")
+)
+db_acquire = registry.histogram(
+    "chime_db_acquire_seconds", "Time waiting for a pool connection"
+)
+cache_requests = registry.counter(
+    "chime_cache_requests_total", "Cache lookups", ("namespace", "result")
+)
+http_latency = registry.histogram(
+    "chime_http_request_seconds", "Outgoing HTTP request time", ("host", "status")
+)
+loop_lag = registry.gauge(
+    "chime_event_loop_lag_seconds", "How late the last loop lag probe woke up"
+)
+loop_lag_histogram = registry.histogram(
+    "chime_event_loop_lag_distribution_seconds",
+    "Distribution of loop lag probe delays",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0),
+)
+
+
+def http_trace_config() -> aiohttp.TraceConfig:
+    """A trace config that times requests by host"""
+    trace = aiohttp.TraceConfig()
+
+    async def on_start(session, context, params):
+        context.started = time.perf_counter()
+
+    async def on_end(session, context, params):
+        http_latency.observe(
+            time.perf_counter() - context.started,
+            params.url.host or "",
+            str(params.response.status),
+        )
+
+    async def on_exception(session, context, params):
+        http_latency.observe(
+            time.perf_counter() - context.started,
+            params.url.host or "",
+            "error",
+        )
+
+    trace.on_request_start.append(on_start)
+    trace.on_request_end.append(on_end)
+    trace.on_request_exception.append(on_exception)
+    return trace
+
+
+class MetricsServer:
+    """Serves the registry over HTTP for Prometheus to scrape"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9108):
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _metrics(self, request: web.Request) -> web.Response:
+        return web.Response(
+            text=registry.render(), content_type="text/plain", charset="utf-8"
+        )
+
+    async def start(self) -> None:
+        """Start serving /metrics"""
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Metrics served on http://{self.host}:{self.port}/metrics")
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import os
+import re
+from typing import Dict, List, Optional
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "migrations"
+)
+FILENAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# held while migrating, so clusters starting together don't race each other
+LOCK_ID = 0x6368696D65  # "chime"
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name TEXT NOT NULL,
+        checksum TEXT NOT NULL,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    )
+"""
+
+
+class MigrationError(Exception):
+    """The migrations on disk don't agree with the database"""
+
+
+class Migration:
+    """One numbered SQL file from the migrations directory"""
+
+    __slots__ = ("version", "name", "sql", "checksum")
+
+    def __init__(self, version: int, name: str, sql: str):
+        self.version = version
+        self.name = name
+        self.sql = sql
+        self.checksum = hashlib.sha256(sql.replace("\r\n", "\n").encode()).hexdigest()
+
+    def __repr__(self) -> str:
+        return f"<Migration {self.version:04d}_{self.name}>"
+
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Read every ``<version>_<name>.sql`` file, ordered by version"""
+    migrations: Dict[int, Migration] = {}
+    for filename in os.listdir(directory):
+        match = FILENAME.match(filename)
+        if match is None:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise MigrationError(f"Two migrations are numbered {version}")
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            migrations[version] = Migration(version, match.group(2), f.read())
+    return [migrations[version] for version in sorted(migrations)]
+
+
+async def _applied(conn) -> Dict[int, str]:
+    """Checksums of the applied migrations by version, empty on a new database"""
+    try:
+        rows = await conn.fetch("SELECT version, checksum FROM schema_migrations")
+    except asyncpg.UndefinedTableError:
+        return {}
+    return {row["version"]: row["checksum"] for row in rows}
+
+
+def _pending(migrations: List[Migration], applied: Dict[int, str]) -> List[Migration]:
+    """The migrations still to run, after checking the applied ones are unchanged"""
+    for migration in migrations:
+        checksum = applied.get(migration.version)
+        if checksum is not None and checksum != migration.checksum:
+            raise MigrationError(
+                f"{migration!r} was changed after it was applied; "
+                "add a new migration instead"
+            )
+
+    unknown = set(applied) - {migration.version for migration in migrations}
+    if unknown:
+        # a newer build already migrated, as in the middle of a rolling deploy
+        logger.warning(
+            f"Database has migrations this build doesn't know: {sorted(unknown)}"
+        )
+    return [migration for migration in migrations if migration.version not in applied]
+
+
+async def migrate(
+    pool, migrations: Optional[List[Migration]] = None
+) -> List[Migration]:
+    """Bring the database up to the latest migration
+
+    When nothing is pending this is a single SELECT, with no locks or DDL.
+    Otherwise the pending migrations run in one transaction under an advisory
+    lock, so either all of them apply or none do, and a process that waited
+    on the lock sees what the other one applied.
+
+    Args:
+        pool: The asyncpg pool to migrate through
+        migrations (List[Migration], optional): Defaults to the files in
+            the migrations directory
+
+    Returns:
+        List[Migration]: The migrations that were applied
+    """
+    if migrations is None:
+        migrations = load_migrations()
+
+    async with pool.acquire() as conn:
+        if not _pending(migrations, await _applied(conn)):
+            logger.debug("Database schema is up to date")
+            return []
+
+        async with conn.transaction():
+            await conn.execute("SELECT pg_advisory_xact_lock($1)", LOCK_ID)
+            await conn.execute(CREATE_TABLE)
+            pending = _pending(migrations, await _applied(conn))
+            for migration in pending:
+                logger.info(
+                    f"Applying migration {migration.version:04d}_{migration.name}"
+                )
+                await conn.execute(migration.sql)
+                await conn.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum) "
+                    "VALUES ($1, $2, $3)",
+                    migration.version,
+                    migration.name,
+                    migration.checksum,
+                )
+    return pending
@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, List, Optional
+
+from .metrics import loop_lag, loop_lag_histogram
+
+logger = logging.getLogger(__name__)
+
+
+class SlowStep:
+    """One time the event loop was blocked past the threshold"""
+
+    __slots__ = ("started_at", "duration", "task", "coroutines", "stack")
+
+    def __init__(
+        self,
+        started_at: float,
+        task: str,
+        coroutines: List[str],
+        stack: List[str],
+    ):
+        self.started_at = started_at
+        self.duration = 0.0
+        self.task = task
+        self.coroutines = coroutines
+        self.stack = stack
+
+    @property
+    def where(self) -> str:
+        """The innermost coroutine, usually the command or listener at fault"""
+        return self.coroutines[-1] if self.coroutines else self.task
+
+
+def _coroutine_chain(task: Optional[asyncio.Task]) -> List[str]:
+    """Qualified names of the coroutines a task is awaiting, outermost first"""
+    names = []
+    coro = task.get_coro() if task is not None else None
+    while coro is not None and len(names) < 32:
+        code = getattr(coro, "cr_code", None) or getattr(coro, "gi_code", None)
+        if code is None:
+            break
+        names.append(code.co_qualname)
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return names
+
+
+class LoopMonitor:
+    """Measures event loop lag and captures what blocked it
+
+    A heartbeat coroutine ticks on the loop while a watchdog thread checks
+    that it keeps ticking. When a tick is late by more than the threshold,
+    the watchdog grabs the loop thread's stack and the running task while the
+    loop is still blocked; the heartbeat fills in the duration once it runs
+    again. The most recent records are kept in a ring buffer.
+    """
+
+    def __init__(
+        self, threshold: float = 0.1, interval: float = 0.05, capacity: int = 100
+    ):
+        """Initialize the monitor
+
+        Args:
+            threshold (float): Seconds a step may block before it's recorded
+            interval (float): Seconds between heartbeat ticks
+            capacity (int): How many slow steps to keep
+        """
+        self.threshold = threshold
+        self.interval = interval
+        self.records: Deque[SlowStep] = deque(maxlen=capacity)
+        self.lags: Deque[float] = deque(maxlen=600)
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._last_beat = 0.0
+        self._pending: Optional[SlowStep] = None
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def start(self) -> None:
+        """Start the heartbeat and the watchdog; call from the loop's thread"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopped.clear()
+        self._task = self._loop.create_task(self._heartbeat())
+        self._thread = threading.Thread(
+            target=self._watchdog, name="chime-loop-watchdog", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop monitoring"""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _heartbeat(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(now - expected, 0.0)
+            self._last_beat = now
+
+            self.lags.append(lag)
+            loop_lag.set(lag)
+            loop_lag_histogram.observe(lag)
+
+            pending, self._pending = self._pending, None
+            if lag < self.threshold:
+                continue
+
+            if pending is None:
+                # blocked too briefly for the watchdog to catch it in the act
+                pending = SlowStep(expected, "unknown", [], [])
+            pending.duration = lag
+            self.records.append(pending)
+            logger.warning(
+                f"Event loop blocked for {lag * 1000:.0f}ms in {pending.where}"
+            )
+
+    def _watchdog(self) -> None:
+        while not self._stopped.wait(self.threshold / 2):
+            blocked_for = time.monotonic() - self._last_beat - self.interval
+            if blocked_for < self.threshold or self._pending is not None:
+                continue
+            self._pending = self._capture()
+
+    def _capture(self) -> SlowStep:
+        frame = sys._current_frames().get(self._loop_thread)
+        stack = traceback.format_stack(frame, limit=30) if frame is not None else []
+
+        # the loop's current task lives in a private mapping that newer Pythons
+        # dropped; without it the stack alone has to do
+        current_tasks = getattr(asyncio.tasks, "_current_tasks", None)
+        if current_tasks is None:
+            return SlowStep(time.monotonic(), "unknown", [], stack)
+
+        # reading the loop's current task from this thread is racy but only
+        # ever gives a stale answer, which is fine for a diagnostic
+        task = current_tasks.get(self._loop)
+        return SlowStep(
+            time.monotonic(),
+            task.get_name() if task is not None else "callback",
+            _coroutine_chain(task),
+            stack,
+        )
+
+    def recent_lag(self) -> dict:
+        """Lag percentiles over the recent heartbeats, in seconds"""
+        lags = sorted(self.lags)
+        if not lags:
+            return {"current": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+        return {
+            "current": self.lags[-1],
+            "p50": lags[len(lags) // 2],
+            "p99": lags[min(int(len(lags) * 0.99), len(lags) - 1)],
+            "max": lags[-1],
+        }
+
+
+monitor = LoopMonitor()
@@ -0,0 +1,146 @@
+import inspect
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Sequence, Union
+
+import discord
+
+PageGetter = Callable[
+    [int], Union[Optional[discord.Embed], Awaitable[Optional[discord.Embed]]]
+]
+
+
+class PageSource:
+    """Renders pages on demand and keeps a small LRU of the rendered ones"""
+
+    def __init__(
+        self,
+        get_page: PageGetter,
+        length: Optional[int] = None,
+        cache_size: int = 8,
+        on_close: Optional[Callable[[], None]] = None,
+    ):
+        """Initialize the page source
+
+        Args:
+            get_page (PageGetter): Sync or async callable taking a page index and
+                returning an embed, or None once the index is past the last page
+            length (int, optional): Total page count, if known up front
+            cache_size (int): How many rendered pages to keep around
+            on_close (Callable, optional): Called once when the paginator
+                showing this source is gone, to stop any background work
+        """
+        self._get_page = get_page
+        self.length = length
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[int, discord.Embed]" = OrderedDict()
+        self._on_close = on_close
+        # highest page known to exist, and the lowest known not to; the length
+        # is only set once they meet, the bound alone is never shown
+        self._reached = -1
+        self._bound: Optional[int] = None
+
+    @classmethod
+    def from_items(
+        cls,
+        items: Sequence[Any],
+        per_page: int,
+        render: Callable[[Sequence[Any]], discord.Embed],
+        cache_size: int = 8,
+    ) -> "PageSource":
+        """Build a source that renders ``per_page`` items at a time
+
+        Args:
+            items (Sequence[Any]): The items to split into pages
+            per_page (int): How many items go on each page
+            render (Callable): Builds the embed for one slice of items
+            cache_size (int): How many rendered pages to keep around
+
+        Returns:
+            PageSource: A source with a known length
+        """
+
+        def get_page(index: int) -> discord.Embed:
+            return render(items[index * per_page : (index + 1) * per_page])
+
+        length = (len(items) + per_page - 1) // per_page
+        return cls(get_page, length=length, cache_size=cache_size)
+
+    @property
+    def is_bounded(self) -> bool:
+        """Whether the total page count is known"""
+        return self.length is not None
+
+    async def get(self, index: int) -> Optional[discord.Embed]:
+        """Get a page, rendering it if it isn't cached
+
+        Args:
+            index (int): The zero-based page index
+
+        Returns:
+            Optional[discord.Embed]: The page, or None if it's out of range
+        """
+        if index < 0 or (self.length is not None and index >= self.length):
+            return None
+        if self._bound is not None and index >= self._bound:
+            return None
+
+        if index in self._cache:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+
+        page = self._get_page(index)
+        if inspect.isawaitable(page):
+            page = await page
+
+        if page is None:
+            self._bound = index if self._bound is None else min(self._bound, index)
+            self._learn_length()
+            return None
+
+        self._reached = max(self._reached, index)
+        self._learn_length()
+
+        if self.cache_size > 0:
+            self._cache[index] = page
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        return page
+
+    def _learn_length(self) -> None:
+        # a page past the end only gives the length when the one before it
+        # exists; jumping far ahead of the last page seen only narrows it down
+        if self._bound is not None and self._reached == self._bound - 1:
+            self.length = (
+                self._bound if self.length is None else min(self.length, self._bound)
+            )
+
+    def close(self) -> None:
+        """Release the source once nobody can page through it anymore"""
+        self._cache.clear()
+        if self._on_close is not None:
+            on_close, self._on_close = self._on_close, None
+            on_close()
+
+    def label(self, index: int) -> str:
+        """Get the ``current/total`` label for a page"""
+        total = self.length if self.length is not None else "?"
+        return f"{index + 1}/{total}"
+
+
+class ListPageSource(PageSource):
+    """Adapter for callers that already hold a list of embeds"""
+
+    def __init__(self, pages: List[discord.Embed]):
+        """Initialize the adapter
+
+        Args:
+            pages (List[discord.Embed]): The pre-rendered pages
+        """
+        super().__init__(pages.__getitem__, length=len(pages), cache_size=0)
+        self.pages = pages
+
+    async def get(self, index: int) -> Optional[discord.Embed]:
+        if 0 <= index < len(self.pages):
+            return self.pages[index]
+        return None
@@ -7,6 +7,7 @@ from discord.ext import commands
 import config
 
 from .database import db
+from .metrics import cache_requests
 
 logger = logging.getLogger(__name__)
 
@@ -78,9 +79,11 @@ class PrefixManager:
         """
         if guild_id in self._guild_cache:
             self.cache_hits += 1
+            cache_requests.inc("prefix_guild", "hit")
             return self._guild_cache[guild_id]
 
         self.cache_misses += 1
+        cache_requests.inc("prefix_guild", "miss")
         prefix = await db.get_prefix("guild", guild_id)
 
         if prefix:
@@ -99,9 +102,11 @@ class PrefixManager:
         """
         if user_id in self._user_cache:
             self.cache_hits += 1
+            cache_requests.inc("prefix_user", "hit")
             return self._user_cache[user_id]
 
         self.cache_misses += 1
+        cache_requests.inc("prefix_user", "miss")
         prefix = await db.get_prefix("user", user_id)
 
         if prefix:
@@ -0,0 +1,292 @@
+import datetime
+import re
+from typing import Callable, List, Optional, Set
+
+import discord
+from discord.ext import commands
+
+# discord refuses to bulk delete messages older than two weeks
+BULK_DELETE_MAX_AGE = datetime.timedelta(days=14)
+
+# keep clear of the cutoff so nothing ages out between fetching and deleting
+BULK_DELETE_MARGIN = datetime.timedelta(minutes=5)
+
+BULK_DELETE_CHUNK = 100
+
+LINK_REGEX = re.compile(r"https?://\S+|discord(?:\.gg|\.com/invite)/\S+", re.I)
+DURATION_REGEX = re.compile(r"(\d+)([smhdw])")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+MessageCheck = Callable[[discord.Message], bool]
+
+
+def bulk_delete_cutoff() -> discord.Object:
+    """Snowflake of the oldest message that can still be bulk deleted"""
+    cutoff = discord.utils.utcnow() - BULK_DELETE_MAX_AGE + BULK_DELETE_MARGIN
+    return discord.Object(discord.utils.time_snowflake(cutoff, high=True))
+
+
+def parse_time_bound(value: str) -> discord.Object:
+    """Turn a before:/after: value into a snowflake
+
+    Accepts a message or snowflake id, a relative age such as ``2h`` or
+    ``1d12h``, or an ISO date such as ``2024-05-01``.
+
+    Args:
+        value (str): The raw value
+
+    Returns:
+        discord.Object: A snowflake usable as a history bound
+
+    Raises:
+        commands.BadArgument: If the value can't be understood
+    """
+    if value.isdigit() and len(value) >= 15:
+        return discord.Object(int(value))
+
+    parts = DURATION_REGEX.findall(value.lower())
+    if parts and "".join(a + b for a, b in parts) == value.lower():
+        seconds = sum(int(amount) * DURATION_UNITS[unit] for amount, unit in parts)
+        moment = discord.utils.utcnow() - datetime.timedelta(seconds=seconds)
+        return discord.Object(discord.utils.time_snowflake(moment))
+
+    try:
+        moment = datetime.datetime.fromisoformat(value)
+    except ValueError:
+        raise commands.BadArgument(f"`{value}` is not a message id, age or date")
+
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    return discord.Object(discord.utils.time_snowflake(moment))
+
+
+class PurgeFilter:
+    """Purge criteria, parsed from command arguments and compiled once
+
+    Supported tokens are user and role mentions, ``bots``, ``contains:text``,
+    ``regex:pattern``, ``has:attachment``, ``has:link``, ``has:embed``,
+    ``before:`` and ``after:``. Time bounds aren't part of the predicate; they
+    bound the history fetch instead.
+    """
+
+    def __init__(self):
+        self.user_ids: Set[int] = set()
+        self.role_ids: Set[int] = set()
+        self.bots = False
+        self.attachments = False
+        self.embeds = False
+        self.links = False
+        self.contains: List[str] = []
+        self.patterns: List[re.Pattern] = []
+        self.before: Optional[discord.Object] = None
+        self.after: Optional[discord.Object] = None
+
+    def parse(self, token: str, guild: discord.Guild) -> bool:
+        """Apply one keyword or role token
+
+        Args:
+            token (str): The raw argument
+            guild (discord.Guild): Where role names are resolved
+
+        Returns:
+            bool: Whether the token was a filter
+
+        Raises:
+            commands.BadArgument: If a filter's value is invalid
+        """
+        if token.startswith("<@&") and token.endswith(">"):
+            return self._add_role(token[3:-1], guild)
+
+        if token.lower() in ("bot", "bots"):
+            self.bots = True
+            return True
+
+        key, sep, value = token.partition(":")
+        if not sep or not value:
+            return False
+
+        key = key.lower()
+        if key == "contains":
+            self.contains.append(value.lower())
+        elif key == "regex":
+            try:
+                self.patterns.append(re.compile(value, re.I))
+            except re.error as e:
+                raise commands.BadArgument(f"invalid regex `{value}`: {e}")
+        elif key == "has":
+            kind = value.lower().rstrip("s")
+            if kind in ("attachment", "file", "image"):
+                self.attachments = True
+            elif kind == "link":
+                self.links = True
+            elif kind == "embed":
+                self.embeds = True
+            else:
+                raise commands.BadArgument(f"unknown `has:` filter `{value}`")
+        elif key == "before":
+            bound = parse_time_bound(value)
+            if self.before is None or bound.id < self.before.id:
+                self.before = bound
+        elif key == "after":
+            bound = parse_time_bound(value)
+            if self.after is None or bound.id > self.after.id:
+                self.after = bound
+        elif key == "role":
+            return self._add_role(value.strip("<@&>"), guild)
+        else:
+            return False
+        return True
+
+    def _add_role(self, value: str, guild: discord.Guild) -> bool:
+        role = None
+        if value.isdigit():
+            role = guild.get_role(int(value))
+        if role is None:
+            role = discord.utils.find(
+                lambda r: r.name.lower() == value.lower(), guild.roles
+            )
+        if role is None:
+            raise commands.BadArgument(f"role `{value}` not found")
+
+        self.role_ids.add(role.id)
+        return True
+
+    @property
+    def is_empty(self) -> bool:
+        """Whether every message passes the predicate"""
+        return not (
+            self.user_ids
+            or self.role_ids
+            or self.bots
+            or self.attachments
+            or self.embeds
+            or self.links
+            or self.contains
+            or self.patterns
+        )
+
+    def compile(self) -> MessageCheck:
+        """Build a single predicate with the cheapest checks first
+
+        Returns:
+            MessageCheck: Whether a message matches every criterion
+        """
+        checks: List[MessageCheck] = []
+
+        if self.user_ids:
+            user_ids = frozenset(self.user_ids)
+            checks.append(lambda m: m.author.id in user_ids)
+        if self.bots:
+            checks.append(lambda m: m.author.bot)
+        if self.attachments:
+            checks.append(lambda m: bool(m.attachments))
+        if self.embeds:
+            checks.append(lambda m: bool(m.embeds))
+        if self.role_ids:
+            role_ids = frozenset(self.role_ids)
+            checks.append(
+                lambda m: not role_ids.isdisjoint(getattr(m.author, "_roles", ()))
+            )
+        if self.contains:
+            needles = tuple(self.contains)
+
+            def contains(m):
+                content = m.content.lower()
+                return all(needle in content for needle in needles)
+
+            checks.append(contains)
+        if self.links:
+            checks.append(lambda m: LINK_REGEX.search(m.content) is not None)
+        for pattern in self.patterns:
+            checks.append(
+                lambda m, search=pattern.search: search(m.content) is not None
+            )
+
+        if not checks:
+            return lambda m: True
+        if len(checks) == 1:
+            return checks[0]
+
+        checks = tuple(checks)
+        return lambda m: all(check(m) for check in checks)
+
+
+class PurgeEngine:
+    """Streams channel history and bulk deletes matching messages in chunks
+
+    History is fetched newest first and bounded below by the bulk delete
+    cutoff, so messages that could only be deleted one request at a time are
+    never fetched. Matches are deleted in chunks of 100 as soon as a chunk
+    fills, which keeps memory constant no matter how large the purge is.
+    """
+
+    def __init__(
+        self,
+        check: Callable[[discord.Message], bool],
+        limit: int,
+        scan_limit: Optional[int] = None,
+        before: Optional[discord.abc.Snowflake] = None,
+        after: Optional[discord.abc.Snowflake] = None,
+    ):
+        """Initialize the engine
+
+        Args:
+            check (Callable): Whether a message should be deleted
+            limit (int): Maximum messages to delete per channel
+            scan_limit (int, optional): Maximum messages to look at per
+                channel, defaults to the limit
+            before (Snowflake, optional): Only look at messages older than this
+            after (Snowflake, optional): Only look at messages newer than this,
+                tightening the bulk delete cutoff
+        """
+        self.check = check
+        self.limit = limit
+        self.scan_limit = max(scan_limit or limit, limit)
+        self.before = before
+        self.after = after
+        self.deleted = 0
+
+    async def purge_channel(self, channel: discord.abc.Messageable) -> int:
+        """Delete matching messages in one channel
+
+        Args:
+            channel (discord.abc.Messageable): The channel to purge
+
+        Returns:
+            int: How many messages were deleted in this channel
+        """
+        deleted = 0
+        matched = 0
+        chunk = []
+
+        after = bulk_delete_cutoff()
+        if self.after is not None and self.after.id > after.id:
+            after = self.after
+        if self.before is not None and self.before.id <= after.id:
+            return 0
+
+        async for message in channel.history(
+            limit=self.scan_limit,
+            before=self.before,
+            after=after,
+            oldest_first=False,
+        ):
+            if not self.check(message):
+                continue
+
+            chunk.append(message)
+            matched += 1
+            if len(chunk) == BULK_DELETE_CHUNK:
+                deleted += await self._flush(channel, chunk)
+                chunk = []
+            if matched >= self.limit:
+                break
+
+        if chunk:
+            deleted += await self._flush(channel, chunk)
+        return deleted
+
+    async def _flush(self, channel: discord.abc.Messageable, chunk) -> int:
+        await channel.delete_messages(chunk)
+        self.deleted += len(chunk)
+        return len(chunk)
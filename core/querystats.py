@@ -0,0 +1,198 @@
+import functools
+import logging
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r"(?<![$\w.])\d+(?:\.\d+)?\b")
+WHITESPACE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def normalize_sql(query: str) -> str:
+    """Reduce a query to its shape: literals replaced and whitespace collapsed
+
+    Queries here are almost always constant strings with $n placeholders, so
+    the result is cached per query string.
+    """
+    query = STRING_LITERAL.sub("?", query)
+    query = NUMBER_LITERAL.sub("?", query)
+    return WHITESPACE.sub(" ", query).strip()
+
+
+def redact(args: Sequence[Any]) -> str:
+    """Describe query arguments by type only, so no user data reaches the logs"""
+    return ", ".join(f"${i}={type(arg).__name__}" for i, arg in enumerate(args, 1))
+
+
+def rows_affected(status: str) -> int:
+    """Row count from a command status such as ``UPDATE 3``"""
+    count = status.rpartition(" ")[2] if status else ""
+    return int(count) if count.isdigit() else 0
+
+
+class QueryShape:
+    """Timings for every run of one normalized query"""
+
+    __slots__ = (
+        "sql",
+        "count",
+        "errors",
+        "rows",
+        "total",
+        "cache_hits",
+        "cache_misses",
+        "durations",
+        "explained_at",
+    )
+
+    def __init__(self, sql: str, window: int = 512):
+        self.sql = sql
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # percentiles come from the most recent runs
+        self.durations: Deque[float] = deque(maxlen=window)
+        self.explained_at = 0.0
+
+    def percentile(self, p: float) -> float:
+        """A percentile of the recent durations, in seconds"""
+        durations = sorted(self.durations)
+        if not durations:
+            return 0.0
+        return durations[min(int(len(durations) * p), len(durations) - 1)]
+
+    @property
+    def cache_ratio(self) -> Optional[float]:
+        """Fraction of cacheable lookups answered by the cache"""
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else None
+
+
+class SlowQuery:
+    """One query that ran past the slow threshold"""
+
+    __slots__ = ("at", "sql", "helper", "duration", "args", "plan")
+
+    def __init__(self, sql: str, helper: str, duration: float, args: str):
+        self.at = time.time()
+        self.sql = sql
+        self.helper = helper
+        self.duration = duration
+        self.args = args
+        self.plan: Optional[str] = None
+
+
+class QueryStats:
+    """Per-shape query timings and a log of slow queries"""
+
+    def __init__(
+        self,
+        slow_threshold: float = 0.1,
+        explain: bool = False,
+        explain_interval: float = 600,
+        capacity: int = 100,
+        max_shapes: int = 500,
+    ):
+        """Initialize the stats
+
+        Args:
+            slow_threshold (float): Seconds after which a query is logged as slow
+            explain (bool): Whether slow SELECTs get an EXPLAIN ANALYZE captured
+            explain_interval (float): Minimum seconds between plans per shape
+            capacity (int): How many slow queries to keep
+            max_shapes (int): Shapes tracked at most, so ad hoc SQL can't grow
+                this forever
+        """
+        self.slow_threshold = slow_threshold
+        self.explain = explain
+        self.explain_interval = explain_interval
+        self.max_shapes = max_shapes
+        self.shapes: Dict[str, QueryShape] = {}
+        self.slow: Deque[SlowQuery] = deque(maxlen=capacity)
+
+    def shape(self, query: str) -> Optional[QueryShape]:
+        """The stats for a query's shape, created on first use"""
+        sql = normalize_sql(query)
+        shape = self.shapes.get(sql)
+        if shape is None and len(self.shapes) < self.max_shapes:
+            shape = self.shapes[sql] = QueryShape(sql)
+        return shape
+
+    def cache_hit(self, query: str) -> None:
+        shape = self.shape(query)
+        if shape is not None:
+            shape.cache_hits += 1
+
+    def record(
+        self,
+        query: str,
+        helper: str,
+        duration: float,
+        rows: int,
+        args: Sequence[Any],
+        failed: bool = False,
+        cacheable: bool = False,
+    ) -> Optional[SlowQuery]:
+        """Record one query that reached the database
+
+        Returns:
+            Optional[SlowQuery]: The slow log entry when the query was slow and
+                should have its plan captured, otherwise None
+        """
+        shape = self.shape(query)
+        if shape is not None:
+            shape.count += 1
+            shape.total += duration
+            shape.rows += rows
+            shape.durations.append(duration)
+            if failed:
+                shape.errors += 1
+            if cacheable:
+                shape.cache_misses += 1
+
+        if duration < self.slow_threshold:
+            return None
+
+        entry = SlowQuery(normalize_sql(query), helper, duration, redact(args))
+        self.slow.append(entry)
+        logger.warning(
+            f"Slow query ({duration * 1000:.0f}ms) in {helper}: "
+            f"{entry.sql[:200]} [{entry.args}]"
+        )
+
+        if (
+            not self.explain
+            or failed
+            or shape is None
+            or not entry.sql.lower().startswith(("select", "with"))
+            or time.time() - shape.explained_at < self.explain_interval
+        ):
+            return None
+        shape.explained_at = time.time()
+        return entry
+
+    def top(self, key: str = "total", limit: int = 20) -> List[QueryShape]:
+        """Shapes ordered by total time, count, p99 or errors"""
+        sort_keys = {
+            "total": lambda shape: shape.total,
+            "count": lambda shape: shape.count,
+            "p99": lambda shape: shape.percentile(0.99),
+            "errors": lambda shape: shape.errors,
+        }
+        return sorted(
+            self.shapes.values(),
+            key=sort_keys.get(key, sort_keys["total"]),
+            reverse=True,
+        )[:limit]
+
+    def reset(self) -> None:
+        self.shapes.clear()
+        self.slow.clear()
@@ -0,0 +1,268 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+SNOWFLAKE = re.compile(r"^\d{15,21}$")
+# mentions, channel links and custom emoji keep their shape with the id hashed
+CONTENT_TOKEN = re.compile(r"<(@[!&]?|#|a?:\w+:)(\d{15,21})>|\S+")
+
+# string fields that carry no user data and that the library parses, kept as is
+KEEP_KEYS = {
+    "timestamp",
+    "edited_timestamp",
+    "joined_at",
+    "premium_since",
+    "communication_disabled_until",
+    "archive_timestamp",
+    "create_timestamp",
+    "locale",
+    "preferred_locale",
+    "permissions",
+    "allow",
+    "deny",
+    "features",
+    "status",
+    "type",
+    "content_type",
+    "discriminator",
+}
+
+
+class Anonymizer:
+    """Strips user data from gateway payloads while keeping their shape
+
+    Snowflakes are replaced by a keyed hash, so the same user, guild or
+    channel gets the same fake id throughout a recording but can't be traced
+    back without the key, which is never written out. Free text is replaced
+    by filler of the same length, keeping payload sizes realistic. In message
+    content, mentions are kept with their ids hashed, and so are words that
+    are command names, along with the first word's leading punctuation, so a
+    recorded ``?afk going to sleep`` replays as ``?afk xxxxx xx xxxxx``.
+    """
+
+    def __init__(self, command_words: Iterable[str] = (), key: Optional[bytes] = None):
+        self.command_words: Set[str] = set(command_words)
+        self.key = key or os.urandom(16)
+        self._ids: Dict[str, str] = {}
+
+    def snowflake(self, value: str) -> str:
+        fake = self._ids.get(value)
+        if fake is None:
+            digest = hashlib.blake2b(
+                value.encode(), key=self.key, digest_size=8
+            ).digest()
+            fake = self._ids[value] = str(
+                int.from_bytes(digest, "big") & ((1 << 63) - 1)
+            )
+        return fake
+
+    def text(self, value: str) -> str:
+        return "x" * len(value)
+
+    def _content_token(self, match: re.Match, first: bool) -> str:
+        if match.group(2):
+            kind = match.group(1)
+            if kind.endswith(":"):
+                # custom emoji names are user chosen too
+                kind = ("a:" if kind.startswith("a") else ":") + "x:"
+            return f"<{kind}{self.snowflake(match.group(2))}>"
+
+        word = match.group(0)
+        prefix = ""
+        if first:
+            stripped = word.lstrip("!\"#$%&'()*+,-./:;<=>?@[\\]^_`{|}~")
+            prefix, word = word[: len(word) - len(stripped)][:5], stripped
+        if word.lower() in self.command_words:
+            return prefix + word
+        return prefix + self.text(word)
+
+    def content(self, value: str) -> str:
+        position = 0
+        parts = []
+        for index, match in enumerate(CONTENT_TOKEN.finditer(value)):
+            parts.append(value[position : match.start()])
+            parts.append(self._content_token(match, index == 0))
+            position = match.end()
+        parts.append(value[position:])
+        return "".join(parts)
+
+    def payload(self, data: Any, key: str = "") -> Any:
+        """A copy of a payload with ids hashed and text replaced"""
+        if isinstance(data, dict):
+            return {k: self.payload(v, k) for k, v in data.items()}
+        if isinstance(data, list):
+            return [self.payload(item, key) for item in data]
+        if not isinstance(data, str) or key in KEEP_KEYS:
+            return data
+        if SNOWFLAKE.match(data):
+            return self.snowflake(data)
+        if key == "content":
+            return self.content(data)
+        return self.text(data)
+
+
+class GatewayRecorder:
+    """Records gateway dispatches to a compact file for replaying later
+
+    Wraps the connection state's parsers, the same table the websocket looks
+    events up in, so every dispatch the bot handles is captured with its
+    arrival time. Payloads are anonymized on the event loop, since they may be
+    changed once parsed, and serialized and compressed on a writer thread.
+    The file is gzipped JSON lines: a header, then one ``[seconds, event,
+    payload]`` entry per dispatch. Recording stops by itself after the limit.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        events: Optional[Iterable[str]] = None,
+        limit: int = 1_000_000,
+    ):
+        """Initialize the recorder
+
+        Args:
+            path (str): File to write, conventionally ending in .jsonl.gz
+            events (Iterable[str], optional): Event names to record, all by
+                default
+            limit (int): Dispatches recorded at most
+        """
+        self.path = path
+        self.events = set(events) if events else None
+        self.limit = limit
+        self.recorded = 0
+        self.started = 0.0
+        self.anonymizer = Anonymizer()
+        self._originals: Dict[str, Callable] = {}
+        self._parsers: Optional[Dict[str, Callable]] = None
+        self._queue: "queue.SimpleQueue[Optional[Tuple[float, str, Any]]]" = (
+            queue.SimpleQueue()
+        )
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, bot) -> Optional["GatewayRecorder"]:
+        """A recorder configured by GATEWAY_RECORD, or None when it isn't set
+
+        GATEWAY_RECORD is the output file, GATEWAY_RECORD_EVENTS an optional
+        comma separated list of events and GATEWAY_RECORD_LIMIT the maximum
+        number of dispatches.
+        """
+        path = os.getenv("GATEWAY_RECORD")
+        if not path:
+            return None
+        if bot.cluster is not None:
+            directory, name = os.path.split(path)
+            stem, dot, ext = name.partition(".")
+            path = os.path.join(
+                directory, f"{stem}-cluster-{bot.cluster.cluster_id}{dot}{ext}"
+            )
+        events = os.getenv("GATEWAY_RECORD_EVENTS")
+        return cls(
+            path,
+            events=events.split(",") if events else None,
+            limit=int(os.getenv("GATEWAY_RECORD_LIMIT", "1000000")),
+        )
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, bot) -> None:
+        """Start recording everything dispatched to the bot"""
+        self.anonymizer.command_words = {
+            name.lower()
+            for command in bot.walk_commands()
+            for name in (command.name, *command.aliases)
+        }
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(
+            target=self._write, name="chime-gateway-recorder", daemon=True
+        )
+        self._thread.start()
+
+        self.started = time.perf_counter()
+        self._parsers = bot._connection.parsers
+        for event, parser in self._parsers.items():
+            if self.events is None or event in self.events:
+                self._originals[event] = parser
+                self._parsers[event] = self._wrap(event, parser)
+        logger.info(f"Recording gateway events to {self.path}")
+
+    def _wrap(self, event: str, parser: Callable) -> Callable:
+        def record(data: Any) -> None:
+            if self.recorded < self.limit:
+                self.recorded += 1
+                self._queue.put(
+                    (
+                        time.perf_counter() - self.started,
+                        event,
+                        self.anonymizer.payload(data),
+                    )
+                )
+                if self.recorded == self.limit:
+                    logger.info(f"Gateway recording reached {self.limit} events")
+            parser(data)
+
+        return record
+
+    def _write(self) -> None:
+        header = {
+            "version": FORMAT_VERSION,
+            "recorded_at": time.time(),
+            "events": sorted(self.events) if self.events else None,
+        }
+        with gzip.open(self.path, "wt", encoding="utf-8", compresslevel=6) as f:
+            f.write(json.dumps(header) + "\n")
+            while True:
+                entry = self._queue.get()
+                if entry is None:
+                    break
+                seconds, event, data = entry
+                f.write(
+                    json.dumps([round(seconds, 4), event, data], separators=(",", ":"))
+                    + "\n"
+                )
+
+    def stop(self) -> None:
+        """Put the original parsers back and finish the file"""
+        if self._parsers is not None:
+            self._parsers.update(self._originals)
+            self._originals.clear()
+            self._parsers = None
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        logger.info(f"Recorded {self.recorded} gateway events to {self.path}")
+
+
+def read_recording(
+    path: str,
+) -> Tuple[Dict[str, Any], Iterator[Tuple[float, str, Any]]]:
+    """The header of a recording and an iterator over its dispatches"""
+    f = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(f.readline())
+    if header.get("version") != FORMAT_VERSION:
+        f.close()
+        raise ValueError(f"Unsupported recording version: {header.get('version')}")
+
+    def entries() -> Iterator[Tuple[float, str, Any]]:
+        with f:
+            for line in f:
+                seconds, event, data = json.loads(line)
+                yield seconds, event, data
+
+    return header, entries()
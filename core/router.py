@@ -0,0 +1,340 @@
+import logging
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+import discord
+
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class ComponentId(NamedTuple):
+    """The fields packed into a routed component's custom_id"""
+
+    handler: str
+    action: str
+    owner_id: int
+    page: int
+    key: str
+
+
+ComponentHandler = Callable[[discord.Interaction, ComponentId], Awaitable[Any]]
+
+
+def _release(value: Any) -> None:
+    """Close state that holds resources, such as a lazy page source"""
+    items = value.values() if isinstance(value, dict) else (value,)
+    for item in items:
+        close = getattr(item, "close", None)
+        if callable(close):
+            try:
+                close()
+            except Exception as e:
+                logger.warning(f"Failed to release component state: {e}")
+
+
+class StateStore:
+    """A compact store for component state with LRU and sliding TTL eviction
+
+    Entries that expire or are evicted are released: any value (or value in a
+    dict of state) with a ``close()`` method gets it called. State lives in
+    memory only, so it is lost on restart.
+    """
+
+    def __init__(self, max_size: int = 2048, ttl: int = 900, sweep_interval: int = 60):
+        """Initialize the state store
+
+        Args:
+            max_size (int): Maximum number of live entries before the least
+                recently used ones are evicted
+            ttl (int): Default idle time in seconds before an entry expires
+            sweep_interval (int): Seconds between scans of every entry for
+                expired ones
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._data: "OrderedDict[str, Tuple[Any, float, float]]" = OrderedDict()
+        self._next_sweep = time.monotonic() + sweep_interval
+
+    def put(self, value: Any, ttl: Optional[int] = None) -> str:
+        """Store a value and get the key that refers to it
+
+        Args:
+            value (Any): The state to keep
+            ttl (int, optional): Idle time in seconds before it expires
+
+        Returns:
+            str: A short key that is safe to put in a custom_id
+        """
+        key = secrets.token_urlsafe(6)
+        while key in self._data:
+            key = secrets.token_urlsafe(6)
+
+        ttl = ttl or self.ttl
+        self._data[key] = (value, ttl, time.monotonic() + ttl)
+        self._evict()
+        return key
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a value and refresh its expiry
+
+        Args:
+            key (str): The key returned by put
+
+        Returns:
+            Optional[Any]: The value, or None if it expired or was evicted
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+
+        value, ttl, expires_at = entry
+        now = time.monotonic()
+        if now >= expires_at:
+            del self._data[key]
+            _release(value)
+            return None
+
+        self._data[key] = (value, ttl, now + ttl)
+        self._data.move_to_end(key)
+        return value
+
+    def pop(self, key: str) -> Optional[Any]:
+        """Remove a value from the store without releasing it
+
+        The caller takes the value back and is responsible for closing it.
+
+        Args:
+            key (str): The key returned by put
+
+        Returns:
+            Optional[Any]: The removed value, if it was still stored
+        """
+        entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def _evict(self) -> None:
+        """Drop expired entries from the cold end and enforce the size cap
+
+        Entries have their own TTLs, so a live one at the cold end can hide
+        expired ones behind it; every sweep_interval the whole store is
+        scanned for those.
+        """
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            expired = [
+                key
+                for key, (_, _, expires_at) in self._data.items()
+                if expires_at <= now
+            ]
+            for key in expired:
+                _release(self._data.pop(key)[0])
+
+        while self._data:
+            key, (value, _, expires_at) = next(iter(self._data.items()))
+            if len(self._data) <= self.max_size and expires_at > now:
+                break
+            del self._data[key]
+            _release(value)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RoutedModal(discord.ui.Modal):
+    """A single-field modal whose submission is dispatched through the router"""
+
+    def __init__(
+        self,
+        custom_id: str,
+        title: str,
+        label: str,
+        placeholder: str = None,
+        max_length: int = None,
+        style: discord.TextStyle = discord.TextStyle.short,
+    ):
+        super().__init__(title=title, custom_id=custom_id, timeout=300)
+        self.add_item(
+            discord.ui.TextInput(
+                label=label,
+                placeholder=placeholder,
+                min_length=1,
+                max_length=max_length,
+                style=style,
+            )
+        )
+
+
+class ComponentRouter:
+    """Routes component interactions to handlers registered once at startup
+
+    Components carry everything needed to handle them in their custom_id
+    (handler, action, owner, page and a state key), so no View has to stay
+    alive between interactions.
+    """
+
+    prefix = "chime"
+
+    def __init__(self, state_size: int = 2048, state_ttl: int = 900):
+        """Initialize the router
+
+        Args:
+            state_size (int): Maximum number of live state entries
+            state_ttl (int): Default idle time in seconds for state entries
+        """
+        self.handlers: Dict[str, ComponentHandler] = {}
+        self.state = StateStore(max_size=state_size, ttl=state_ttl)
+
+    def register(self, name: str, handler: ComponentHandler) -> None:
+        """Register the handler for a component family
+
+        Args:
+            name (str): The handler name encoded in custom_ids
+            handler (ComponentHandler): Coroutine taking the interaction and
+                the decoded ComponentId
+        """
+        self.handlers[name] = handler
+
+    def unregister(self, name: str) -> None:
+        """Remove a component family's handler"""
+        self.handlers.pop(name, None)
+
+    def handler(self, name: str) -> Callable[[ComponentHandler], ComponentHandler]:
+        """Decorator form of register"""
+
+        def decorator(func: ComponentHandler) -> ComponentHandler:
+            self.register(name, func)
+            return func
+
+        return decorator
+
+    def encode(
+        self,
+        handler: str,
+        action: str,
+        owner_id: int = 0,
+        page: int = 0,
+        key: str = "-",
+    ) -> str:
+        """Pack component fields into a custom_id
+
+        Args:
+            handler (str): The registered handler name
+            action (str): What the component does within its handler
+            owner_id (int): The only user allowed to use it, 0 for anyone
+            page (int): The page the component was rendered for
+            key (str): A state store key, or any other short identifier
+
+        Returns:
+            str: The custom_id
+        """
+        return f"{self.prefix}:{handler}:{action}:{owner_id}:{page}:{key}"
+
+    def decode(self, custom_id: str) -> Optional[ComponentId]:
+        """Unpack a custom_id made by encode
+
+        Args:
+            custom_id (str): The custom_id of an incoming interaction
+
+        Returns:
+            Optional[ComponentId]: The fields, or None if it isn't ours
+        """
+        parts = custom_id.split(":")
+        if len(parts) != 6 or parts[0] != self.prefix:
+            return None
+
+        try:
+            return ComponentId(
+                parts[1], parts[2], int(parts[3]), int(parts[4]), parts[5]
+            )
+        except ValueError:
+            return None
+
+    def button(
+        self,
+        handler: str,
+        action: str,
+        owner_id: int = 0,
+        page: int = 0,
+        key: str = "-",
+        **kwargs,
+    ) -> discord.ui.Button:
+        """Create a button routed to a handler"""
+        return discord.ui.Button(
+            custom_id=self.encode(handler, action, owner_id, page, key), **kwargs
+        )
+
+    def view(self, *items: discord.ui.Item) -> discord.ui.View:
+        """Build a throwaway view that carries routed components
+
+        The view is stopped before it's returned so discord.py doesn't keep it
+        in its view store; the router handles every interaction instead.
+        """
+        view = discord.ui.View(timeout=None)
+        for item in items:
+            view.add_item(item)
+        view.stop()
+        return view
+
+    def modal_value(self, interaction: discord.Interaction) -> str:
+        """Get the text submitted through a RoutedModal"""
+        for row in interaction.data.get("components", []):
+            for component in row.get("components", []):
+                if "value" in component:
+                    return component["value"]
+        return ""
+
+    async def expired(self, interaction: discord.Interaction) -> None:
+        """Tell the user a component's state is gone and strip its controls"""
+        try:
+            await interaction.response.edit_message(view=None)
+        except discord.HTTPException:
+            pass
+
+        await interaction.followup.send(
+            embed=discord.Embed(
+                description=f"{config.WARN_ICON} this menu has expired",
+                color=config.WARN_COLOR,
+            ),
+            ephemeral=True,
+        )
+
+    async def dispatch(self, interaction: discord.Interaction) -> None:
+        """Route an interaction to its handler, ignoring ones that aren't ours"""
+        if interaction.type not in (
+            discord.InteractionType.component,
+            discord.InteractionType.modal_submit,
+        ):
+            return
+
+        component_id = self.decode((interaction.data or {}).get("custom_id", ""))
+        if component_id is None:
+            return
+
+        handler = self.handlers.get(component_id.handler)
+        if handler is None:
+            return await self.expired(interaction)
+
+        if component_id.owner_id and interaction.user.id != component_id.owner_id:
+            return await interaction.response.send_message(
+                embed=discord.Embed(
+                    description=f"{config.ERROR_ICON} you cannot use these controls",
+                    color=config.ERROR_COLOR,
+                ),
+                ephemeral=True,
+            )
+
+        try:
+            await handler(interaction, component_id)
+        except Exception as e:
+            logger.error(
+                f"Component handler {component_id.handler} failed: {e}", exc_info=e
+            )
+
+
+router = ComponentRouter()
@@ -0,0 +1,247 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from types import CodeType, FrameType
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# deep recursion shouldn't make a single sample expensive
+MAX_DEPTH = 128
+# labels kept for the most recently seen code objects; code compiled at run
+# time would otherwise be kept alive, and the cache grow, forever
+MAX_LABELS = 4096
+
+
+class StackSampler:
+    """Samples one thread's stack at a fixed rate into collapsed stacks
+
+    Collapsed stacks are ``root;caller;leaf count`` lines, the input format of
+    flamegraph.pl, speedscope and friends.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.01):
+        """Initialize the sampler
+
+        Args:
+            thread_id (int, optional): Thread to sample, defaults to the caller's
+            interval (float): Seconds between samples
+        """
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._labels: "OrderedDict[CodeType, str]" = OrderedDict()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code: CodeType) -> str:
+        label = self._labels.get(code)
+        if label is not None:
+            self._labels.move_to_end(code)
+            return label
+
+        label = self._labels[code] = (
+            f"{code.co_qualname} "
+            f"({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        )
+        if len(self._labels) > MAX_LABELS:
+            self._labels.popitem(last=False)
+        return label
+
+    def collapse(self, frame: FrameType) -> str:
+        """Render a frame's stack root first, separated by semicolons"""
+        labels = []
+        while frame is not None and len(labels) < MAX_DEPTH:
+            labels.append(self._label(frame.f_code))
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+    def sample(self) -> None:
+        """Take one sample of the thread's stack"""
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is not None:
+            self.stacks[self.collapse(frame)] += 1
+            self.samples += 1
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def start(self) -> None:
+        """Start sampling in a background thread"""
+        self._stopped.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="chime-stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the thread to exit"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class ContinuousProfiler(StackSampler):
+    """An always-on, low-rate sampler that keeps rolling windows on disk
+
+    Samples are aggregated into collapsed stacks per window; at the end of
+    each window they're written to ``<start>-<end>.collapsed`` in the
+    directory and the oldest windows beyond the retention are deleted. At the
+    default 10 samples a second a sample costs tens of microseconds, well
+    under 1% of one core; the time spent sampling is tracked so that stays
+    checkable.
+    """
+
+    def __init__(
+        self,
+        directory: str = "profiles",
+        interval: float = 0.1,
+        window: float = 300,
+        retention: int = 288,
+    ):
+        """Initialize the profiler
+
+        Args:
+            directory (str): Where finished windows are written
+            interval (float): Seconds between samples
+            window (float): Seconds per window
+            retention (int): How many finished windows to keep
+        """
+        super().__init__(interval=interval)
+        self.directory = directory
+        self.window = window
+        self.retention = retention
+        self.window_start = 0.0
+        self.busy = 0.0
+        self._lock = threading.Lock()
+
+    def start(self, directory: Optional[str] = None) -> None:
+        """Start sampling the calling thread, normally the event loop's"""
+        if directory is not None:
+            self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self.thread_id = threading.get_ident()
+        self.window_start = time.time()
+        super().start()
+
+    def stop(self) -> None:
+        """Stop sampling and write out the partial window"""
+        super().stop()
+        self._rotate()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            started = time.perf_counter()
+            with self._lock:
+                self.sample()
+            self.busy += time.perf_counter() - started
+
+            if time.time() - self.window_start >= self.window:
+                self._rotate()
+
+    def _rotate(self) -> None:
+        with self._lock:
+            stacks, self.stacks = self.stacks, Counter()
+            self.samples = 0
+            start, self.window_start = self.window_start, time.time()
+            self.busy = 0.0
+
+        if not stacks:
+            return
+        try:
+            self._write(stacks, start, self.window_start)
+            self._prune()
+        except OSError as e:
+            logger.warning(f"Could not write profile window: {e}")
+
+    def _write(self, stacks: Counter, start: float, end: float) -> None:
+        path = os.path.join(self.directory, f"{int(start)}-{int(end)}.collapsed")
+        with open(f"{path}.tmp", "w") as f:
+            f.write(collapsed_text(stacks))
+        os.replace(f"{path}.tmp", path)
+
+    def _prune(self) -> None:
+        for _, _, path in self.windows()[: -self.retention]:
+            os.remove(path)
+
+    def windows(self) -> List[Tuple[int, int, str]]:
+        """Finished windows on disk as (start, end, path), oldest first"""
+        windows = []
+        for filename in os.listdir(self.directory):
+            name, ext = os.path.splitext(filename)
+            start, _, end = name.partition("-")
+            if ext == ".collapsed" and start.isdigit() and end.isdigit():
+                path = os.path.join(self.directory, filename)
+                windows.append((int(start), int(end), path))
+        return sorted(windows)
+
+    def window_at(self, timestamp: float) -> Optional[Tuple[int, int, str]]:
+        """The finished window covering a point in time, if it's still kept"""
+        for start, end, path in self.windows():
+            if start <= timestamp < end:
+                return start, end, path
+        return None
+
+    def snapshot(self) -> Tuple[Counter, float]:
+        """The current window's stacks so far and the sampling overhead
+
+        Returns:
+            Tuple[Counter, float]: Stacks, and the fraction of one core spent
+                sampling during this window
+        """
+        with self._lock:
+            elapsed = max(time.time() - self.window_start, 1e-9)
+            return Counter(self.stacks), self.busy / elapsed
+
+
+def collapsed_text(stacks: Counter) -> str:
+    """Format collapsed stacks as one ``stack count`` line each"""
+    return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+
+def top_functions(stacks: Counter, limit: int = 15) -> List[Tuple[str, int, int]]:
+    """Rank functions by how many samples they appear in
+
+    Args:
+        stacks (Counter): Collapsed stacks and their sample counts
+        limit (int): How many functions to return
+
+    Returns:
+        List[Tuple[str, int, int]]: (function, inclusive samples, self samples)
+    """
+    inclusive: Counter = Counter()
+    exclusive: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(";")
+        for frame in set(frames):
+            inclusive[frame] += count
+        exclusive[frames[-1]] += count
+
+    return [
+        (frame, count, exclusive[frame])
+        for frame, count in inclusive.most_common(limit)
+    ]
+
+
+def read_collapsed(path: str) -> Counter:
+    """Load collapsed stacks written by collapsed_text"""
+    stacks: Counter = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+profiler = ContinuousProfiler()
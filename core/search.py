@@ -0,0 +1,422 @@
+import abc
+import asyncio
+import codecs
+import logging
+import re
+import time
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import aiohttp
+import discord
+
+from .pages import PageSource
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TIMEOUT = aiohttp.ClientTimeout(total=10)
+VQD_REGEX = re.compile(r"vqd=[\"']?([\d-]+)")
+
+
+class SearchResult(NamedTuple):
+    """One web or image search hit"""
+
+    title: str
+    url: str
+    description: str = ""
+    image: str = ""
+
+
+class SearchBackend(abc.ABC):
+    """Fetches a slice of results for a query"""
+
+    @abc.abstractmethod
+    async def fetch(
+        self, query: str, offset: int, count: int, safe: bool
+    ) -> List[SearchResult]:
+        """Fetch results starting at an offset
+
+        Backends may return more than ``count`` results when their source
+        only serves larger batches; an empty list means there are no more.
+
+        Args:
+            query (str): The normalized query
+            offset (int): How many results were already fetched
+            count (int): How many results are wanted
+            safe (bool): Whether safe search is on
+
+        Returns:
+            List[SearchResult]: The next results
+        """
+
+
+class _GoogleResultParser(HTMLParser):
+    """Pulls results out of Google's basic HTML results page as it streams in
+
+    Each result is a ``div.ezO2md`` block holding a ``/url?q=`` link, a
+    ``span.CVA68e`` title and a ``span.FrIlee`` description.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.results: List[SearchResult] = []
+        self._depth = 0
+        self._url = ""
+        self._title: List[str] = []
+        self._description: List[str] = []
+        self._capture: Optional[List[str]] = None
+        self._spans = 0
+        self._capture_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        classes = (attrs.get("class") or "").split()
+
+        if tag == "div":
+            if self._depth:
+                self._depth += 1
+            elif "ezO2md" in classes:
+                self._depth = 1
+                self._url, self._title, self._description = "", [], []
+                self._capture, self._spans = None, 0
+            return
+
+        if not self._depth:
+            return
+
+        if tag == "a" and not self._url:
+            href = attrs.get("href") or ""
+            if href.startswith("/url?"):
+                self._url = parse_qs(urlparse(href).query).get("q", [""])[0]
+        elif tag == "span":
+            self._spans += 1
+            if self._capture is None and "CVA68e" in classes:
+                self._capture, self._capture_depth = self._title, self._spans
+            elif self._capture is None and "FrIlee" in classes:
+                self._capture, self._capture_depth = self._description, self._spans
+
+    def handle_endtag(self, tag):
+        if tag == "span" and self._depth:
+            if self._spans == self._capture_depth:
+                self._capture = None
+            self._spans -= 1
+        elif tag == "div" and self._depth:
+            self._depth -= 1
+            if not self._depth and self._url.startswith("http"):
+                self.results.append(
+                    SearchResult(
+                        "".join(self._title).strip(),
+                        self._url,
+                        "".join(self._description).strip(),
+                    )
+                )
+
+    def handle_data(self, data):
+        if self._capture is not None:
+            self._capture.append(data)
+
+
+class GoogleBackend(SearchBackend):
+    """Google web results scraped over the bot's aiohttp session
+
+    The page is parsed as it downloads and the download stops as soon as
+    enough results have been read.
+    """
+
+    url = "https://www.google.com/search"
+    # the basic HTML page is only served to simple user agents
+    headers = {"User-Agent": "Lynx/2.9.0 libwww-FM/2.14 SSL-MM/1.4.1 OpenSSL/3.0.2"}
+
+    def __init__(self, session: Callable[[], aiohttp.ClientSession]):
+        """Initialize the backend
+
+        Args:
+            session (Callable): Returns the shared aiohttp session
+        """
+        self.session = session
+
+    async def fetch(self, query, offset, count, safe):
+        params = {
+            "q": query,
+            "num": count + 2,
+            "start": offset,
+            "hl": "en",
+            "safe": "active" if safe else "off",
+        }
+        parser = _GoogleResultParser()
+        async with self.session().get(
+            self.url, params=params, headers=self.headers, timeout=SEARCH_TIMEOUT
+        ) as response:
+            response.raise_for_status()
+            # a multi-byte character can be split across two chunks
+            decoder = codecs.getincrementaldecoder(response.charset or "utf-8")(
+                errors="replace"
+            )
+            async for chunk in response.content.iter_chunked(16384):
+                parser.feed(decoder.decode(chunk))
+                if len(parser.results) >= count:
+                    break
+            else:
+                parser.feed(decoder.decode(b"", final=True))
+
+        parser.close()
+        if not parser.results and not offset:
+            # the parser goes by Google's generated class names, which change
+            logger.warning(
+                f"Google returned no results for {query!r}; "
+                "the page layout may have changed"
+            )
+        return parser.results
+
+
+class DuckDuckGoImageBackend(SearchBackend):
+    """DuckDuckGo image results over the bot's aiohttp session
+
+    Image results need a per-query ``vqd`` token from the search page; tokens
+    are kept so paging through a query only costs the results request.
+    """
+
+    url = "https://duckduckgo.com/"
+    headers = {
+        "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0",
+        "Referer": "https://duckduckgo.com/",
+    }
+
+    def __init__(
+        self, session: Callable[[], aiohttp.ClientSession], max_tokens: int = 256
+    ):
+        """Initialize the backend
+
+        Args:
+            session (Callable): Returns the shared aiohttp session
+            max_tokens (int): Most vqd tokens kept
+        """
+        self.session = session
+        self.max_tokens = max_tokens
+        self._tokens: "OrderedDict[str, str]" = OrderedDict()
+
+    async def _token(self, query: str) -> str:
+        token = self._tokens.get(query)
+        if token is not None:
+            self._tokens.move_to_end(query)
+            return token
+
+        async with self.session().get(
+            self.url,
+            params={"q": query, "iax": "images", "ia": "images"},
+            headers=self.headers,
+            timeout=SEARCH_TIMEOUT,
+        ) as response:
+            response.raise_for_status()
+            match = VQD_REGEX.search(await response.text())
+
+        if match is None:
+            raise ValueError("duckduckgo did not return a search token")
+
+        token = self._tokens[query] = match.group(1)
+        while len(self._tokens) > self.max_tokens:
+            self._tokens.popitem(last=False)
+        return token
+
+    async def fetch(self, query, offset, count, safe):
+        params = {
+            "l": "us-en",
+            "o": "json",
+            "q": query,
+            "vqd": await self._token(query),
+            "f": ",,,",
+            "p": "1" if safe else "-1",
+            "s": str(offset),
+        }
+        async with self.session().get(
+            f"{self.url}i.js",
+            params=params,
+            headers=self.headers,
+            timeout=SEARCH_TIMEOUT,
+        ) as response:
+            response.raise_for_status()
+            data = await response.json(content_type=None)
+
+        return [
+            SearchResult(
+                result.get("title") or query, result["url"], image=result["image"]
+            )
+            for result in data.get("results", [])
+            if result.get("image") and result.get("url")
+        ]
+
+
+class ResultSet:
+    """Results for one query, filled in batches as pages are requested"""
+
+    def __init__(self, query: str, safe: bool, ttl: int):
+        self.query = query
+        self.safe = safe
+        self.results: List[SearchResult] = []
+        self.exhausted = False
+        self.expires_at = time.monotonic() + ttl
+        self.lock = asyncio.Lock()
+        self.prefetch: Optional[asyncio.Task] = None
+        self.viewers = 0
+        self._seen = set()
+
+    def extend(self, batch: Sequence[SearchResult]) -> None:
+        for result in batch:
+            if result.url not in self._seen:
+                self._seen.add(result.url)
+                self.results.append(result)
+
+
+class SearchService:
+    """Cached, incrementally fetched search results
+
+    Result sets are cached by normalized query and safe search setting. Only
+    the requested page is fetched up front; the one after it is fetched in
+    the background so paging forward rarely waits.
+    """
+
+    def __init__(
+        self,
+        backend: SearchBackend,
+        page_size: int,
+        max_results: int = 30,
+        ttl: int = 600,
+        max_entries: int = 256,
+    ):
+        """Initialize the service
+
+        Args:
+            backend (SearchBackend): Where results come from
+            page_size (int): Results shown per page
+            max_results (int): Most results fetched for one query
+            ttl (int): Seconds a query's results stay cached
+            max_entries (int): Most queries kept in the cache
+        """
+        self.backend = backend
+        self.page_size = page_size
+        self.max_results = max_results
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Tuple[str, bool], ResultSet]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Collapse case and whitespace so equivalent queries share a cache entry"""
+        return " ".join(query.lower().split())
+
+    def results(self, query: str, safe: bool = True) -> ResultSet:
+        """Get the cached result set for a query, creating it if needed"""
+        key = (self.normalize(query), safe)
+        result_set = self._cache.get(key)
+        if result_set is not None and result_set.expires_at > time.monotonic():
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return result_set
+
+        self.misses += 1
+        result_set = self._cache[key] = ResultSet(key[0], safe, self.ttl)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            _, evicted = self._cache.popitem(last=False)
+            if evicted.prefetch is not None:
+                evicted.prefetch.cancel()
+        return result_set
+
+    async def _fill(self, result_set: ResultSet, count: int) -> None:
+        """Fetch until the set holds ``count`` results or runs out"""
+        count = min(count, self.max_results)
+        async with result_set.lock:
+            while len(result_set.results) < count and not result_set.exhausted:
+                batch = await self.backend.fetch(
+                    result_set.query,
+                    len(result_set.results),
+                    count - len(result_set.results),
+                    result_set.safe,
+                )
+                before = len(result_set.results)
+                result_set.extend(batch)
+                if len(result_set.results) == before:
+                    result_set.exhausted = True
+
+            if len(result_set.results) >= self.max_results:
+                result_set.exhausted = True
+
+    def _prefetch(self, result_set: ResultSet, count: int) -> None:
+        if result_set.exhausted or len(result_set.results) >= count:
+            return
+        if result_set.prefetch is not None and not result_set.prefetch.done():
+            return
+
+        async def run():
+            try:
+                await self._fill(result_set, count)
+            except Exception as e:
+                logger.warning(f"Prefetch for {result_set.query!r} failed: {e}")
+
+        result_set.prefetch = asyncio.create_task(run())
+
+    async def page(
+        self, result_set: ResultSet, index: int
+    ) -> Optional[List[SearchResult]]:
+        """Get one page of results, prefetching the next in the background
+
+        Args:
+            result_set (ResultSet): The query's results, from results()
+            index (int): The zero-based page index
+
+        Returns:
+            Optional[List[SearchResult]]: The page, or None past the last one
+        """
+        start, end = index * self.page_size, (index + 1) * self.page_size
+        await self._fill(result_set, end)
+
+        page = result_set.results[start:end]
+        if not page:
+            return None
+
+        self._prefetch(result_set, end + self.page_size)
+        return page
+
+    def source(
+        self,
+        query: str,
+        render: Callable[[List[SearchResult]], discord.Embed],
+        safe: bool = True,
+    ) -> PageSource:
+        """Build a lazy page source over a query's results
+
+        Args:
+            query (str): The query as typed
+            render (Callable): Builds the embed for one page of results
+            safe (bool): Whether safe search is on
+
+        Returns:
+            PageSource: A source whose length is learned as results run out
+        """
+        # looked up once, so page turns neither count as cache hits nor start
+        # over on a fresh set when the cached one expires mid-pagination
+        result_set = self.results(query, safe)
+        result_set.viewers += 1
+
+        async def get_page(index: int) -> Optional[discord.Embed]:
+            page = await self.page(result_set, index)
+            return render(page) if page else None
+
+        def on_close():
+            # nobody is paging through this query anymore, stop fetching for it
+            result_set.viewers -= 1
+            if not result_set.viewers and result_set.prefetch is not None:
+                result_set.prefetch.cancel()
+
+        return PageSource(get_page, on_close=on_close)
+
+    def close(self) -> None:
+        """Cancel background fetches and drop the cache"""
+        for result_set in self._cache.values():
+            if result_set.prefetch is not None:
+                result_set.prefetch.cancel()
+        self._cache.clear()
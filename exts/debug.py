@@ -1,7 +1,9 @@
+import asyncio
 import datetime
 import os
 import platform
 import sys
+import time
 
 import discord
 import psutil
@@ -9,6 +11,8 @@ from discord.ext import commands
 
 from config import config
 from core.basecog import BaseCog
+from core.database import db
+from core.monitor import monitor
 
 
 class Debug(BaseCog):
@@ -29,12 +33,140 @@ class Debug(BaseCog):
 
         await ctx.reply(embed=embed)
 
+    @commands.command(name="lag", brief="show event loop lag and slow steps")
+    @commands.is_owner()
+    async def loop_lag(self, ctx):
+        """show recent event loop lag and what blocked the loop"""
+        lag = monitor.recent_lag()
+        summary = (
+            f"Current: `{lag['current'] * 1000:.1f}ms`\n"
+            f"p50: `{lag['p50'] * 1000:.1f}ms`, p99: `{lag['p99'] * 1000:.1f}ms`, "
+            f"max: `{lag['max'] * 1000:.1f}ms`\n"
+            f"Threshold: `{monitor.threshold * 1000:.0f}ms`, "
+            f"slow steps recorded: `{len(monitor.records)}`"
+        )
+
+        pages = [self.embed(title="event loop lag", description=summary)]
+        for record in reversed(monitor.records):
+            stack = "".join(record.stack[-8:])[-1800:] or "no stack captured"
+            embed = self.embed(
+                title=f"blocked {record.duration * 1000:.0f}ms in {record.where}",
+                description=f"```py\n{stack}\n```",
+            )
+            embed.add_field(name="task", value=f"`{record.task}`", inline=True)
+            embed.add_field(
+                name="awaiting",
+                value=" → ".join(f"`{name}`" for name in record.coroutines[-4:])
+                or "none",
+                inline=True,
+            )
+            embed.add_field(
+                name="when",
+                value=f"<t:{int(time.time() - (time.monotonic() - record.started_at))}:R>",
+                inline=True,
+            )
+            pages.append(embed)
+
+        await self.paginate(ctx, pages)
+
+    @commands.command(name="queries", brief="show database query stats")
+    @commands.is_owner()
+    async def query_stats(self, ctx, sort: str = "total"):
+        """show per-query timings, sorted by total, count, p99 or errors"""
+        shapes = db.stats.top(sort, limit=50)
+        if not shapes:
+            return await ctx.reply(
+                embed=self.warning_embed(description="no queries recorded yet")
+            )
+
+        pages = []
+        for shape in shapes:
+            ratio = shape.cache_ratio
+            embed = self.embed(
+                title=f"queries by {sort}",
+                description=f"```sql\n{shape.sql[:1500]}\n```",
+            )
+            embed.add_field(
+                name="runs",
+                value=f"`{shape.count}` ({shape.errors} failed)\n"
+                f"total `{shape.total:.2f}s`",
+                inline=True,
+            )
+            embed.add_field(
+                name="latency",
+                value=f"p50 `{shape.percentile(0.5) * 1000:.1f}ms`\n"
+                f"p95 `{shape.percentile(0.95) * 1000:.1f}ms`\n"
+                f"p99 `{shape.percentile(0.99) * 1000:.1f}ms`",
+                inline=True,
+            )
+            embed.add_field(
+                name="rows & cache",
+                value=f"`{shape.rows / max(shape.count, 1):.1f}` rows per run\n"
+                + (f"`{ratio:.0%}` cache hits" if ratio is not None else "not cached"),
+                inline=True,
+            )
+            pages.append(embed)
+
+        await self.paginate(ctx, pages)
+
+    @commands.command(name="slowqueries", brief="show the slow query log")
+    @commands.is_owner()
+    async def slow_queries(self, ctx):
+        """show recent slow queries and their plans when captured"""
+        if not db.stats.slow:
+            return await ctx.reply(
+                embed=self.warning_embed(
+                    description=f"no queries over "
+                    f"`{db.stats.slow_threshold * 1000:.0f}ms` yet"
+                )
+            )
+
+        pages = []
+        for entry in reversed(db.stats.slow):
+            description = f"```sql\n{entry.sql[:1000]}\n```"
+            if entry.plan:
+                description += f"```\n{entry.plan[:2800]}\n```"
+            elif db.stats.explain:
+                description += "no plan captured for this run"
+            embed = self.embed(
+                title=f"{entry.duration * 1000:.0f}ms in {entry.helper}",
+                description=description,
+            )
+            embed.add_field(name="args", value=f"`{entry.args or 'none'}`")
+            embed.add_field(name="when", value=f"<t:{int(entry.at)}:R>")
+            pages.append(embed)
+
+        await self.paginate(ctx, pages)
+
+    @commands.command(name="rollingrestart", brief="restart every cluster in turn")
+    @commands.is_owner()
+    async def rolling_restart(self, ctx):
+        """ask the cluster launcher to restart the clusters one at a time"""
+        if self.bot.cluster is None:
+            return await ctx.reply(
+                embed=self.error_embed(description="not running under the launcher")
+            )
+
+        await self.bot.cluster.request_restart()
+        await ctx.reply(
+            embed=self.success_embed(description="rolling restart requested")
+        )
+
     @commands.command(name="dbg", brief="debug the bot configuration")
     @commands.is_owner()
     async def debug_config(self, ctx):
         """owner-only command to display all configuration variables with examples"""
         config.reload()
 
+        servers = f"`{len(self.bot.guilds)}`"
+        if self.bot.cluster is not None:
+            try:
+                clusters = await self.bot.cluster.cluster_stats()
+                total = sum(stats["guilds"] for stats in clusters.values())
+                servers += f" (`{total}` across `{len(clusters)}` clusters)"
+            except (ConnectionError, asyncio.TimeoutError):
+                servers += " (cluster stats unavailable)"
+
         category_pages = {}
 
         overview_pages = []
@@ -46,7 +178,7 @@ class Debug(BaseCog):
             value=(
                 f"Bot: `{self.bot.user}`\n"
                 f"Prefix: `{config.PREFIX}`\n"
-                f"Servers: `{len(self.bot.guilds)}`\n"
+                f"Servers: {servers}\n"
                 f"Commands: `{len(list(self.bot.commands))}`\n"
                 f"Cogs: `{len(self.bot.cogs)}`\n"
                 f"Last config reload: <t:{int(datetime.datetime.utcnow().timestamp())}:R>"
@@ -314,7 +446,9 @@ class Debug(BaseCog):
             name="connection",
             value=(
                 f"Websocket latency: `{round(self.bot.latency * 1000)}ms`\n"
-                f"Shard count: `{self.bot.shard_count or 1}`"
+                f"Shard count: `{self.bot.shard_count or 1}`\n"
+                f"Shards here: `{', '.join(map(str, self.bot.shards)) or 0}`\n"
+                f"Cluster: `{self.bot.cluster.cluster_id if self.bot.cluster else 'none'}`"
             ),
             inline=True,
         )
@@ -333,6 +467,24 @@ class Debug(BaseCog):
             inline=True,
         )
 
+        executor_lines = []
+        for executor in self.bot.executors:
+            stats = executor.stats()
+            executor_lines.append(
+                f"**{executor.name}**: `{stats['active']}/{stats['workers']}` busy, "
+                f"`{stats['queued']}/{stats['max_queue']}` queued\n"
+                f"wait `{stats['avg_wait_ms']:.1f}ms`, run `{stats['avg_run_ms']:.1f}ms` "
+                f"(max `{stats['max_run_ms']:.1f}ms`), "
+                f"`{stats['completed']}` done, `{stats['failed']}` failed, "
+                f"`{stats['rejected']}` rejected"
+            )
+
+        perf_embed.add_field(
+            name="executors",
+            value="\n".join(executor_lines) or "none",
+            inline=False,
+        )
+
         bot_pages.append(perf_embed)
         category_pages["bot"] = bot_pages
 
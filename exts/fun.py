@@ -1,32 +1,39 @@
-import asyncio
 import io
-import os
 import random
 import re
 import string
-import traceback
-from itertools import islice
 from urllib.parse import urlparse
 
 import discord
 import dotenv
-import duckduckgo_images_api
-import googlesearch
 from discord import File, ui
 from discord.ext import commands
-from groq import AsyncGroq
 
 import config
+from core.ai import (
+    AIQueueFull,
+    AIScheduler,
+    ConversationStore,
+    PromptFile,
+    backend_from_env,
+)
 from core.basecog import BaseCog
 from core.database import db
+from core.router import router
+from core.search import (
+    DuckDuckGoImageBackend,
+    GoogleBackend,
+    SearchService,
+)
 
 dotenv.load_dotenv()
 
 
 class ReplyModal(ui.Modal):
-    def __init__(self, title, history):
+    def __init__(self, title, conversation, cog):
         super().__init__(title=title)
-        self.history = history
+        self.conversation = conversation
+        self.cog = cog
         self.user_input = ui.TextInput(
             label="Your message",
             placeholder="Enter your message here...",
@@ -36,112 +43,61 @@ class ReplyModal(ui.Modal):
         self.add_item(self.user_input)
 
     async def on_submit(self, interaction: discord.Interaction):
-        del_resp = await interaction.response.defer(thinking=True)
+        await interaction.response.defer()
 
-        self.history.append({"role": "user", "content": self.user_input.value})
+        conversation = self.conversation.add("user", self.user_input.value)
 
         model = "llama3-70b-8192"
 
-        messages = []
-
-        for entry in self.history:
-            if entry["role"] == "user":
-                messages.append(
-                    {
-                        "role": "user",
-                        "content": [{"type": "text", "text": entry["content"]}],
-                    },
-                )
-            else:
-                messages.append({"role": "assistant", "content": entry["content"]})
-
+        message = await interaction.message.reply(
+            embed=self.cog.ai_embed(model, f"{config.WAIT_ICON} thinking..."),
+            mention_author=False,
+        )
         try:
-            client = AsyncGroq(api_key=os.getenv("AI_KEY"))
-            response = await client.chat.completions.create(
-                model=model,
-                messages=messages,
-                max_completion_tokens=1024,
-            )
-
-            response_text = response.choices[0].message.content
-
-            self.history.append({"role": "assistant", "content": response_text})
-
-            words_per_page = 148
-            pages = []
-            for i in range(0, len(response_text.split(" ")), words_per_page):
-                page = response_text.split(" ")[i : i + words_per_page]
-                pages.append(
-                    self.cog.embed(description=" ".join(page)).set_author(
-                        name=" ".join(model.split("-")),
-                        icon_url="https://images.seeklogo.com/logo-png/59/1/ollama-logo-png_seeklogo-593420.png",
-                    )
-                )
-
-            reply_button = ui.Button(
-                emoji=config.PLANE_ICON, style=discord.ButtonStyle.gray
-            )
-
-            async def new_reply_callback(new_interaction: discord.Interaction):
-                if new_interaction.user.id != self.ctx.author.id:
-                    await new_interaction.response.send_message(
-                        embed=self.cog.error_embed(
-                            description="you cannot use these controls"
-                        ),
-                        ephemeral=True,
-                    )
-                    return
-
-                new_modal = ReplyModal(
-                    title="Continue conversation", history=self.history
-                )
-                new_modal.cog = self.cog
-                new_modal.ctx = self.ctx
-
-                await new_interaction.response.send_modal(new_modal)
-
-            reply_button.callback = new_reply_callback
-
-            download_button = ui.Button(
-                emoji=config.DOWNLOAD_ICON, style=discord.ButtonStyle.gray
+            response_text = await self.cog.stream_ai(
+                message, interaction.guild_id, conversation.messages(), model
             )
 
-            async def download_callback(new_interaction: discord.Interaction):
-                file = io.BytesIO(response_text.encode())
-                await new_interaction.response.send_message(
-                    file=File(file, filename="response.txt"), ephemeral=True
-                )
-
-            download_button.callback = download_callback
-
-            await del_resp.resource.delete()
-            await self.cog.paginate(
-                self.ctx,
-                pages,
-                compact=True,
-                extra_buttons=[reply_button, download_button],
+            await self.cog.send_ai_response(
+                message,
+                interaction.user.id,
+                conversation.add("assistant", response_text),
+                model,
             )
 
         except Exception as e:
-            print(e)
-            await self.ctx.channel.send(
-                embed=self.cog.error_embed(description="the ai didn't respond")
-            )
+            self.cog.logger.error(f"AI reply failed: {e}", exc_info=e)
+            await message.edit(embed=self.cog.ai_error_embed(e))
 
 
 class Fun(BaseCog):
     def __init__(self, bot):
         self.tags_blocked = []
+        self.ai_scheduler = None
+        self.system_prompt = PromptFile("system_prompt.txt")
+        self.conversations = ConversationStore()
+        self.web_search = SearchService(
+            GoogleBackend(lambda: self.bot.session), page_size=3
+        )
+        self.image_search_service = SearchService(
+            DuckDuckGoImageBackend(lambda: self.bot.session),
+            page_size=1,
+            max_results=100,
+        )
         super().__init__(bot)
 
-    def gen(self, generator, group_size=3):
-        while True:
-            group = list(islice(generator, group_size))
-
-            if not group:
-                break
+    async def cog_load(self):
+        # one backend for the cog's lifetime so its connection pool is reused
+        self.ai_scheduler = AIScheduler(backend_from_env())
+        router.register("ai", self._ai_component)
+        await super().cog_load()
 
-            yield group
+    async def cog_unload(self):
+        router.unregister("ai")
+        await self.ai_scheduler.close()
+        self.web_search.close()
+        self.image_search_service.close()
+        await super().cog_unload()
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -157,20 +113,10 @@ class Fun(BaseCog):
                 else []
             )
 
-    async def search(self, query):
-        results = await asyncio.to_thread(
-            googlesearch.search,
-            query,
-            num_results=30,
-            lang="en",
-            advanced=True,
-            safe="active",
-            unique=True,
-        )
-
-        embeds = []
+    def search(self, query):
+        """lazily paged google results, three per page"""
 
-        for triplet in self.gen(results, 3):
+        def render(triplet):
             embed = self.embed()
             embed.set_author(
                 name=f"search results for {query}",
@@ -179,135 +125,178 @@ class Fun(BaseCog):
                 ).url,
             )
             for i in triplet:
-                if not i.url:
-                    continue
-
                 embed.add_field(
                     name=f"{config.SEARCH_ICON} {i.title or query}",
                     value=f"[{urlparse(i.url).netloc}]({i.url})\n{i.description or '*no description*'}",
                     inline=False,
                 )
-            embeds.append(embed)
+            return embed
 
-        return embeds
+        return self.web_search.source(query, render)
 
-    async def image_search(self, query):
-        results = await asyncio.to_thread(
-            duckduckgo_images_api.search,
-            query,
-        )
-        embeds = []
-        for result in results["results"]:
-            embed = self.embed(description=f"[source]({result['url']})")
+    def image_search(self, query):
+        """lazily paged image results, one per page"""
+
+        def render(results):
+            result = results[0]
+            embed = self.embed(description=f"[source]({result.url})")
             embed.set_author(
                 name=f"image results for {query}",
                 icon_url=self.bot.application_emojis.get(
                     int(config.SEARCH_ICON.split(":")[2][:-1])
                 ).url,
             )
-            embed.set_image(url=result["image"])
-            embeds.append(embed)
-        return embeds
+            embed.set_image(url=result.image)
+            return embed
+
+        return self.image_search_service.source(query, render)
 
     @commands.command(name="google", brief="search Google for a query")
     @commands.cooldown(1, 5, commands.BucketType.user)
     async def google(self, ctx, *, query):
-        results = await self.search(query)
-
-        if results:
-            return await self.paginate(ctx, results)
-
-        await ctx.reply(embed=self.error_embed(description="no results found"))
+        results = self.search(query)
+        paginated = False
+        try:
+            if await results.get(0):
+                paginated = True
+                return await self.paginate(ctx, results)
+            await ctx.reply(embed=self.error_embed(description="no results found"))
+        finally:
+            # a paginated source is closed when its view state is released
+            if not paginated:
+                results.close()
 
     @commands.command(name="image", brief="search for an image")
     @commands.cooldown(1, 10, commands.BucketType.user)
     async def image(self, ctx, *, query):
         await ctx.message.add_reaction(config.THINK_ICON)
+        results = self.image_search(query)
+        paginated = False
         try:
-            results = await self.image_search(query)
-            await self.paginate(ctx, results)
+            if await results.get(0):
+                paginated = True
+                await self.paginate(ctx, results)
+            else:
+                await ctx.reply(embed=self.error_embed(description="no results found"))
         except Exception:
             await ctx.reply(embed=self.error_embed(description="no results found"))
+        finally:
+            # a paginated source is closed when its view state is released
+            if not paginated:
+                results.close()
         await ctx.message.remove_reaction(config.THINK_ICON, self.bot.user)
 
-    async def ai_gen(self, messages, model) -> str:
-        client = AsyncGroq(api_key=os.getenv("AI_KEY"))
+    def ai_embed(self, model, text):
+        """embed for ai output, attributed to the model"""
+        return self.embed(description=text).set_author(
+            name=" ".join(model.split("-")),
+            icon_url="https://images.seeklogo.com/logo-png/59/1/ollama-logo-png_seeklogo-593420.png",
+        )
+
+    async def stream_ai(self, message, guild_id, messages, model) -> str:
+        """queue for the ai, then stream its completion into message as it arrives"""
 
-        response = await client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_completion_tokens=1024,
+        async def queued(position):
+            await message.edit(
+                embed=self.ai_embed(
+                    model, f"{config.WAIT_ICON} queued, position **{position}**"
+                )
+            )
+
+        async def show(text):
+            # embed descriptions cap at 4096, keep the newest text in view
+            if len(text) > 4000:
+                text = "..." + text[-4000:]
+            await message.edit(embed=self.ai_embed(model, text))
+
+        return await self.ai_scheduler.run(
+            guild_id or 0, model, messages, show, on_position=queued
         )
 
-        return response.choices[0].message.content
+    def ai_error_embed(self, error):
+        """explain why an ai request failed"""
+        if isinstance(error, AIQueueFull):
+            return self.error_embed(description="the ai is busy, try again later")
+        if isinstance(error, TimeoutError):
+            return self.error_embed(description="the ai took too long to respond")
+        return self.error_embed(description="the ai didn't respond")
 
     @commands.command(name="ai", brief="talk to ai")
     @commands.cooldown(1, 60, commands.BucketType.user)
     async def ai(self, ctx, *, query):
-        await ctx.message.add_reaction(config.THINK_ICON)
+        model = "llama3-70b-8192"
+        message = await ctx.reply(
+            embed=self.ai_embed(model, f"{config.WAIT_ICON} thinking...")
+        )
         try:
-            model = "llama3-70b-8192"
-            with open("system_prompt.txt", "r") as f:
-                system_prompt = [{"role": "system", "content": f.read()}]
-            history = system_prompt
-            history.append({"role": "user", "content": query})
-            response_text = await self.ai_gen(history, model)
-            history.append({"role": "assistant", "content": response_text})
-
-            words_per_page = 148
-            pages = []
-            for i in range(0, len(response_text.split(" ")), words_per_page):
-                page = response_text.split(" ")[i : i + words_per_page]
-                pages.append(
-                    self.embed(description=" ".join(page)).set_author(
-                        name=" ".join(model.split("-")),
-                        icon_url="https://images.seeklogo.com/logo-png/59/1/ollama-logo-png_seeklogo-593420.png",
-                    )
-                )
-
-            reply_button = ui.Button(
-                emoji=config.PLANE_ICON, style=discord.ButtonStyle.gray
+            conversation = self.conversations.start(self.system_prompt.get())
+            conversation = conversation.add("user", query)
+            response_text = await self.stream_ai(
+                message, ctx.guild and ctx.guild.id, conversation.messages(), model
             )
 
-            async def reply_callback(interaction: discord.Interaction):
-                if interaction.user.id != ctx.author.id:
-                    await interaction.response.send_message(
-                        embed=self.error_embed(
-                            description="you cannot use these controls"
-                        ),
-                        ephemeral=True,
-                    )
-                    return
-
-                modal = ReplyModal(title="Continue conversation", history=history)
-                modal.cog = self
-                modal.ctx = ctx
+            await self.send_ai_response(
+                message,
+                ctx.author.id,
+                conversation.add("assistant", response_text),
+                model,
+            )
 
-                await interaction.response.send_modal(modal)
+        except Exception as e:
+            self.logger.error(f"AI request failed: {e}", exc_info=e)
+            await message.edit(embed=self.ai_error_embed(e))
+
+    async def send_ai_response(self, message, owner_id, conversation, model):
+        """turn a streamed ai message into a paginator with reply and download controls"""
+        self.conversations.put(message.id, conversation)
+
+        words_per_page = 148
+        words = conversation.last_reply.split(" ")
+        pages = [
+            self.ai_embed(model, " ".join(words[i : i + words_per_page]))
+            for i in range(0, len(words), words_per_page)
+        ]
+
+        reply_button = router.button(
+            "ai",
+            "reply",
+            owner_id,
+            emoji=config.PLANE_ICON,
+            style=discord.ButtonStyle.gray,
+        )
+        download_button = router.button(
+            "ai",
+            "download",
+            emoji=config.DOWNLOAD_ICON,
+            style=discord.ButtonStyle.gray,
+        )
 
-            reply_button.callback = reply_callback
+        await self.paginate(
+            message,
+            pages,
+            compact=True,
+            extra_buttons=[reply_button, download_button],
+            owner_id=owner_id,
+            message=message,
+        )
 
-            download_button = ui.Button(
-                emoji=config.DOWNLOAD_ICON, style=discord.ButtonStyle.gray
-            )
+    async def _ai_component(self, interaction, component):
+        """handle the reply and download buttons under an ai response"""
+        conversation = self.conversations.get(interaction.message.id)
+        if conversation is None:
+            return await router.expired(interaction)
 
-            async def download_callback(interaction: discord.Interaction):
-                file = io.BytesIO(response_text.encode())
-                await interaction.response.send_message(
-                    file=File(file, filename="response.txt"), ephemeral=True
+        if component.action == "reply":
+            await interaction.response.send_modal(
+                ReplyModal(
+                    title="Continue conversation", conversation=conversation, cog=self
                 )
-
-            download_button.callback = download_callback
-
-            await self.paginate(
-                ctx, pages, compact=True, extra_buttons=[reply_button, download_button]
             )
-
-        except Exception as e:
-            print(e)
-            await ctx.reply(embed=self.error_embed(description="the ai didn't respond"))
-        finally:
-            await ctx.message.remove_reaction(config.THINK_ICON, self.bot.user)
+        elif component.action == "download":
+            file = io.BytesIO(conversation.last_reply.encode())
+            await interaction.response.send_message(
+                file=File(file, filename="response.txt"), ephemeral=True
+            )
 
     @commands.group(name="tag", aliases=["tags"], invoke_without_command=True)
     @commands.cooldown(3, 5, commands.BucketType.user)
@@ -564,7 +553,7 @@ class Fun(BaseCog):
                 pages.append(page)
             await self.paginate(ctx, pages, compact=True)
         except Exception:
-            print(traceback.format_exc())
+            self.logger.exception("Failed to process definition")
             return await ctx.reply(
                 embed=self.error_embed(description="failed to process definition")
             )
@@ -1,108 +1,90 @@
 import discord
 from discord.ext import commands
 
-import config
 from core.basecog import BaseCog
+from core.bulk import BulkOperation
+from core.purge import BULK_DELETE_CHUNK, PurgeEngine, PurgeFilter
 
 
 class Guild(BaseCog):
+    async def _bulk_channels(self, ctx, channels, action, label, single, summary):
+        """run action on each channel, with live progress for more than one"""
+        if len(channels) == 1:
+            await action(channels[0])
+            return await ctx.reply(embed=self.success_embed(description=single))
+
+        await BulkOperation(
+            ctx,
+            channels,
+            action,
+            label=label,
+            summary=summary,
+            describe=lambda channel: channel.mention,
+        ).run()
+
     @commands.command()
     @commands.has_permissions(manage_channels=True)
     async def lock(self, ctx, *channels: discord.TextChannel | discord.VoiceChannel):
         """make channel read-only"""
         channels = channels or [ctx.channel]
-        if len(channels) > 1:
-            await ctx.message.add_reaction(config.THINK_ICON)
-
-        for channel in channels:
-            await channel.set_permissions(ctx.guild.default_role, send_messages=False)
-
-        if len(channels) == 1:
-            await ctx.reply(
-                embed=self.success_embed(
-                    description=f"{channels[0].mention} has been **locked**"
-                )
-            )
-        else:
-            await ctx.message.remove_reaction(config.THINK_ICON, self.bot.user)
-            await ctx.reply(
-                embed=self.success_embed(
-                    description=f"**{len(channels)}** channels have been **locked**"
-                )
-            )
+        await self._bulk_channels(
+            ctx,
+            channels,
+            lambda channel: channel.set_permissions(
+                ctx.guild.default_role, send_messages=False
+            ),
+            label="locking channels",
+            single=f"{channels[0].mention} has been **locked**",
+            summary="**{count}** channels have been **locked**",
+        )
 
     @commands.command()
     @commands.has_permissions(manage_channels=True)
     async def unlock(self, ctx, *channels: discord.TextChannel | discord.VoiceChannel):
         """unlock channel"""
         channels = channels or [ctx.channel]
-        if len(channels) > 1:
-            await ctx.message.add_reaction(config.THINK_ICON)
-
-        for channel in channels:
-            await channel.set_permissions(ctx.guild.default_role, send_messages=True)
-
-        if len(channels) == 1:
-            await ctx.reply(
-                embed=self.success_embed(
-                    description=f"{channels[0].mention} has been **unlocked**"
-                )
-            )
-        else:
-            await ctx.message.remove_reaction(config.THINK_ICON, self.bot.user)
-            await ctx.reply(
-                embed=self.success_embed(
-                    description=f"**{len(channels)}** channels have been **unlocked**"
-                )
-            )
+        await self._bulk_channels(
+            ctx,
+            channels,
+            lambda channel: channel.set_permissions(
+                ctx.guild.default_role, send_messages=True
+            ),
+            label="unlocking channels",
+            single=f"{channels[0].mention} has been **unlocked**",
+            summary="**{count}** channels have been **unlocked**",
+        )
 
     @commands.command()
     @commands.has_permissions(manage_channels=True)
     async def hide(self, ctx, *channels: discord.TextChannel | discord.VoiceChannel):
         """hide channel from members"""
         channels = channels or [ctx.channel]
-        if len(channels) > 1:
-            await ctx.message.add_reaction(config.THINK_ICON)
-        for channel in channels:
-            await channel.set_permissions(ctx.guild.default_role, view_channel=False)
-
-        if len(channels) == 1:
-            await ctx.reply(
-                embed=self.success_embed(
-                    description=f"{channels[0].mention} has been **hidden**"
-                )
-            )
-        else:
-            await ctx.message.remove_reaction(config.THINK_ICON, self.bot.user)
-            await ctx.reply(
-                embed=self.success_embed(
-                    description=f"**{len(channels)}** channels have been **hidden**"
-                )
-            )
+        await self._bulk_channels(
+            ctx,
+            channels,
+            lambda channel: channel.set_permissions(
+                ctx.guild.default_role, view_channel=False
+            ),
+            label="hiding channels",
+            single=f"{channels[0].mention} has been **hidden**",
+            summary="**{count}** channels have been **hidden**",
+        )
 
     @commands.command()
     @commands.has_permissions(manage_channels=True)
     async def show(self, ctx, *channels: discord.TextChannel | discord.VoiceChannel):
         """show hidden channel"""
         channels = channels or [ctx.channel]
-        if len(channels) > 1:
-            await ctx.message.add_reaction(config.THINK_ICON)
-        for channel in channels:
-            await channel.set_permissions(ctx.guild.default_role, view_channel=True)
-
-        if len(channels) == 1:
-            await ctx.reply(
-                embed=self.success_embed(
-                    description=f"{channels[0].mention} is now **visible**"
-                )
-            )
-        else:
-            await ctx.message.remove_reaction(config.THINK_ICON, self.bot.user)
-            await ctx.reply(
-                embed=self.success_embed(
-                    description=f"**{len(channels)}** channels are now **visible**"
-                )
-            )
+        await self._bulk_channels(
+            ctx,
+            channels,
+            lambda channel: channel.set_permissions(
+                ctx.guild.default_role, view_channel=True
+            ),
+            label="showing channels",
+            single=f"{channels[0].mention} is now **visible**",
+            summary="**{count}** channels are now **visible**",
+        )
 
     @commands.command()
     @commands.has_permissions(manage_channels=True)
@@ -121,40 +103,21 @@ class Guild(BaseCog):
             )
 
         channels = channels or [ctx.channel]
-        if len(channels) > 1:
-            await ctx.message.add_reaction(config.THINK_ICON)
-
-        for channel in channels:
-            await channel.edit(slowmode_delay=seconds)
-
         if seconds > 0:
-            if len(channels) > 1:
-                await ctx.message.remove_reaction(config.THINK_ICON, self.bot.user)
-                await ctx.reply(
-                    embed=self.success_embed(
-                        description=f"**{len(channels)}** channels have **{seconds}s slowmode**"
-                    )
-                )
-            else:
-                await ctx.reply(
-                    embed=self.success_embed(
-                        description=f"{ctx.channel.mention} slowmode set to **{seconds} seconds**"
-                    )
-                )
+            single = f"{channels[0].mention} slowmode set to **{seconds} seconds**"
+            summary = f"**{{count}}** channels have **{seconds}s slowmode**"
         else:
-            if len(channels) > 1:
-                await ctx.message.remove_reaction(config.THINK_ICON, self.bot.user)
-                await ctx.reply(
-                    embed=self.success_embed(
-                        description=f"**{len(channels)}** channels have **disabled slowmode**"
-                    )
-                )
-            else:
-                await ctx.reply(
-                    embed=self.success_embed(
-                        description=f"{ctx.channel.mention} slowmode **disabled**"
-                    )
-                )
+            single = f"{channels[0].mention} slowmode **disabled**"
+            summary = "**{count}** channels have **disabled slowmode**"
+
+        await self._bulk_channels(
+            ctx,
+            channels,
+            lambda channel: channel.edit(slowmode_delay=seconds),
+            label="setting slowmode",
+            single=single,
+            summary=summary,
+        )
 
     @commands.command(name="slowall", brief="Set slowmode for all channels")
     @commands.has_permissions(manage_channels=True)
@@ -167,28 +130,30 @@ class Guild(BaseCog):
                 )
             )
 
-        await ctx.message.add_reaction(config.THINK_ICON)
-
-        everyone_role = ctx.guild.default_role
-        for channel in ctx.guild.channels:
-            if channel.overwrites_for(everyone_role).send_messages is False:
-                continue
-            await channel.edit(slowmode_delay=seconds)
-
-        await ctx.message.remove_reaction(config.THINK_ICON, self.bot.user)
-
         if seconds > 0:
-            await ctx.reply(
-                embed=self.success_embed(
-                    description=f"slowmode set to **{seconds} seconds** for all channels"
-                )
-            )
+            done = f"slowmode set to **{seconds} seconds** for all channels"
         else:
-            await ctx.reply(
-                embed=self.success_embed(
-                    description="slowmode **disabled** for all channels"
-                )
-            )
+            done = "slowmode **disabled** for all channels"
+
+        everyone_role = ctx.guild.default_role
+        channels = [
+            channel
+            for channel in ctx.guild.channels
+            if getattr(channel, "slowmode_delay", seconds) != seconds
+            and channel.overwrites_for(everyone_role).send_messages is not False
+        ]
+
+        if not channels:
+            return await ctx.reply(embed=self.success_embed(description=done))
+
+        await self._bulk_channels(
+            ctx,
+            channels,
+            lambda channel: channel.edit(slowmode_delay=seconds),
+            label="setting slowmode",
+            single=done,
+            summary=done + " (**{count}** updated)",
+        )
 
     @commands.command(
         name="purge",
@@ -197,36 +162,21 @@ class Guild(BaseCog):
     )
     @commands.has_permissions(manage_messages=True)
     async def purge(self, ctx, *args):
-        """delete messages in channel"""
+        """delete messages in channel, filtered by users, roles, bots, contains:, regex:, has:, before: and after:"""
         try:
             await ctx.message.delete()
         except (discord.Forbidden, discord.NotFound, discord.HTTPException):
             pass
 
         limit = 5
-        users = []
         channels = []
-        constraints = []
-
-        if not args:
-            try:
-                deleted = await ctx.channel.purge(limit=limit)
-                await self._send_purge_success(ctx, ctx.channel, len(deleted))
-                return
-            except Exception as e:
-                return await self._send_purge_error(ctx, ctx.channel, e)
-
-        if len(args) == 1 and args[0].isdigit():
-            try:
-                limit = min(int(args[0]), 2000)
-                deleted = await ctx.channel.purge(limit=limit)
-                await self._send_purge_success(ctx, ctx.channel, len(deleted))
-                return
-            except Exception as e:
-                return await self._send_purge_error(ctx, ctx.channel, e)
+        criteria = PurgeFilter()
 
         async with ctx.channel.typing():
             for arg in args:
+                if criteria.parse(arg, ctx.guild):
+                    continue
+
                 if arg.startswith("<@") and arg.endswith(">"):
                     try:
                         user_id = int(arg.strip("<@!>"))
@@ -237,7 +187,7 @@ class Guild(BaseCog):
                             except (discord.NotFound, discord.HTTPException):
                                 continue
                         if user:
-                            users.append(user)
+                            criteria.user_ids.add(user.id)
                             continue
                     except ValueError:
                         pass
@@ -258,109 +208,52 @@ class Guild(BaseCog):
                         limit = min(limit_val, 2000)
                         continue
 
-                if arg.lower() in ["bot", "bots"]:
-                    constraints.append(lambda m: m.author.bot)
-
-            if not channels:
-                channels = [ctx.channel]
-
-            def check_message(message):
-                if message.id == ctx.message.id:
-                    return False
-
-                if users and message.author not in users:
-                    return False
-
-                for constraint in constraints:
-                    if not constraint(message):
-                        return False
+        if not channels:
+            channels = [ctx.channel]
 
-                return True
+        before = ctx.message
+        if criteria.before is not None and criteria.before.id < before.id:
+            before = criteria.before
 
-            total_deleted = 0
-            errors = []
-
-            for channel in channels:
-                try:
-                    messages_to_delete = []
-                    search_limit = min(limit * 3, 1000)
-
-                    async for message in channel.history(limit=search_limit):
-                        if check_message(message):
-                            messages_to_delete.append(message)
-                            if len(messages_to_delete) >= limit:
-                                break
-
-                    if not messages_to_delete:
-                        continue
+        engine = PurgeEngine(
+            criteria.compile(),
+            limit,
+            scan_limit=limit if criteria.is_empty else min(limit * 3, 1000),
+            before=before,
+            after=criteria.after,
+        )
 
-                    import datetime
-
-                    two_weeks_ago = datetime.datetime.now(
-                        datetime.timezone.utc
-                    ) - datetime.timedelta(days=14)
-
-                    recent_messages = [
-                        msg
-                        for msg in messages_to_delete
-                        if msg.created_at > two_weeks_ago
-                    ]
-                    old_messages = [
-                        msg
-                        for msg in messages_to_delete
-                        if msg.created_at <= two_weeks_ago
-                    ]
-
-                    if recent_messages:
-                        if len(recent_messages) == 1:
-                            await recent_messages[0].delete()
-                            total_deleted += 1
-                        else:
-                            deleted = await channel.delete_messages(recent_messages)
-                            total_deleted += len(recent_messages)
-
-                    for old_msg in old_messages:
-                        try:
-                            await old_msg.delete()
-                            total_deleted += 1
-                        except (
-                            discord.Forbidden,
-                            discord.NotFound,
-                            discord.HTTPException,
-                        ):
-                            pass
-
-                except discord.Forbidden:
-                    errors.append(f"Missing permissions in {channel.mention}")
-                except discord.HTTPException as e:
-                    errors.append(f"Error in {channel.mention}: {str(e)}")
-                except Exception as e:
-                    errors.append(f"Unexpected error in {channel.mention}: {str(e)}")
-
-            if total_deleted == 0:
-                if errors:
-                    error_msg = "\n".join(errors)
-                    await ctx.send(
-                        embed=self.error_embed(
-                            description=f"Failed to delete messages:\n{error_msg}"
-                        ),
-                        delete_after=10,
-                    )
-                else:
-                    await ctx.send(
-                        embed=self.warning_embed(
-                            description="No messages matched your criteria"
-                        ),
-                        delete_after=10,
-                    )
-            else:
-                plural = "" if total_deleted == 1 else "s"
-                await ctx.send(
-                    embed=self.success_embed(
-                        description=f"Deleted **{total_deleted}** message{plural}"
-                    ),
-                    delete_after=10,
-                )
+        def summary(result):
+            if not engine.deleted:
+                return "No messages matched your criteria"
+            plural = "" if engine.deleted == 1 else "s"
+            return f"Deleted **{engine.deleted}** message{plural}"
+
+        operation = BulkOperation(
+            ctx,
+            channels,
+            engine.purge_channel,
+            label="purging",
+            summary=summary,
+            describe=lambda channel: channel.mention,
+            detail=lambda: f"**{engine.deleted}** deleted",
+            # purges spanning several chunks get live progress even in one channel
+            status_threshold=1 if limit > BULK_DELETE_CHUNK else 2,
+            delete_after=10,
+        )
+        result = await operation.run()
+        if operation.message is not None:
+            return
+
+        channel = channels[0]
+        if result.failed:
+            return await self._send_purge_error(ctx, channel, result.failed[0][1])
+        if not engine.deleted:
+            return await ctx.send(
+                embed=self.warning_embed(description=summary(result)),
+                delete_after=10,
+            )
+        await self._send_purge_success(ctx, channel, engine.deleted)
 
     async def _send_purge_success(self, ctx, channel, count):
         """helper method send purge success message"""
@@ -432,9 +325,11 @@ class Guild(BaseCog):
             )
 
             embed.set_footer(
-                text=f"vanity: .gg/{ctx.guild.vanity_url_code}"
-                if ctx.guild.vanity_url_code
-                else "no vanity url"
+                text=(
+                    f"vanity: .gg/{ctx.guild.vanity_url_code}"
+                    if ctx.guild.vanity_url_code
+                    else "no vanity url"
+                )
             )
             pages.append(embed)
         await self.paginate(ctx, pages)
@@ -9,6 +9,10 @@ from discord.ext import commands
 
 import config
 from core.basecog import BaseCog
+from core.intents import needs_members
+from core.members import member_stats
+from core.pages import PageSource
+from core.router import router
 
 
 class Info(BaseCog):
@@ -32,6 +36,16 @@ class Info(BaseCog):
         "app": "<:app:1356298588111507476>",
     }
 
+    async def cog_load(self):
+        router.register("avatar", self._asset_component)
+        router.register("banner", self._asset_component)
+        await super().cog_load()
+
+    async def cog_unload(self):
+        router.unregister("avatar")
+        router.unregister("banner")
+        await super().cog_unload()
+
     @commands.command(name="ping", brief="check the bot's latency")
     async def ping(self, ctx):
         """check the bot's latency"""
@@ -63,56 +77,10 @@ class Info(BaseCog):
     @commands.command(name="avatar", brief="get an user's avatar", aliases=["av"])
     async def avatar(self, ctx, user: discord.Member = None):
         user = user or ctx.author
-        embed = self.embed()
-        embed.set_author(name=f"{user.name}'s avatar", icon_url=user.display_avatar.url)
-        embed.set_image(url=user.display_avatar.url)
+        embed = self._asset_embed("avatar", user, user.display_avatar)
         view = None
         if user.guild_avatar:
-
-            class AvatarControls(discord.ui.View):
-                def __init__(self, user):
-                    self.selected = user.guild_avatar
-                    super().__init__()
-
-                    self.add_item(
-                        discord.ui.Button(label="main avatar", custom_id="main")
-                    )
-                    self.add_item(
-                        discord.ui.Button(
-                            label="server avatar", custom_id="server", disabled=True
-                        )
-                    )
-
-                    for child in self.children:
-                        child.callback = self.button_callback
-
-                async def button_callback(self, interaction: discord.Interaction):
-                    button_id = interaction.data["custom_id"]
-
-                    if interaction.user.id != ctx.author.id:
-                        await interaction.response.send_message(
-                            embed=self.error_embed(
-                                "you cannot use these controls as you didn't invoke the command"
-                            ),
-                            ephemeral=True,
-                        )
-                        return
-
-                    if button_id == "main":
-                        self.selected = user.avatar
-                        self.children[0].disabled = True
-                        self.children[1].disabled = False
-
-                    elif button_id == "server":
-                        self.children[0].disabled = False
-                        self.children[1].disabled = True
-                        self.selected = user.guild_avatar
-
-                    await interaction.response.edit_message(
-                        embed=embed.set_image(url=self.selected.url), view=self
-                    )
-
-            view = AvatarControls(user)
+            view = self._asset_view("avatar", ctx.author.id, user, "server")
         await ctx.reply(embed=embed, view=view)
 
     @commands.command(name="banner", brief="get an user's banner", aliases=["bn"])
@@ -128,58 +96,73 @@ class Info(BaseCog):
                 )
             )
 
-        embed = self.embed()
-        embed.set_image(url=user.banner.url if user.banner else user.guild_banner.url)
-        embed.set_author(name=f"{user.name}'s banner", icon_url=user.display_avatar.url)
+        embed = self._asset_embed("banner", user, user.banner or user.guild_banner)
 
         if user.guild_banner:
+            selected = "main" if user.banner else "server"
+            view = self._asset_view("banner", ctx.author.id, user, selected)
+        await ctx.reply(embed=embed, view=view)
 
-            class BannerControls(discord.ui.View):
-                def __init__(self, user):
-                    self.selected = user.guild_banner
-                    super().__init__()
-
-                    if user.banner:
-                        self.add_item(
-                            discord.ui.Button(label="main banner", custom_id="main")
-                        )
-                    self.add_item(
-                        discord.ui.Button(
-                            label="server banner", custom_id="server", disabled=True
-                        )
-                    )
-
-                    for child in self.children:
-                        child.callback = self.button_callback
-
-                async def button_callback(self, interaction: discord.Interaction):
-                    button_id = interaction.data["custom_id"]
-
-                    if interaction.user.id != ctx.author.id:
-                        await interaction.response.send_message(
-                            embed=self.error_embed(
-                                "you cannot use these controls as you didn't invoke the command"
-                            ),
-                            ephemeral=True,
-                        )
-                        return
-
-                    if button_id == "main":
-                        self.selected = user.banner
-                        self.children[0].disabled = True
-                        self.children[1].disabled = False
-
-                    elif button_id == "server":
-                        self.selected = user.guild_banner
-                        self.children[0].disabled = False
-                        self.children[1].disabled = True
+    def _asset_embed(self, kind, user, asset):
+        """build the embed showing a user's avatar or banner"""
+        embed = self.embed()
+        embed.set_author(name=f"{user.name}'s {kind}", icon_url=user.display_avatar.url)
+        embed.set_image(url=asset.url)
+        return embed
+
+    def _asset_view(self, kind, owner_id, user, selected):
+        """build the main / server toggle for an avatar or banner"""
+        buttons = []
+        if kind == "avatar" or user.banner:
+            buttons.append(
+                router.button(
+                    kind,
+                    "main",
+                    owner_id,
+                    key=str(user.id),
+                    label=f"main {kind}",
+                    disabled=selected == "main",
+                )
+            )
+        buttons.append(
+            router.button(
+                kind,
+                "server",
+                owner_id,
+                key=str(user.id),
+                label=f"server {kind}",
+                disabled=selected == "server",
+            )
+        )
+        return router.view(*buttons)
+
+    async def _asset_component(self, interaction, component):
+        """switch an avatar / banner message between the main and server asset"""
+        kind = component.handler
+        user = None
+        if kind == "avatar":
+            user = interaction.guild.get_member(int(component.key))
+        if user is None:
+            try:
+                user = await interaction.guild.fetch_member(int(component.key))
+            except discord.NotFound:
+                return await router.expired(interaction)
+
+        if kind == "avatar":
+            main, server = user.avatar or user.default_avatar, user.guild_avatar
+        else:
+            main, server = user.banner, user.guild_banner
 
-                    await interaction.response.edit_message(
-                        embed=embed.set_image(url=self.selected.url), view=self
-                    )
+        if not server:
+            return await router.expired(interaction)
 
-            view = BannerControls(user)
-        await ctx.reply(embed=embed, view=view)
+        asset = main if component.action == "main" and main else server
+        await interaction.response.edit_message(
+            embed=self._asset_embed(kind, user, asset),
+            view=self._asset_view(
+                kind, component.owner_id, user, "main" if asset is main else "server"
+            ),
+        )
 
     @commands.command(
         name="guildavatar",
@@ -233,9 +216,10 @@ class Info(BaseCog):
     @commands.command(
         name="boosters", brief="view all server boosters", aliases=["boost", "boosts"]
     )
+    @needs_members()
     async def boosters(self, ctx):
         """view all server boosters"""
-        boosters = [i for i in ctx.guild.premium_subscribers]
+        boosters = member_stats.get(ctx.guild).booster_members()
         if not boosters:
             return await ctx.reply(
                 embed=self.warning_embed(
@@ -261,9 +245,10 @@ class Info(BaseCog):
         await self.paginate(ctx, pages)
 
     @commands.command(name="bots", brief="view all bots in the server")
+    @needs_members()
     async def bots(self, ctx):
         """view all bots in the server"""
-        bots = [i for i in ctx.guild.members if i.bot]
+        bots = member_stats.get(ctx.guild).bot_members()
         if not bots:
             return await ctx.reply(
                 embed=self.warning_embed(
@@ -354,9 +339,11 @@ class Info(BaseCog):
     @commands.command(
         name="serverinfo", brief="get info about a server", aliases=["si"]
     )
+    @needs_members()
     async def serverinfo(self, ctx):
         """get info about a server"""
         guild = ctx.guild
+        stats = member_stats.get(guild)
 
         banner = f"[url]({guild.banner.url})" if guild.banner else "unset"
         splash = f"[url]({guild.splash.url})" if guild.splash else "unset"
@@ -378,7 +365,7 @@ class Info(BaseCog):
         )
         embed.add_field(
             name=f"members: **{guild.member_count}**",
-            value=f"{config.BRANCH_ICON} bots: **{len([i for i in guild.members if i.bot])}**\n{config.TAIL_ICON} users: **{len([i for i in guild.members if not i.bot])}**",
+            value=f"{config.BRANCH_ICON} bots: **{len(stats.bots)}**\n{config.TAIL_ICON} users: **{stats.humans}**",
             inline=True,
         )
         embed.add_field(
@@ -391,7 +378,7 @@ class Info(BaseCog):
         )
         embed.add_field(
             name="stats",
-            value=f"{config.BRANCH_ICON} roles: **{len(guild.roles)}**\n{config.BRANCH_ICON} emojis: **{len(guild.emojis)}**\n{config.TAIL_ICON} boosters: **{len([i for i in guild.premium_subscribers])}**",
+            value=f"{config.BRANCH_ICON} roles: **{len(guild.roles)}**\n{config.BRANCH_ICON} emojis: **{len(guild.emojis)}**\n{config.TAIL_ICON} boosters: **{len(stats.boosters)}**",
         )
         embed.add_field(
             name="assets",
@@ -685,9 +672,10 @@ class Info(BaseCog):
         name="hasrole", brief="shows users with a role", aliases=["inrole"]
     )
     @commands.has_permissions(manage_roles=True)
+    @needs_members()
     async def hasrole(self, ctx, role: discord.Role):
         """shows users with a role"""
-        users = [user for user in ctx.guild.members if role in user.roles]
+        users = member_stats.get(ctx.guild).role_members(role)
         if not users:
             return await ctx.reply(
                 embed=self.error_embed(
@@ -695,36 +683,31 @@ class Info(BaseCog):
                 )
             )
 
-        users_per_page = 10
-        pages = []
-        for i in range(0, len(users), users_per_page):
-            page = users[i : i + users_per_page]
-            pages.append(
-                self.embed(
-                    description="\n".join([user.mention for user in page]),
-                ).set_author(name=f"users for @{role.name}")
-            )
-        await self.paginate(ctx, pages)
+        def render(page):
+            return self.embed(
+                description="\n".join([user.mention for user in page]),
+            ).set_author(name=f"users for @{role.name}")
+
+        await self.paginate(ctx, PageSource.from_items(users, 10, render))
 
     @commands.command(
         name="membercount", brief="shows member count", aliases=["members", "mc"]
     )
+    @needs_members()
     async def membercount(self, ctx):
         """shows member count"""
+        stats = member_stats.get(ctx.guild)
         embed = self.embed(
             description=f"this guild has **{ctx.guild.member_count:,}** members",
         )
-        embed.add_field(
-            name="users", value=f"{len([i for i in ctx.guild.members if not i.bot]):,}"
-        )
-        embed.add_field(
-            name="bots", value=f"{len([i for i in ctx.guild.members if i.bot]):,}"
-        )
+        embed.add_field(name="users", value=f"{stats.humans:,}")
+        embed.add_field(name="bots", value=f"{len(stats.bots):,}")
         embed.set_thumbnail(url=ctx.guild.icon.url)
         await ctx.reply(embed=embed)
 
     @commands.command(name="roleinfo", brief="get info about a role")
     @commands.has_permissions(manage_roles=True)
+    @needs_members()
     async def roleinfo(self, ctx, role: discord.Role):
         embed = self.embed(description=f"id: `{role.id}`", color=role.color)
         icon = None
@@ -740,7 +723,7 @@ class Info(BaseCog):
         embed.add_field(name="position", value=role.position)
         embed.add_field(
             name="users",
-            value=f"{len([i for i in ctx.guild.members if role in i.roles])} total",
+            value=f"{member_stats.get(ctx.guild).role_count(role)} total",
         )
         embed.add_field(
             name="created at",
@@ -1,4 +1,3 @@
-import asyncio
 import datetime
 from io import BytesIO
 
@@ -10,6 +9,7 @@ from rembg import remove
 import config
 from core.basecog import BaseCog
 from core.database import db
+from core.executors import ExecutorRejected
 from core.utils import would_invoke
 
 
@@ -59,9 +59,15 @@ class Misc(BaseCog):
 
         await ctx.message.add_reaction(config.THINK_ICON)
         try:
-            output = await asyncio.to_thread(remove, image_data)
+            output = await self.bot.executors["image"].run(remove, image_data)
             buffer = BytesIO(output)
             await ctx.reply(file=discord.File(buffer, filename="rembg.png"))
+        except ExecutorRejected:
+            await ctx.reply(
+                embed=self.warning_embed(
+                    description="too many images are being processed, try again soon"
+                )
+            )
         finally:
             await ctx.message.remove_reaction(config.THINK_ICON, self.bot.user)
 
@@ -103,8 +109,8 @@ class Misc(BaseCog):
 
         for row in afk_users:
             mentioned_user_id = row["user_id"]
-            mentioned_discord_user = message.guild.get_member(mentioned_user_id)
-            if mentioned_discord_user and mentioned_discord_user in message.mentions:
+            # the raw ids don't need the member cache, which isn't filled at startup
+            if mentioned_user_id in message.raw_mentions:
                 bucket = self._afk_cd_mapping.get_bucket(message)
                 retry_after = bucket.update_rate_limit()
                 if retry_after:
@@ -0,0 +1,298 @@
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import threading
+import time
+
+import discord
+from discord.ext import commands
+
+from core.basecog import BaseCog
+from core.sampler import (
+    StackSampler,
+    collapsed_text,
+    profiler,
+    read_collapsed,
+    top_functions,
+)
+
+MODES = ("cprofile", "sample")
+MAX_SECONDS = 300
+MAX_INVOCATIONS = 50
+# how long `profile command` waits for the invocations before reporting
+COMMAND_TIMEOUT = 600
+
+
+class CProfileRecorder:
+    """Deterministic profile of the event loop thread"""
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self) -> None:
+        self.profiler.enable()
+
+    def stop(self) -> None:
+        self.profiler.disable()
+
+    def summary(self, limit: int) -> str:
+        stats = pstats.Stats(self.profiler)
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+        lines = ["`   cumul    self    calls` function"]
+        for (filename, line, name), (_, calls, own, cumulative, _) in rows[:limit]:
+            lines.append(
+                f"`{cumulative * 1000:7.0f}ms {own * 1000:5.0f}ms {calls:>8}` "
+                f"{name} ({os.path.basename(filename)}:{line})"
+            )
+        return "\n".join(lines)[:4000]
+
+    def file(self) -> discord.File:
+        stats = pstats.Stats(self.profiler)
+        # the same format pstats.Stats.dump_stats writes, loadable by snakeviz
+        return discord.File(io.BytesIO(marshal.dumps(stats.stats)), "profile.pstats")
+
+
+class SamplingRecorder:
+    """Statistical profile of the event loop thread from periodic stack samples"""
+
+    def __init__(self, interval: float = 0.005):
+        self.sampler = StackSampler(threading.get_ident(), interval)
+
+    def start(self) -> None:
+        self.sampler.start()
+
+    def stop(self) -> None:
+        self.sampler.stop()
+
+    def summary(self, limit: int) -> str:
+        return _stacks_summary(self.sampler.stacks, limit)
+
+    def file(self) -> discord.File:
+        return _stacks_file(self.sampler.stacks)
+
+
+def _stacks_summary(stacks, limit: int) -> str:
+    total = sum(stacks.values())
+    lines = [f"`  total    self` function ({total} samples)"]
+    for frame, inclusive, exclusive in top_functions(stacks, limit):
+        lines.append(f"`{inclusive / total:6.1%} {exclusive / total:6.1%}` {frame}")
+    return "\n".join(lines)[:4000]
+
+
+def _stacks_file(stacks, filename: str = "profile.collapsed.txt") -> discord.File:
+    return discord.File(io.BytesIO(collapsed_text(stacks).encode()), filename)
+
+
+def _recorder(mode: str):
+    return CProfileRecorder() if mode == "cprofile" else SamplingRecorder()
+
+
+class Profile(BaseCog):
+    """profiling commands OWNER ONLY"""
+
+    def __init__(self, bot):
+        super().__init__(bot)
+        self._running = False
+
+    async def _check_mode(self, ctx, mode: str) -> bool:
+        if mode in MODES:
+            return True
+        await ctx.reply(
+            embed=self.error_embed(
+                description=f"mode must be one of {', '.join(f'`{m}`' for m in MODES)}"
+            )
+        )
+        return False
+
+    async def _report(self, ctx, recorder, title: str, limit: int) -> None:
+        embed = self.embed(title=title, description=recorder.summary(limit))
+        embed.set_footer(
+            text="covers everything on the event loop while recording, "
+            "not just the target; executor threads are not included"
+        )
+        await ctx.reply(embed=embed, file=recorder.file())
+
+    @commands.group(
+        name="profile", invoke_without_command=True, brief="profile the bot"
+    )
+    @commands.is_owner()
+    async def profile(self, ctx):
+        """profile the event loop for a while or for a command's invocations
+
+        modes are `cprofile` (exact call counts, slows the bot down while it
+        runs) and `sample` (stack samples every 5ms, cheap but statistical)
+        """
+        await ctx.send_help(ctx.command)
+
+    @profile.command(name="time", aliases=["for"])
+    @commands.is_owner()
+    async def profile_time(
+        self, ctx, seconds: int = 10, mode: str = "cprofile", limit: int = 15
+    ):
+        """profile everything on the event loop for some seconds"""
+        if not await self._check_mode(ctx, mode):
+            return
+        if self._running:
+            return await ctx.reply(
+                embed=self.error_embed(description="a profile is already running")
+            )
+
+        seconds = max(1, min(seconds, MAX_SECONDS))
+        recorder = _recorder(mode)
+        self._running = True
+        try:
+            recorder.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                recorder.stop()
+        except ValueError as e:
+            # another profiler (jishaku, a debugger) already owns the hook
+            return await ctx.reply(embed=self.error_embed(description=str(e)))
+        finally:
+            self._running = False
+
+        await self._report(ctx, recorder, f"{mode} over {seconds}s", limit)
+
+    @profile.command(name="command", aliases=["cmd"])
+    @commands.is_owner()
+    async def profile_command(
+        self,
+        ctx,
+        name: str,
+        invocations: int = 1,
+        mode: str = "cprofile",
+        limit: int = 15,
+    ):
+        """profile the next invocations of a command
+
+        use quotes for subcommands, e.g. `profile command "tag create" 3`
+        """
+        if not await self._check_mode(ctx, mode):
+            return
+        if self._running:
+            return await ctx.reply(
+                embed=self.error_embed(description="a profile is already running")
+            )
+
+        command = self.bot.get_command(name)
+        if command is None:
+            return await ctx.reply(
+                embed=self.error_embed(description=f"no command named `{name}`")
+            )
+
+        invocations = max(1, min(invocations, MAX_INVOCATIONS))
+        recorder = _recorder(mode)
+        done = asyncio.Event()
+        state = {"active": 0, "seen": 0, "elapsed": 0.0}
+        original = command.invoke
+
+        async def invoke(invoked_ctx):
+            if state["seen"] >= invocations:
+                return await original(invoked_ctx)
+
+            state["seen"] += 1
+            # overlapping invocations share one recording window
+            if state["active"] == 0:
+                recorder.start()
+            state["active"] += 1
+            started = time.perf_counter()
+            try:
+                return await original(invoked_ctx)
+            finally:
+                state["elapsed"] += time.perf_counter() - started
+                state["active"] -= 1
+                if state["active"] == 0:
+                    recorder.stop()
+                    if state["seen"] >= invocations:
+                        done.set()
+
+        self._running = True
+        command.invoke = invoke
+        try:
+            await ctx.reply(
+                embed=self.embed(
+                    description=f"profiling the next {invocations} "
+                    f"invocation{'s' if invocations != 1 else ''} of "
+                    f"`{command.qualified_name}` ({mode})"
+                )
+            )
+            try:
+                await asyncio.wait_for(done.wait(), COMMAND_TIMEOUT)
+            except asyncio.TimeoutError:
+                if state["active"]:
+                    recorder.stop()
+        finally:
+            # drop the instance attribute so the class method shows through again
+            del command.invoke
+            self._running = False
+
+        if not state["seen"]:
+            return await ctx.reply(
+                embed=self.warning_embed(
+                    description=f"`{command.qualified_name}` wasn't used within "
+                    f"{COMMAND_TIMEOUT // 60} minutes"
+                )
+            )
+
+        await self._report(
+            ctx,
+            recorder,
+            f"{mode} of {state['seen']}× {command.qualified_name} "
+            f"({state['elapsed'] / state['seen'] * 1000:.0f}ms avg)",
+            limit,
+        )
+
+    @profile.command(name="dump", aliases=["flame"])
+    @commands.is_owner()
+    async def profile_dump(self, ctx, minutes_ago: int = 0, limit: int = 15):
+        """dump a window of the always-on sampler as collapsed stacks
+
+        0 is the window in progress, otherwise the window that covered the
+        given number of minutes ago. feed the file to flamegraph.pl or
+        speedscope
+        """
+        if not profiler.running:
+            return await ctx.reply(
+                embed=self.error_embed(description="the continuous profiler is off")
+            )
+
+        if minutes_ago <= 0:
+            stacks, overhead = profiler.snapshot()
+            start, end = int(profiler.window_start), int(time.time())
+            footer = f"sampling overhead this window: {overhead:.3%} of a core"
+        else:
+            window = profiler.window_at(time.time() - minutes_ago * 60)
+            if window is None:
+                return await ctx.reply(
+                    embed=self.error_embed(
+                        description=f"no window kept from {minutes_ago} minutes ago"
+                    )
+                )
+            start, end, path = window
+            stacks = await self.bot.executors["misc"].run(read_collapsed, path)
+            footer = f"window of {(end - start) // 60} minutes"
+
+        if not stacks:
+            return await ctx.reply(
+                embed=self.warning_embed(description="no samples in that window yet")
+            )
+
+        embed = self.embed(
+            title="continuous profile",
+            description=f"<t:{start}:T> – <t:{end}:T>\n"
+            + _stacks_summary(stacks, limit),
+        )
+        embed.set_footer(
+            text=f"{footer}, one sample every {profiler.interval * 1000:.0f}ms"
+        )
+        await ctx.reply(
+            embed=embed, file=_stacks_file(stacks, f"profile-{start}.collapsed.txt")
+        )
+
+
+async def setup(bot):
+    await bot.add_cog(Profile(bot))
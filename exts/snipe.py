@@ -22,9 +22,11 @@ class Snipe(BaseCog):
         self.edit_history: Dict[
             int, List[Tuple[discord.Message, discord.Message, datetime]]
         ] = {}
+        # (message, emoji, user id, time): the raw event carries no member, and
+        # resolving one only happens when a removal is actually sniped
         self.reaction_history: Dict[
             int,
-            List[Tuple[discord.Message, discord.Reaction, discord.Member, datetime]],
+            List[Tuple[discord.PartialMessage, discord.PartialEmoji, int, datetime]],
         ] = {}
         self.ttl = timedelta(minutes=5)
         self.image_regex = re.compile(
@@ -36,6 +38,11 @@ class Snipe(BaseCog):
         )
         super().__init__(bot)
 
+    def recent(self, history: List[tuple]) -> List[tuple]:
+        """Entries still within the TTL, newest first; the timestamp is last"""
+        cutoff = datetime.utcnow() - self.ttl
+        return [entry for entry in reversed(history) if entry[-1] >= cutoff]
+
     def clean_url(self, url):
         parsed = urlparse(url)
         cleaned = urlunparse(parsed._replace(query=""))
@@ -121,11 +128,32 @@ class Snipe(BaseCog):
             )
 
     @commands.Cog.listener()
-    async def on_reaction_remove(self, reaction, user):
-        if reaction.message.guild:
-            self.reaction_history.setdefault(reaction.message.channel.id, []).append(
-                (reaction.message, reaction, user, datetime.utcnow())
+    async def on_raw_reaction_remove(self, payload):
+        # reaction_remove is only dispatched for cached members, and guilds
+        # aren't chunked at startup, so the raw event is the reliable one
+        if payload.guild_id is None:
+            return
+        channel = self.bot.get_channel(payload.channel_id)
+        if channel is None:
+            return
+        self.reaction_history.setdefault(channel.id, []).append(
+            (
+                channel.get_partial_message(payload.message_id),
+                payload.emoji,
+                payload.user_id,
+                datetime.utcnow(),
             )
+        )
+
+    async def resolve_user(self, guild: discord.Guild, user_id: int):
+        """The member or user behind an id, from the cache or else the API"""
+        user = guild.get_member(user_id) or self.bot.get_user(user_id)
+        if user is None:
+            try:
+                user = await self.bot.fetch_user(user_id)
+            except discord.HTTPException:
+                return None
+        return user
 
     @commands.command(
         name="clearsnipe",
@@ -155,19 +183,25 @@ class Snipe(BaseCog):
                 )
             )
 
-        message, reaction, user, timestamp = next(
-            (m, r, u, t)
-            for m, r, u, t in reversed(history)
-            if datetime.utcnow() - t <= self.ttl
-        )
+        recent = self.recent(history)
+        if not recent:
+            return await ctx.reply(
+                embed=self.warning_embed(
+                    description="no recent reactions in this channel"
+                )
+            )
+
+        message, emoji, user_id, timestamp = recent[0]
         embed = discord.Embed(
-            description=f"{user.mention} removed {reaction.emoji} from [this message]({
+            description=f"<@{user_id}> removed {emoji} from [this message]({
                 message.jump_url
             })",
             url="https://discord.com",
             color=config.MAIN_COLOR,
         )
-        embed.set_author(name=user.display_name, icon_url=user.display_avatar.url)
+        user = await self.resolve_user(ctx.guild, user_id)
+        if user is not None:
+            embed.set_author(name=user.display_name, icon_url=user.display_avatar.url)
         embed.timestamp = timestamp
         await ctx.reply(embed=embed)
 
@@ -198,9 +232,11 @@ class Snipe(BaseCog):
             )
 
         reactions = [
-            (reaction, user, t)
-            for m, reaction, user, t in self.reaction_history.get(channel.id, [])
-            if m.id == message.id and datetime.utcnow() - t <= self.ttl
+            (emoji, user_id, t)
+            for m, emoji, user_id, t in self.recent(
+                self.reaction_history.get(channel.id, [])
+            )
+            if m.id == message.id
         ]
 
         if not reactions:
@@ -211,10 +247,8 @@ class Snipe(BaseCog):
             )
 
         grouped_reactions = {}
-        for reaction, user, _ in reactions:
-            if str(reaction.emoji) not in grouped_reactions:
-                grouped_reactions[str(reaction.emoji)] = set()
-            grouped_reactions[str(reaction.emoji)].add(user.mention)
+        for emoji, user_id, _ in reactions:
+            grouped_reactions.setdefault(str(emoji), set()).add(f"<@{user_id}>")
 
         embed = discord.Embed(
             description=f"Message: {message.jump_url}",
@@ -238,11 +272,7 @@ class Snipe(BaseCog):
                 embed=self.warning_embed(description="no recent edits in this channel")
             )
 
-        valid_edits = [
-            edit
-            for edit in reversed(history)
-            if datetime.utcnow() - edit[2] <= self.ttl
-        ]
+        valid_edits = self.recent(history)
 
         if index < 1 or index > len(valid_edits):
             return await ctx.reply(
@@ -284,11 +314,7 @@ class Snipe(BaseCog):
                 )
             )
 
-        valid_deletions = [
-            deletion
-            for deletion in reversed(history)
-            if datetime.utcnow() - deletion[1] <= self.ttl
-        ]
+        valid_deletions = self.recent(history)
 
         if index < 1 or index > len(valid_deletions):
             return await ctx.reply(
@@ -0,0 +1,174 @@
+import asyncio
+import logging
+import os
+import signal
+import sys
+from typing import Dict, Optional
+
+import aiohttp
+from dotenv import load_dotenv
+
+from core.cluster import DEFAULT_IPC_PORT, ClusterHub, shard_ranges
+from core.logs import setup_logging
+
+load_dotenv()
+setup_logging("launcher")
+logger = logging.getLogger("launcher")
+
+TOKEN = os.getenv("TOKEN")
+
+CLUSTERS = int(os.getenv("CLUSTERS", "2"))
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+IPC_PORT = int(os.getenv("IPC_PORT", DEFAULT_IPC_PORT))
+
+# how long a cluster gets to log in before the next one starts anyway
+READY_TIMEOUT = 300
+# how long a cluster gets to log out before it's killed
+SHUTDOWN_TIMEOUT = 30
+
+
+async def recommended_shards(token: str) -> int:
+    """Ask Discord how many shards the bot should run"""
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={"Authorization": f"Bot {token}"},
+        ) as response:
+            response.raise_for_status()
+            return (await response.json())["shards"]
+
+
+class ClusterLauncher:
+    """Runs the bot as several processes, each owning a range of shards
+
+    Clusters are started one after another, each once the previous one has
+    logged in, so identifies stay within Discord's rate limit. Crashed
+    clusters are restarted, and a restart requested over IPC or with SIGHUP
+    rolls through the clusters one at a time so the rest stay online.
+    """
+
+    def __init__(self, shard_count: int, clusters: int, port: int):
+        self.shard_count = shard_count
+        self.ranges = shard_ranges(shard_count, clusters)
+        self.hub = ClusterHub(port)
+        self.hub.on_restart = self.rolling_restart
+        self.processes: Dict[int, asyncio.subprocess.Process] = {}
+        self._restarting: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def spawn(self, cluster_id: int) -> asyncio.subprocess.Process:
+        """Start one cluster's process"""
+        shard_ids = self.ranges[cluster_id]
+        env = dict(
+            os.environ,
+            CLUSTER_ID=str(cluster_id),
+            SHARD_IDS=",".join(map(str, shard_ids)),
+            SHARD_COUNT=str(self.shard_count),
+            IPC_PORT=str(self.hub.port),
+        )
+        self.hub.forget(cluster_id)
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "main.py", env=env
+        )
+        self.processes[cluster_id] = process
+        logger.info(
+            f"Cluster {cluster_id} started (pid {process.pid}, "
+            f"shards {shard_ids[0]}-{shard_ids[-1]})"
+        )
+        return process
+
+    async def wait_ready(self, cluster_id: int) -> None:
+        """Wait for a cluster to log in, giving up after READY_TIMEOUT"""
+        try:
+            await asyncio.wait_for(
+                self.hub.ready_event(cluster_id).wait(), READY_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Cluster {cluster_id} not ready after {READY_TIMEOUT}s")
+
+    async def stop(self, cluster_id: int) -> None:
+        """Log a cluster out, killing it if it doesn't exit in time"""
+        process = self.processes.get(cluster_id)
+        if process is None or process.returncode is not None:
+            return
+
+        if not await self.hub.shutdown(cluster_id):
+            process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"Cluster {cluster_id} did not exit, killing it")
+            process.kill()
+            await process.wait()
+
+    async def rolling_restart(self) -> None:
+        """Restart every cluster, one at a time"""
+        if self._restarting is not None and not self._restarting.done():
+            logger.info("Rolling restart already in progress")
+            return
+
+        async def restart():
+            for cluster_id in range(len(self.ranges)):
+                logger.info(f"Rolling restart: cluster {cluster_id}")
+                await self.stop(cluster_id)
+                await self.spawn(cluster_id)
+                await self.wait_ready(cluster_id)
+            logger.info("Rolling restart complete")
+
+        self._restarting = asyncio.ensure_future(restart())
+        await self._restarting
+
+    async def supervise(self) -> None:
+        """Restart clusters that exit on their own"""
+        while not self._stopping:
+            await asyncio.sleep(5)
+            if self._restarting is not None and not self._restarting.done():
+                continue
+
+            for cluster_id, process in list(self.processes.items()):
+                if process.returncode is not None and not self._stopping:
+                    logger.warning(
+                        f"Cluster {cluster_id} exited with {process.returncode}, "
+                        "restarting"
+                    )
+                    await self.spawn(cluster_id)
+
+    async def run(self) -> None:
+        """Start the hub and every cluster, then supervise until stopped"""
+        await self.hub.start()
+
+        loop = asyncio.get_running_loop()
+        stopped = asyncio.Event()
+        loop.add_signal_handler(
+            signal.SIGHUP, lambda: asyncio.ensure_future(self.rolling_restart())
+        )
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopped.set)
+
+        logger.info(
+            f"Launching {len(self.ranges)} clusters for {self.shard_count} shards"
+        )
+        for cluster_id in range(len(self.ranges)):
+            await self.spawn(cluster_id)
+            await self.wait_ready(cluster_id)
+
+        supervisor = asyncio.create_task(self.supervise())
+        await stopped.wait()
+
+        self._stopping = True
+        supervisor.cancel()
+        await asyncio.gather(*(self.stop(cluster_id) for cluster_id in self.processes))
+        await self.hub.close()
+
+
+async def main() -> None:
+    shard_count = int(SHARD_COUNT) if SHARD_COUNT else await recommended_shards(TOKEN)
+    await ClusterLauncher(shard_count, CLUSTERS, IPC_PORT).run()
+
+
+if __name__ == "__main__":
+    if not TOKEN:
+        logger.error("Missing TOKEN environment variable. Please set it in .env file.")
+        exit(1)
+
+    asyncio.run(main())
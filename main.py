@@ -4,15 +4,18 @@ import os
 from dotenv import load_dotenv
 
 from core.bot import Core
+from core.logs import setup_logging
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[logging.FileHandler("discord.log"), logging.StreamHandler()],
+load_dotenv()
+# clusters run side by side, and rotating one file from several processes
+# loses lines
+setup_logging(
+    f"discord-cluster-{os.environ['CLUSTER_ID']}"
+    if "CLUSTER_ID" in os.environ
+    else "discord"
 )
 logger = logging.getLogger(__name__)
 
-load_dotenv()
 TOKEN = os.getenv("TOKEN")
 
 DB_HOST = os.getenv("DB_HOST", "localhost")
@@ -27,6 +30,14 @@ if not TOKEN:
 
 logger.info(f"Using database: {DB_NAME} at {DB_HOST}:{DB_PORT}")
 
+# set by launcher.py when running as one cluster of several
+SHARD_IDS = os.getenv("SHARD_IDS")
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+
 if __name__ == "__main__":
-    bot = Core()
-    bot.run(TOKEN)
+    bot = Core(
+        shard_ids=[int(i) for i in SHARD_IDS.split(",")] if SHARD_IDS else None,
+        shard_count=int(SHARD_COUNT) if SHARD_COUNT else None,
+    )
+    # logging is already set up; don't let discord.py add its own handler
+    bot.run(TOKEN, log_handler=None)
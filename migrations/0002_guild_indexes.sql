@@ -0,0 +1,5 @@
+-- the guild-wide lookups (get_guild_afk, get_tags) filter on guild_id alone,
+-- which the unique constraints can't serve since they lead with another column
+CREATE INDEX IF NOT EXISTS idx_afk_users_guild ON afk_users (guild_id);
+
+CREATE INDEX IF NOT EXISTS idx_tags_guild ON tags (guild_id);
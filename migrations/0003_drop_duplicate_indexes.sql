@@ -0,0 +1,7 @@
+-- each of these repeats the index behind a unique constraint on the same
+-- columns, so it only costs writes; lookups keep using the constraint's index
+DROP INDEX IF EXISTS idx_prefixes_lookup;
+
+DROP INDEX IF EXISTS idx_tags_name_guild;
+
+DROP INDEX IF EXISTS idx_afk_users_user_guild;